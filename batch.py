@@ -0,0 +1,170 @@
+import json
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from exceptions import ConflictError, TaskManagerException
+from task import Task
+
+# operations between two writes of the task file
+CHECKPOINT_OPS = 10000
+
+
+def _add(tm, title, description, category, due_date, priority):
+    return tm.add_task(title, description, category, due_date, priority)
+
+
+def _edit(tm, id, title=None, description=None, category=None, due_date=None,
+          priority=None):
+    changes = {'title': title, 'description': description, 'category': category,
+               'due_date': due_date, 'priority': priority}
+    return tm.edit_task(id, **{key: value for key, value in changes.items()
+                               if value is not None})
+
+
+def _complete(tm, id):
+    return tm.complete_task(id)
+
+
+def _delete(tm, id=None, category=None):
+    if category is not None:
+        return tm.delete_tasks_by_category(category)
+    if id is None:
+        raise ValueError('Укажите id или category')
+    return tm.delete_task(id)
+
+
+def _list(tm, category=None, sort=None, limit=None, offset=0):
+    return tm.get_tasks_by(category=category, order_by=sort, limit=limit, offset=offset)
+
+
+def _search(tm, keyword=None, category=None, status=None, sort=None, limit=None,
+            offset=0):
+    return tm.find_task(keyword, category, status, order_by=sort, limit=limit,
+                        offset=offset)
+
+
+# operations by name, with the arguments of the command of the same name
+OPERATIONS = {
+    'add': _add,
+    'edit': _edit,
+    'complete': _complete,
+    'delete': _delete,
+    'list': _list,
+    'search': _search,
+}
+
+
+def _encode(result):
+    if isinstance(result, Task):
+        return result.to_dict()
+    if isinstance(result, list):
+        return [_encode(item) for item in result]
+    return result
+
+
+def _error(e: Exception) -> dict:
+    message = str(e) or getattr(e, 'message', '')
+    return {'type': type(e).__name__, 'message': message}
+
+
+def run_operation(tm, line: str):
+    """
+    Decodes an operation and runs it.
+
+    Args:
+        tm (TaskManager | TaskClient): The task manager to run it on.
+        line (str): The operation, a JSON object with the name of the
+            operation under "op" and the arguments of the command of the
+            same name, e.g. {"op": "complete", "id": 3}.
+
+    Returns:
+        The result of the operation, with tasks as dictionaries.
+
+    Raises:
+        ValueError: If the line is not a JSON object or the operation is unknown.
+        TypeError: If an argument is missing or unknown.
+        TaskManagerException: The error raised by the operation.
+    """
+    operation = json.loads(line)
+    if not isinstance(operation, dict):
+        raise ValueError('Операция должна быть JSON-объектом')
+    name = operation.pop('op', None)
+    if name not in OPERATIONS:
+        raise ValueError(f'Неизвестная операция: {name}')
+    return _encode(OPERATIONS[name](tm, **operation))
+
+
+def _numbered(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            yield line_number, line
+
+
+def run_batch(tm, lines: Iterable[str], output: IO[str],
+              checkpoint: int = CHECKPOINT_OPS) -> tuple[int, int]:
+    """
+    Runs operations, one JSON object per line, against a single task manager.
+    The mutations of every `checkpoint` consecutive operations are persisted
+    together with one write, and the results of those operations are written
+    once they are, as JSON Lines: {"line": 1, "result": ...} or
+    {"line": 2, "error": {"type": ..., "message": ...}}.
+
+    An operation that fails does not affect the others. If persisting a
+    checkpoint fails, its operations are reported with that error; after a
+    conflict with another process the task manager holds the current
+    contents of the store, and the next operations run on them.
+
+    Args:
+        tm (TaskManager | TaskClient): The task manager. A client of a task
+            server runs every operation as a separate request, and the server
+            groups the writes itself.
+        lines (Iterable[str]): The operations. Blank lines are skipped.
+        output (IO[str]): The stream for the results.
+        checkpoint (int): The number of operations persisted together, 0 to
+            persist once at the end. Defaults to CHECKPOINT_OPS.
+
+    Returns:
+        tuple[int, int]: The number of operations that succeeded and failed.
+
+    Raises:
+        OSError: If the task file could not be written. The results of the
+            checkpoint are written first.
+    """
+    operations = _numbered(lines)
+    batch = getattr(type(tm), 'batch', None)
+    done = failed = 0
+    while chunk := list(islice(operations, checkpoint or None)):
+        results = []
+        try:
+            if batch is None:
+                results = [_run(tm, line_number, line) for line_number, line in chunk]
+            else:
+                with tm.batch():
+                    results = [_run(tm, line_number, line) for line_number, line in chunk]
+        except (ConflictError, OSError) as e:
+            results = [result if 'error' in result else
+                       {'line': result['line'], 'error': _error(e)}
+                       for result in results or
+                       ({'line': line_number} for line_number, _ in chunk)]
+            output.write(''.join(map(_dump, results)))
+            if not isinstance(e, ConflictError):
+                raise
+        else:
+            output.write(''.join(map(_dump, results)))
+        errors = sum('error' in result for result in results)
+        done += len(results) - errors
+        failed += errors
+    output.flush()
+    return done, failed
+
+
+def _run(tm, line_number: int, line: str) -> dict:
+    try:
+        result = run_operation(tm, line)
+    except (TaskManagerException, ValueError, TypeError) as e:
+        return {'line': line_number, 'error': _error(e)}
+    return {'line': line_number, 'result': result}
+
+
+def _dump(result: dict) -> str:
+    return json.dumps(result, ensure_ascii=False) + '\n'
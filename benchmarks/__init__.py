@@ -0,0 +1,12 @@
+"""
+Benchmarks for TaskManager on large synthetic task files.
+
+    python -m benchmarks.generate --count 1000000 tasks.jsonl
+    python -m benchmarks.run --sizes 1000 100000 --formats json db
+    python -m benchmarks.compress --size 100000
+    python -m benchmarks.serialize --count 1000000
+
+See benchmarks/run.py for the scenarios and the baseline check, and
+benchmarks/compress.py and benchmarks/serialize.py for the comparisons of
+compression codecs and of the task codec with the generic code.
+"""
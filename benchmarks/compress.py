@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+
+from benchmarks.generate import write_task_file
+from benchmarks.run import measure
+from compression import CODECS
+from task_manager import TaskManager
+
+LAYOUTS = ('indent', 'compact')
+
+
+def store_name(directory: str, size: int, extension: str, codec: str, layout: str) -> str:
+    suffix = '' if codec == 'none' else codec
+    return os.path.join(directory, f'tasks-{size}-{layout}.{extension}{suffix}')
+
+
+def run_codecs(size: int, extensions: list[str], codecs: list[str], repeat: int,
+               data_dir: str) -> dict:
+    """
+    Writes the same generated tasks with every codec and layout, and times
+    loading and saving each store.
+
+    Scenarios:
+        save: Writing a full snapshot of the loaded tasks.
+        load: Opening the store and loading all tasks.
+
+    Returns:
+        dict: The file size in bytes, its ratio to the size of the first
+            store (uncompressed indented JSON by default), and the best and
+            median duration of every scenario, under "<extension><codec>:<layout>".
+    """
+    source = os.path.join(data_dir, f'tasks-{size}.jsonl')
+    if not os.path.exists(source):
+        write_task_file(source, size)
+    tasks = TaskManager(source).tasks
+    results = {}
+    reference = None
+    for extension in extensions:
+        for layout in LAYOUTS if extension == 'json' else LAYOUTS[1:]:
+            for codec in codecs:
+                filename = store_name(data_dir, size, extension, codec, layout)
+                storage = TaskManager(filename, lazy=True,
+                                      compact=layout == 'compact').storage
+                save = measure(lambda: storage.save(tasks), repeat)
+                load = measure(lambda: TaskManager(filename).close(), repeat)
+                file_size = os.path.getsize(filename)
+                if reference is None:
+                    reference = file_size
+                results[f"{extension}{'' if codec == 'none' else codec}:{layout}"] = {
+                    'bytes': file_size,
+                    'ratio': file_size / reference,
+                    'save': {'best': min(save), 'median': statistics.median(save)},
+                    'load': {'best': min(load), 'median': statistics.median(load)},
+                }
+                os.remove(filename)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение сжатия файлов задач')
+    parser.add_argument('--size', type=int, default=100000,
+                        help='Количество задач (по умолчанию 100000)')
+    parser.add_argument('--formats', nargs='+', default=['json', 'jsonl'],
+                        choices=['json', 'jsonl'],
+                        help='Форматы файла задач (по умолчанию json jsonl)')
+    parser.add_argument('--codecs', nargs='+', default=['none', *CODECS],
+                        choices=['none', *CODECS],
+                        help='Сжатие (по умолчанию none .gz .bz2 .xz)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Количество повторов каждого замера (по умолчанию 3)')
+    parser.add_argument('--data-dir',
+                        help='Каталог для сгенерированных файлов задач '
+                             '(по умолчанию временный)')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        results = run_codecs(args.size, args.formats, args.codecs, args.repeat, data_dir)
+
+    output = json.dumps({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'size': args.size,
+        'repeat': args.repeat,
+        'results': results,
+    }, ensure_ascii=False, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+
+
+if __name__ == '__main__':
+    main()
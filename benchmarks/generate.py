@@ -0,0 +1,96 @@
+import argparse
+import random
+from datetime import date
+from typing import Iterator
+
+from compression import base_name, open_text
+from priority import Priority
+from streaming import dump_records
+from task import Task
+from task_manager import TaskManager
+
+WORDS = (
+    'отчёт', 'встреча', 'проект', 'звонок', 'письмо', 'договор', 'счёт', 'план',
+    'презентация', 'ремонт', 'уборка', 'покупка', 'молоко', 'хлеб', 'лекарство',
+    'врач', 'тренировка', 'бассейн', 'экзамен', 'курс', 'книга', 'статья',
+    'поездка', 'билет', 'гостиница', 'подарок', 'праздник', 'семья', 'машина',
+    'страховка', 'налог', 'бюджет', 'клиент', 'сервер', 'релиз', 'ошибка',
+    'задача', 'документ', 'справка', 'заявка', 'собрание', 'квартал', 'неделя',
+    'срочно', 'важно', 'подготовить', 'отправить', 'проверить', 'купить',
+    'позвонить', 'записаться', 'оплатить', 'обсудить', 'согласовать',
+    'исправить', 'написать', 'прочитать', 'забрать', 'заказать', 'починить',
+)
+CATEGORIES = ('Работа', 'Дом', 'Личное', 'Покупки', 'Здоровье', 'Учёба',
+              'Финансы', 'Семья', 'Спорт', 'Путешествия', 'Хобби', 'Машина')
+STATUSES = ("Не выполнена", "Выполнена")
+
+
+def generate_tasks(count: int, seed: int = 0) -> Iterator[Task]:
+    """
+    Generates tasks with Russian titles and descriptions. Category popularity
+    follows a Zipf-like law over a dozen common categories and a long tail of
+    project categories, about a third of the tasks are completed, and due
+    dates span two years.
+
+    Args:
+        count (int): The number of tasks.
+        seed (int): The seed of the random generator, so that files can be
+            reproduced. Defaults to 0.
+
+    Yields:
+        Task: The generated tasks, with IDs from 1 to count.
+    """
+    rng = random.Random(seed)
+    categories = list(CATEGORIES) + [f'Проект {i}' for i in range(1, 200)]
+    weights = [1 / rank ** 1.2 for rank in range(1, len(categories) + 1)]
+    priorities = list(Priority)
+    start = date(2024, 1, 1).toordinal()
+    due_dates = [date.fromordinal(start + day).isoformat() for day in range(730)]
+    category_batch = []
+    for task_id in range(1, count + 1):
+        if not category_batch:
+            category_batch = rng.choices(categories, weights, k=1024)
+        title = ' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize()
+        description = ' '.join(rng.choices(WORDS, k=rng.randint(6, 20))).capitalize() + '.'
+        yield Task(task_id, title, description, category_batch.pop(),
+                   rng.choice(due_dates), rng.choices(priorities, (3, 5, 2))[0],
+                   STATUSES[rng.random() < 0.3])
+
+
+def write_task_file(filename: str, count: int, seed: int = 0) -> None:
+    """
+    Writes generated tasks to a task file of any supported format. JSON and
+    JSON Lines files, compressed or not, are written one task at a time, so
+    that files with millions of tasks never have to fit in memory.
+
+    Args:
+        filename (str): The task file; its extension selects the format.
+        count (int): The number of tasks.
+        seed (int): The seed of the random generator. Defaults to 0.
+    """
+    tasks = generate_tasks(count, seed)
+    if base_name(filename).endswith(('.json', '.jsonl')):
+        with open_text(filename, 'w') as file:
+            dump_records((task.to_dict() for task in tasks), file, indent=False,
+                         json_lines=base_name(filename).endswith('.jsonl'))
+    else:
+        task_manager = TaskManager(filename, lazy=True)
+        task_manager.storage.save(list(tasks))
+        task_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор файлов задач')
+    parser.add_argument('filename',
+                        help='Файл задач (.json, .jsonl, .db, .sqlite, .sqlite3, .bin, '
+                             'для JSON — со сжатием .gz, .bz2, .xz) или каталог .shards')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Количество задач (по умолчанию 1000)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Начальное значение генератора (по умолчанию 0)')
+    args = parser.parse_args()
+    write_task_file(args.filename, args.count, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import write_task_file
+from task_manager import TaskManager
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+KEYWORDS = ('отчёт', 'сервер', 'лекарство', 'гостиница')
+# differences below this many seconds are timer noise, not regressions
+NOISE = 0.002
+
+
+def measure(function, repeat: int) -> list[float]:
+    """
+    Calls a function repeat times and returns the duration of each call.
+    The garbage collector is paused while timing, as in timeit.
+    """
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return durations
+
+
+def open_store(filename: str) -> TaskManager:
+    return TaskManager(filename)
+
+
+def run_scenarios(filename: str, size: int, repeat: int) -> dict[str, list[float]]:
+    """
+    Times the scenarios against a task file.
+
+    Scenarios:
+        load: Opening the store and loading all tasks.
+        save: Writing a full snapshot of the loaded tasks.
+        lookup: 1000 get_task_by_id calls for random IDs.
+        search: find_task by keyword, for a few keywords.
+        filter: get_tasks_by for a common and a rare category, and find_task
+            by status.
+        mutate: Completing and deleting 1% of the tasks (at most 1000 of each)
+            in one batch, including the write, on a copy of the store.
+
+    Returns:
+        dict[str, list[float]]: The duration of each run, by scenario.
+    """
+    rng = random.Random(size)
+    results = {'load': measure(lambda: open_store(filename).close(), repeat)}
+
+    task_manager = open_store(filename)
+    ids = [rng.randint(1, size) for _ in range(1000)]
+    results['save'] = measure(lambda: task_manager.storage.save(task_manager.tasks),
+                              repeat)
+    results['lookup'] = measure(
+        lambda: [task_manager.get_task_by_id(task_id) for task_id in ids], repeat)
+    results['search'] = measure(
+        lambda: [task_manager.find_task(keyword=keyword) for keyword in KEYWORDS],
+        repeat)
+    results['filter'] = measure(
+        lambda: (task_manager.get_tasks_by(category='Работа'),
+                 task_manager.get_tasks_by(category='Проект 150'),
+                 task_manager.find_task(status='Выполнена')), repeat)
+    task_manager.close()
+
+    count = max(1, min(size // 100, 1000))
+    root, extension = os.path.splitext(filename)
+    copy = f'{root}.copy{extension}'
+    results['mutate'] = []
+    for _ in range(repeat):
+        if os.path.isdir(filename):
+            shutil.rmtree(copy, ignore_errors=True)
+            shutil.copytree(filename, copy)
+        else:
+            shutil.copyfile(filename, copy)
+        task_manager = open_store(copy)
+        chosen = rng.sample(range(1, size + 1), 2 * count)
+
+        def mutate():
+            with task_manager.batch():
+                for task_id in chosen[:count]:
+                    task_manager.complete_task(task_id)
+                task_manager.delete_tasks(chosen[count:])
+
+        results['mutate'] += measure(mutate, 1)
+        task_manager.close()
+    if os.path.isdir(copy):
+        shutil.rmtree(copy)
+    else:
+        os.remove(copy)
+    return results
+
+
+def run(sizes: list[int], formats: list[str], repeat: int,
+        data_dir: str) -> dict:
+    """
+    Generates a task file for every size and format and times the scenarios
+    against it.
+
+    Returns:
+        dict: The results, with the best and median duration of every
+            scenario under results["<format>:<size>"]["<scenario>"].
+    """
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': {},
+    }
+    for size in sizes:
+        for extension in formats:
+            filename = os.path.join(data_dir, f'tasks-{size}.{extension}')
+            if not os.path.exists(filename):
+                write_task_file(filename, size)
+            durations = run_scenarios(filename, size, repeat)
+            report['results'][f'{extension}:{size}'] = {
+                scenario: {'best': min(runs), 'median': statistics.median(runs)}
+                for scenario, runs in durations.items()}
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compares the best durations with a baseline report.
+
+    Returns:
+        list[str]: A description of every scenario that got slower than the
+            baseline by more than threshold (0.25 means 25%).
+    """
+    regressions = []
+    for key, scenarios in report['results'].items():
+        for scenario, result in scenarios.items():
+            base = baseline.get('results', {}).get(key, {}).get(scenario)
+            if base is None:
+                continue
+            best, limit = result['best'], base['best'] * (1 + threshold)
+            if best > limit and best - base['best'] > NOISE:
+                regressions.append(f"{key} {scenario}: {best * 1000:.1f} ms, "
+                                   f"baseline {base['best'] * 1000:.1f} ms "
+                                   f"(+{(best / base['best'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры производительности')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='Количество задач (по умолчанию 1000 10000)')
+    parser.add_argument('--formats', nargs='+', default=['json'],
+                        choices=['json', 'jsonl', 'db', 'bin', 'shards'],
+                        help='Форматы файла задач (по умолчанию json)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Количество повторов каждого замера (по умолчанию 5)')
+    parser.add_argument('--data-dir',
+                        help='Каталог для сгенерированных файлов задач '
+                             '(по умолчанию временный)')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='Файл с эталонными результатами')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Допустимое замедление относительно эталона '
+                             '(по умолчанию 0.5, то есть 50%%)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Сохранить результаты как эталонные')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        report = run(args.sizes, args.formats, args.repeat, data_dir)
+
+    output = json.dumps(report, ensure_ascii=False, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            file.write(output)
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"Замедление: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
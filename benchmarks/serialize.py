@@ -0,0 +1,100 @@
+import argparse
+import json
+import platform
+import statistics
+import time
+
+from benchmarks.generate import generate_tasks
+from benchmarks.run import measure
+from codec import encode_json, encode_json_indented, task_from_dict, task_from_row, \
+    task_to_row
+from dates import to_ordinal
+from priority import Priority
+from task import Task
+from task_manager import TaskManager
+
+
+def _indented(task: Task) -> str:
+    text = json.dumps(task.to_dict(), ensure_ascii=False, indent=4)
+    return '    ' + text.replace('\n', '\n    ')
+
+
+def _validate_generic(priority: str, due_date: str) -> None:
+    # what validate_data did before the codec: a new list and a full parse per call
+    if priority not in Priority.list():
+        raise ValueError(priority)
+    time.strptime(due_date, '%Y-%m-%d')
+
+
+def run_codec(count: int, repeat: int) -> dict:
+    """
+    Times the serialization hot paths on generated tasks, with the codec and
+    with the generic code it replaces (Task.from_dict with Priority(...),
+    json.dumps of Task.to_dict, strptime validation).
+
+    Scenarios:
+        decode: Building tasks from task dictionaries.
+        decode_row: Building tasks from rows, as SQLite returns them.
+        encode: Encoding tasks as JSON objects on one line.
+        encode_indented: Encoding tasks as elements of an indented JSON array.
+        validate: Validating the priority and due date of every task.
+
+    Returns:
+        dict: The best and median duration, and the tasks per second for the
+            best run, of every scenario under "<scenario>:<codec|generic>".
+    """
+    tasks = list(generate_tasks(count))
+    records = [task.to_dict() for task in tasks]
+    rows = [task_to_row(task) for task in tasks]
+    pairs = [(task.priority.value, task.due_date) for task in tasks]
+    to_ordinal.cache_clear()
+    scenarios = {
+        'decode:generic': lambda: [Task(data['id'], data['title'], data['description'],
+                                        data['category'], data['due_date'],
+                                        Priority(data['priority']),
+                                        data.get('status', "Не выполнена"))
+                                   for data in records],
+        'decode:codec': lambda: list(map(task_from_dict, records)),
+        'decode_row:generic': lambda: [Task(row[0], row[1], row[2], row[3], row[4],
+                                            Priority(row[5]), row[6]) for row in rows],
+        'decode_row:codec': lambda: list(map(task_from_row, rows)),
+        'encode:generic': lambda: [json.dumps(task.to_dict(), ensure_ascii=False)
+                                   for task in tasks],
+        'encode:codec': lambda: list(map(encode_json, tasks)),
+        'encode_indented:generic': lambda: list(map(_indented, tasks)),
+        'encode_indented:codec': lambda: list(map(encode_json_indented, tasks)),
+        'validate:generic': lambda: [_validate_generic(*pair) for pair in pairs],
+        'validate:codec': lambda: [TaskManager.validate_data(*pair) for pair in pairs],
+    }
+    results = {}
+    for name, function in scenarios.items():
+        durations = measure(function, repeat)
+        results[name] = {'best': min(durations), 'median': statistics.median(durations),
+                         'tasks_per_second': count / min(durations)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры кодека задач')
+    parser.add_argument('--count', type=int, default=1000000,
+                        help='Количество задач (по умолчанию 1000000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Количество повторов каждого замера (по умолчанию 3)')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    args = parser.parse_args()
+
+    output = json.dumps({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'count': args.count,
+        'repeat': args.repeat,
+        'results': run_codec(args.count, args.repeat),
+    }, ensure_ascii=False, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+
+from codec import task_to_dict
+from metrics import metrics
+from priority import Priority
+from query import And, Eq, Query
+from storage import Change, JsonStorage, Storage, file_version, select_due
+from task import Task
+
+MAGIC = b'TSKB'
+VERSION = 1
+
+# magic, version, next_id, task count, symbol count, heap size
+HEADER = struct.Struct('<4sH2xQQQQ')
+ID = struct.Struct('<Q')
+# id, title offset, title length, description offset, description length,
+# category symbol, due date symbol, status symbol, priority
+RECORD = struct.Struct('<QQIQIIIIB3x')
+# heap offset, length
+SYMBOL = struct.Struct('<QI')
+
+# positions of the symbol numbers in a record
+SYMBOL_FIELDS = {'category': 5, 'due_date': 6, 'status': 7}
+
+PRIORITIES = list(Priority)
+PRIORITY_CODES = {priority: code for code, priority in enumerate(PRIORITIES)}
+
+
+class BinaryStorage(Storage):
+    """
+    Stores tasks in a binary snapshot: a header with next_id and the counts,
+    fixed-width records sorted by id, a table of symbols (categories, due
+    dates and statuses, each stored once) and a heap of UTF-8 strings.
+
+    The file is memory-mapped, so get and find read only the records they
+    need: get is a binary search over the ids, and category and status
+    filters compare symbol numbers without decoding any strings.
+    """
+
+    def __init__(self, filename: str):
+        """
+        Args:
+            filename (str): The path of the snapshot file.
+        """
+        self.filename = filename
+        self._file = None
+        self._mmap = None
+        self._count = 0
+        self._next_id = 0
+        self._symbols: list[str] = []
+        self._symbol_ids: dict[str, int] = {}
+        self._heap_offset = 0
+        self._signature = None
+
+    def _open(self) -> None:
+        """
+        Maps the snapshot into memory and reads its header and symbol table,
+        unless the file has not changed since it was last mapped.
+        """
+        if not os.path.exists(self.filename):
+            self.save([])
+        signature = self.signature()
+        if self._mmap is not None and signature == self._signature:
+            return
+        self.close()
+        self._file = open(self.filename, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._signature = signature
+        magic, version, self._next_id, self._count, symbol_count, _ = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{self.filename} is not a task snapshot')
+        symbols_offset = HEADER.size + self._count * RECORD.size
+        heap_offset = symbols_offset + symbol_count * SYMBOL.size
+        self._heap_offset = heap_offset
+        self._symbols = [self._string(offset, length) for offset, length
+                         in SYMBOL.iter_unpack(
+                             self._mmap[symbols_offset:heap_offset])]
+        self._symbol_ids = {symbol: i for i, symbol in enumerate(self._symbols)}
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._heap_offset + offset
+        return self._mmap[start:start + length].decode('utf-8')
+
+    def _record(self, i: int) -> tuple:
+        return RECORD.unpack_from(self._mmap, HEADER.size + i * RECORD.size)
+
+    def _task(self, record: tuple) -> Task:
+        task_id, title_offset, title_length, description_offset, \
+            description_length, category, due_date, status, priority = record
+        return Task(task_id,
+                    self._string(title_offset, title_length),
+                    self._string(description_offset, description_length),
+                    self._symbols[category], self._symbols[due_date],
+                    PRIORITIES[priority], self._symbols[status])
+
+    def _records(self):
+        for offset in range(HEADER.size, HEADER.size + self._count * RECORD.size,
+                            RECORD.size):
+            yield RECORD.unpack_from(self._mmap, offset)
+
+    def load(self) -> list[Task]:
+        self._open()
+        metrics.count('bytes_read', len(self._mmap))
+        metrics.count('tasks_hydrated', self._count)
+        return [self._task(record) for record in self._records()]
+
+    def records(self) -> Iterator[dict]:
+        self._open()
+        for record in self._records():
+            yield task_to_dict(self._task(record))
+
+    def can_stream(self) -> bool:
+        return True
+
+    def get(self, task_id: int) -> Optional[Task]:
+        self._open()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ID.unpack_from(self._mmap, HEADER.size + mid * RECORD.size)[0] < task_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            record = self._record(lo)
+            if record[0] == task_id:
+                metrics.count('tasks_hydrated')
+                return self._task(record)
+        return None
+
+    def query(self, query: Query) -> list[Task]:
+        """
+        Equality conditions on categories, due dates and statuses are checked
+        on the symbol numbers of the records, so only the records that pass
+        them are decoded and checked against the rest of the query.
+        """
+        self._open()
+        where = query.where
+        conditions = where.predicates if isinstance(where, And) else (where,)
+        symbols = []
+        for condition in conditions:
+            if isinstance(condition, Eq) and condition.field in SYMBOL_FIELDS:
+                symbol = self._symbol_ids.get(condition.value)
+                if symbol is None:
+                    return []
+                symbols.append((SYMBOL_FIELDS[condition.field], symbol))
+        tasks = [self._task(record) for record in self._records()
+                 if all(record[i] == symbol for i, symbol in symbols)]
+        metrics.count('tasks_hydrated', len(tasks))
+        return query.arrange(query.filter(tasks))
+
+    def due(self, start: int = None, end: int = None, pending: bool = False,
+            limit: int = None) -> list[Task]:
+        self._open()
+        records = select_due(((record[0], self._symbols[record[6]],
+                               self._symbols[record[7]], record)
+                              for record in self._records()),
+                             start, end, pending, limit)
+        metrics.count('tasks_hydrated', len(records))
+        return [self._task(record) for record in records]
+
+    def max_id(self) -> int:
+        self._open()
+        return self._next_id
+
+    def save(self, tasks: Iterable[Task]) -> None:
+        """
+        Writes the snapshot to a temporary file and atomically renames it over
+        the old one.
+        """
+        records = bytearray()
+        heap = bytearray()
+        symbols: dict[str, int] = {}
+        symbol_table = bytearray()
+
+        def string(value: str) -> tuple[int, int]:
+            data = value.encode('utf-8')
+            offset = len(heap)
+            heap.extend(data)
+            return offset, len(data)
+
+        def symbol(value: str) -> int:
+            if value not in symbols:
+                symbols[value] = len(symbols)
+                symbol_table.extend(SYMBOL.pack(*string(value)))
+            return symbols[value]
+
+        count = next_id = 0
+        for task in sorted(tasks, key=lambda t: t.id):
+            records.extend(RECORD.pack(
+                task.id, *string(task.title), *string(task.description),
+                symbol(task.category), symbol(task.due_date),
+                symbol(task.status), PRIORITY_CODES[task.priority]))
+            count += 1
+            next_id = max(next_id, task.id)
+
+        tmp_filename = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, next_id, count,
+                                   len(symbols), len(heap)))
+            file.write(records)
+            file.write(symbol_table)
+            file.write(heap)
+            metrics.count('bytes_written', file.tell())
+            file.flush()
+            os.fsync(file.fileno())
+        self.close()
+        os.replace(tmp_filename, self.filename)
+
+    def commit(self, changes: list[Change], tasks: Iterable[Task]) -> bool:
+        self.save(tasks)
+        return True
+
+    def signature(self) -> Optional[list]:
+        stat = os.stat(self.filename)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def version(self) -> Optional[list]:
+        return file_version(self.filename)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+
+def import_json(json_filename: str, binary_filename: str) -> int:
+    """
+    Converts a JSON or JSON Lines task file into a binary snapshot.
+
+    Returns:
+        int: The number of converted tasks.
+    """
+    tasks = JsonStorage(json_filename).load()
+    BinaryStorage(binary_filename).save(tasks)
+    return len(tasks)
+
+
+def export_json(binary_filename: str, json_filename: str) -> int:
+    """
+    Converts a binary snapshot into a JSON or JSON Lines task file.
+
+    Returns:
+        int: The number of converted tasks.
+    """
+    storage = BinaryStorage(binary_filename)
+    tasks = storage.load()
+    storage.close()
+    JsonStorage(json_filename).save(tasks)
+    return len(tasks)
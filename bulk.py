@@ -0,0 +1,213 @@
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+
+from compression import base_name, open_text
+from dates import to_ordinal
+from exceptions import InvalidDate, InvalidPriority, TaskManagerException
+from priority import PRIORITIES
+from streaming import dump_records
+
+FIELDS = ('id', 'title', 'description', 'category', 'due_date', 'priority', 'status')
+REQUIRED_FIELDS = ('title', 'description', 'category', 'due_date', 'priority')
+STATUSES = ("Не выполнена", "Выполнена")
+CHUNK_ROWS = 10000
+
+
+class RowError(NamedTuple):
+    """
+    A row of an imported file that was rejected.
+
+    Attributes:
+        line (int): The line of the file the row ends on.
+        error (str): Why the row was rejected.
+    """
+    line: int
+    error: str
+
+
+def read_rows(filename: str) -> Iterator[tuple[int, object]]:
+    """
+    Streams the rows of a file to import. CSV files ('.csv', with a header
+    line) are parsed here, into dictionaries; JSON Lines rows are yielded as
+    raw lines, so that decoding them is spread over the validation workers.
+    Files ending in '.gz', '.bz2' or '.xz' are decompressed as they are read.
+
+    Yields:
+        tuple[int, dict | str]: The line number and the row.
+    """
+    with open_text(filename, newline='') as file:
+        if base_name(filename).endswith('.csv'):
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(file, 1):
+                if line.strip():
+                    yield line_number, line
+
+
+def validate_record(data) -> dict:
+    """
+    Checks a row to import and returns the fields of the new task. The ID of
+    the row, if any, is dropped: imported tasks get new IDs.
+
+    Raises:
+        ValueError: If the row is not a JSON object or a field is missing.
+        InvalidPriority: If the priority is not valid.
+        InvalidDate: If the due date is not valid.
+    """
+    if isinstance(data, str):
+        data = json.loads(data)
+    if not isinstance(data, dict):
+        raise ValueError('Строка не является объектом')
+    for field in REQUIRED_FIELDS:
+        if not isinstance(data.get(field), str):
+            raise ValueError(f'Не заполнено поле {field}')
+    if data['priority'] not in PRIORITIES:
+        raise InvalidPriority(data['priority'])
+    if to_ordinal(data['due_date']) is None:
+        raise InvalidDate(data['due_date'])
+    status = data.get('status') or STATUSES[0]
+    if status not in STATUSES:
+        raise ValueError(f'Неверный статус задачи: {status}')
+    return {'title': data['title'], 'description': data['description'],
+            'category': data['category'], 'due_date': data['due_date'],
+            'priority': data['priority'], 'status': status}
+
+
+def validate_chunk(rows: list[tuple[int, object]]) -> tuple[list[dict], list[RowError]]:
+    """
+    Validates a chunk of rows, in a worker process or in place.
+
+    Returns:
+        tuple[list[dict], list[RowError]]: The fields of the valid rows, in
+            order, and the rejected rows.
+    """
+    records, errors = [], []
+    for line, data in rows:
+        try:
+            records.append(validate_record(data))
+        except TaskManagerException as e:
+            errors.append(RowError(line, f'{e.message}: {e.args[0]}' if e.args
+                                   else e.message))
+        except ValueError as e:
+            errors.append(RowError(line, str(e)))
+    return records, errors
+
+
+def validate_rows(rows: Iterable[tuple[int, object]], workers: int = None,
+                  chunk_size: int = CHUNK_ROWS, queue_size: int = None
+                  ) -> Iterator[tuple[list[dict], list[RowError]]]:
+    """
+    Validates rows in chunks across a process pool and yields the results of
+    the chunks in order. At most queue_size chunks are in flight, so a slow
+    consumer stops the reading of the file instead of letting it pile up in
+    memory. A file that fits in one chunk is validated in place, and so is
+    the rest of the file if the pool breaks, e.g. because a worker could not
+    start.
+
+    Args:
+        rows (Iterable[tuple[int, object]]): The rows, as yielded by read_rows.
+        workers (int, optional): The number of worker processes. Defaults to
+            the number of CPUs; 1 validates everything in place.
+        chunk_size (int): The number of rows sent to a worker at a time.
+        queue_size (int, optional): The number of chunks in flight. Defaults
+            to twice the number of workers.
+
+    Yields:
+        tuple[list[dict], list[RowError]]: The result of validate_chunk for
+            every chunk.
+    """
+    rows = iter(rows)
+    chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+    first = next(chunks, None)
+    if first is None:
+        return
+    second = next(chunks, None)
+    workers = workers or os.cpu_count() or 1
+    if second is None:
+        yield validate_chunk(first)
+        return
+    chunks = chain((first, second), chunks)
+    if workers <= 1:
+        yield from map(validate_chunk, chunks)
+        return
+    queue_size = queue_size or 2 * workers
+    # the chunks in flight, kept until their result is yielded
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            for chunk in chunks:
+                if len(pending) >= queue_size:
+                    result = pending[0][1].result()
+                    pending.popleft()
+                    yield result
+                # queued before submitting, so that a chunk refused by a
+                # broken pool is not lost
+                pending.append((chunk, None))
+                pending[-1] = (chunk, pool.submit(validate_chunk, chunk))
+            while pending:
+                result = pending[0][1].result()
+                pending.popleft()
+                yield result
+    except BrokenProcessPool:
+        # the workers could not start or died: validate the rest in place
+        for chunk, _ in pending:
+            yield validate_chunk(chunk)
+        yield from map(validate_chunk, chunks)
+
+
+def read_records(filename: str, errors: Optional[IO[str]] = None,
+                 workers: int = None, chunk_size: int = CHUNK_ROWS
+                 ) -> tuple[list[dict], int]:
+    """
+    Reads and validates a whole file to import.
+
+    Args:
+        filename (str): A '.csv' file with a header line, or a JSON Lines file.
+        errors (IO[str], optional): A file the rejected rows are written to,
+            one JSON object with 'line' and 'error' per line.
+        workers (int, optional): The number of validation processes.
+        chunk_size (int): The number of rows validated at a time.
+
+    Returns:
+        tuple[list[dict], int]: The fields of the valid rows and the number
+            of rejected rows.
+    """
+    records, failed = [], 0
+    for valid, rejected in validate_rows(read_rows(filename), workers, chunk_size):
+        records += valid
+        failed += len(rejected)
+        if errors is not None:
+            for error in rejected:
+                errors.write(json.dumps(error._asdict(), ensure_ascii=False) + '\n')
+    return records, failed
+
+
+def write_records(records: Iterable[dict], filename: str) -> int:
+    """
+    Writes task dictionaries to a file one at a time: as CSV with a header
+    line for '.csv' files, as a JSON array for '.json' files and as JSON
+    Lines otherwise. Files ending in '.gz', '.bz2' or '.xz' are compressed
+    as they are written.
+
+    Returns:
+        int: The number of tasks written.
+    """
+    count = 0
+    with open_text(filename, 'w', newline='') as file:
+        if base_name(filename).endswith('.csv'):
+            writer = csv.DictWriter(file, FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for count, record in enumerate(records, 1):
+                writer.writerow(record)
+        else:
+            count = dump_records(records, file, indent=False,
+                                 json_lines=not base_name(filename).endswith('.json'))
+    return count
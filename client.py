@@ -0,0 +1,98 @@
+import json
+import socket
+from typing import Optional
+
+import exceptions
+from task import Task
+
+
+class TaskClient:
+    """
+    Talks to a running TaskServer over its Unix domain socket. TaskManager
+    methods are forwarded to the server under the same names, so a client can
+    be handed to IOHandler in place of a TaskManager.
+
+    Example:
+        client = TaskClient.connect('tasks.json.sock')
+        if client is not None:
+            client.complete_task(1)
+    """
+    load_time = 0.0
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The path of the server socket.
+
+        Raises:
+            OSError: If no server is listening on the socket.
+        """
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(path)
+        except OSError:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile('rwb')
+
+    @classmethod
+    def connect(cls, path: str) -> Optional['TaskClient']:
+        """
+        Returns a client connected to the server, or None if no server is running.
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            return None
+        try:
+            return cls(path)
+        except OSError:
+            return None
+
+    def call(self, method: str, *args, **kwargs):
+        """
+        Calls a method on the server and returns its result, with tasks
+        decoded back into Task objects.
+
+        Raises:
+            TaskManagerException: The error raised by the method on the server.
+        """
+        request = {'method': method, 'args': args, 'kwargs': kwargs}
+        # priorities are sent by value
+        self._file.write(json.dumps(request, ensure_ascii=False, default=str)
+                         .encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('The task server closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            error = response['error']
+            exception = getattr(exceptions, error['type'], None)
+            if not (isinstance(exception, type) and
+                    issubclass(exception, exceptions.TaskManagerException)):
+                exception = ValueError
+            raise exception(*error['args'])
+        return self._decode(response['result'])
+
+    @classmethod
+    def _decode(cls, result):
+        if isinstance(result, list):
+            return [cls._decode(item) for item in result]
+        if isinstance(result, dict) and 'id' in result:
+            return Task.from_dict(result)
+        return result
+
+    def flush(self) -> None:
+        """
+        Asks the server to persist its waiting mutations.
+        """
+        self.call('flush')
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
@@ -0,0 +1,88 @@
+import json
+from json.encoder import encode_basestring
+
+from priority import PRIORITIES, Priority
+from task import Task
+
+# the order of the fields in a row
+FIELDS = ('id', 'title', 'description', 'category', 'due_date', 'priority', 'status')
+DEFAULT_STATUS = "Не выполнена"
+
+# priorities are encoded once: they are the same few strings in every task
+_PRIORITY_JSON = {priority: encode_basestring(priority.value) for priority in Priority}
+
+
+def task_to_row(task: Task) -> tuple:
+    """
+    Returns the fields of a task as a tuple in FIELDS order, with the
+    priority by value.
+    """
+    return (task.id, task.title, task.description, task.category,
+            task.due_date, task.priority.value, task.status)
+
+
+def task_from_row(row: tuple) -> Task:
+    """
+    Builds a task from a tuple in FIELDS order.
+
+    Raises:
+        KeyError: If the priority is not valid.
+    """
+    return Task(row[0], row[1], row[2], row[3], row[4], PRIORITIES[row[5]], row[6])
+
+
+def task_to_dict(task: Task) -> dict:
+    """
+    Returns a task as a dictionary, as Task.to_dict does.
+    """
+    return dict(zip(FIELDS, task_to_row(task)))
+
+
+def task_from_dict(data: dict) -> Task:
+    """
+    Builds a task from a dictionary as written by task_to_dict. A missing
+    status means DEFAULT_STATUS.
+
+    Raises:
+        KeyError: If a field is missing or the priority is not valid.
+    """
+    return Task(data['id'], data['title'], data['description'], data['category'],
+                data['due_date'], PRIORITIES[data['priority']],
+                data.get('status', DEFAULT_STATUS))
+
+
+def encode_json(task: Task) -> str:
+    """
+    Encodes a task as a JSON object on one line, exactly as
+    json.dumps(task.to_dict(), ensure_ascii=False) does, but with a single
+    format string instead of a dictionary and the generic encoder.
+    """
+    try:
+        return (f'{{"id": {task.id:d}, "title": {encode_basestring(task.title)}, '
+                f'"description": {encode_basestring(task.description)}, '
+                f'"category": {encode_basestring(task.category)}, '
+                f'"due_date": {encode_basestring(task.due_date)}, '
+                f'"priority": {_PRIORITY_JSON[task.priority]}, '
+                f'"status": {encode_basestring(task.status)}}}')
+    except (TypeError, ValueError, KeyError):
+        # a field of an unexpected type
+        return json.dumps(task.to_dict(), ensure_ascii=False)
+
+
+def encode_json_indented(task: Task) -> str:
+    """
+    Encodes a task as an element of a JSON array written by json.dump with
+    indent=4.
+    """
+    try:
+        return (f'    {{\n        "id": {task.id:d},\n'
+                f'        "title": {encode_basestring(task.title)},\n'
+                f'        "description": {encode_basestring(task.description)},\n'
+                f'        "category": {encode_basestring(task.category)},\n'
+                f'        "due_date": {encode_basestring(task.due_date)},\n'
+                f'        "priority": {_PRIORITY_JSON[task.priority]},\n'
+                f'        "status": {encode_basestring(task.status)}\n    }}')
+    except (TypeError, ValueError, KeyError):
+        text = json.dumps(task.to_dict(), ensure_ascii=False, indent=4)
+        return '    ' + text.replace('\n', '\n    ')
+
@@ -0,0 +1,77 @@
+import io
+import os
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+# compressed file extensions and the stdlib modules that handle them
+CODECS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma'}
+GZIP_LEVEL = 6
+# the task file is rewritten on every save: presets above 3 take several
+# times longer for a file that is smaller by about a quarter
+XZ_PRESET = 3
+
+
+def codec_of(filename: str):
+    """
+    Returns the compression extension of a file name ('.gz', '.bz2' or
+    '.xz'), or None for an uncompressed file.
+    """
+    extension = os.path.splitext(filename)[1]
+    return extension if extension in CODECS else None
+
+
+def base_name(filename: str) -> str:
+    """
+    Returns a file name without its compression extension, which leaves the
+    extension of the data format: 'tasks.jsonl.gz' -> 'tasks.jsonl'.
+    """
+    extension = codec_of(filename)
+    return filename[:-len(extension)] if extension else filename
+
+
+def _compressor(raw: IO[bytes], extension: str, mode: str) -> IO[bytes]:
+    # the modules are imported on first use, so that plain stores do not pay for them
+    if extension == '.gz':
+        import gzip
+        # an empty name keeps the temporary file name out of the header
+        return gzip.GzipFile('', mode, GZIP_LEVEL, raw, mtime=0)
+    if extension == '.bz2':
+        import bz2
+        return bz2.BZ2File(raw, mode)
+    import lzma
+    return lzma.LZMAFile(raw, mode, preset=XZ_PRESET if mode == 'w' else None)
+
+
+@contextmanager
+def open_text(filename: str, mode: str = 'r', newline: str = None,
+              sync: bool = False) -> Iterator[IO[str]]:
+    """
+    Opens a UTF-8 text file, compressed or not by its extension. Compressed
+    files are (de)compressed as they are read or written, so that neither
+    the compressed nor the decompressed content is held in memory.
+
+    Args:
+        filename (str): The path of the file.
+        mode (str): 'r' to read or 'w' to write. Defaults to 'r'.
+        newline (str, optional): As for open.
+        sync (bool): If True, a written file is flushed to disk with fsync
+            before it is closed. Defaults to False.
+
+    Yields:
+        IO[str]: The text stream.
+    """
+    extension = codec_of(filename)
+    with open(filename, mode + 'b') as raw:
+        stream = raw if extension is None else _compressor(raw, extension, mode)
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline=newline)
+        try:
+            yield text
+        finally:
+            # leaves the streams open, so that raw can be synced
+            text.detach()
+            if stream is not raw:
+                # writes the end of the compressed stream, raw stays open
+                stream.close()
+        if sync:
+            raw.flush()
+            os.fsync(raw.fileno())
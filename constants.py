@@ -1,4 +1,21 @@
-from colorama import Fore
+import sys
+
+
+class _NoColor:
+    """
+    Stands in for colorama's Fore and Style when the output is not a
+    terminal: every color is an empty string.
+    """
+
+    def __getattr__(self, name):
+        return ''
+
+
+# colorama is not even imported when the output goes to a pipe or a file
+if sys.stdout is not None and sys.stdout.isatty():
+    from colorama import Fore, Style
+else:
+    Fore = Style = _NoColor()
 
 DELIMITER = Fore.LIGHTCYAN_EX + '~' * 42 + Fore.RESET
 BASE_EXCEPTION_MESSAGE = "Ошибка выполнения задачи:"
@@ -0,0 +1,42 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+
+from constants import DATE_FORMAT
+from exceptions import InvalidDate
+
+
+@lru_cache(maxsize=4096)
+def to_ordinal(due_date: str) -> Optional[int]:
+    """
+    Parses a due date once and returns its proleptic Gregorian ordinal.
+    Task files hold few distinct dates, so the results are cached.
+
+    Args:
+        due_date (str): A date in DATE_FORMAT.
+
+    Returns:
+        int | None: The ordinal of the date, or None if it cannot be parsed.
+    """
+    try:
+        return datetime.strptime(due_date, DATE_FORMAT).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def date_ordinal(today: str = None) -> int:
+    """
+    Returns the ordinal of the given date, or of the current date.
+
+    Args:
+        today (str, optional): A date in DATE_FORMAT.
+
+    Raises:
+        InvalidDate: If the date cannot be parsed.
+    """
+    if today is None:
+        return date.today().toordinal()
+    ordinal = to_ordinal(today)
+    if ordinal is None:
+        raise InvalidDate(today)
+    return ordinal
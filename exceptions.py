@@ -16,3 +16,7 @@ class InvalidPriority(TaskManagerException):
 
 class InvalidDate(TaskManagerException):
     message = 'Неверная дата выполнения задачи'
+
+
+class ConflictError(TaskManagerException):
+    message = 'Задача была изменена другим процессом'
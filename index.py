@@ -0,0 +1,194 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Optional
+
+from dates import to_ordinal
+from task import Task
+
+
+class TaskIndex:
+    """
+    In-memory indexes over a set of tasks: a primary index by id, secondary
+    indexes mapping category, status and priority values to the tasks that
+    have them, and due-date indexes of (date ordinal, id) pairs kept sorted,
+    one over all tasks and one over the tasks that are not completed yet.
+    Due dates that cannot be parsed are left out of the due-date indexes.
+    """
+    FIELDS = ('category', 'status', 'priority')
+
+    def __init__(self, tasks: Iterable[Task] = ()):
+        """
+        Args:
+            tasks (Iterable[Task]): The tasks to index.
+        """
+        self.by_id: dict[int, Task] = {}
+        self.by_field: dict[str, dict[object, dict[int, Task]]] = {
+            field: {} for field in self.FIELDS}
+        self.by_due_date: list[tuple[int, int]] = []
+        self.pending_by_due_date: list[tuple[int, int]] = []
+        self.extend(tasks)
+
+    def extend(self, tasks: Iterable[Task]) -> None:
+        """
+        Adds many tasks to all indexes, sorting the due-date indexes once
+        instead of inserting every key into them.
+
+        Args:
+            tasks (Iterable[Task]): The tasks to add.
+        """
+        for task in tasks:
+            self.by_id[task.id] = task
+            for field in self.FIELDS:
+                self._bucket(field, getattr(task, field))[task.id] = task
+            ordinal = to_ordinal(task.due_date)
+            if ordinal is not None:
+                self.by_due_date.append((ordinal, task.id))
+                if task.status != "Выполнена":
+                    self.pending_by_due_date.append((ordinal, task.id))
+        self.by_due_date.sort()
+        self.pending_by_due_date.sort()
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def _bucket(self, field: str, value) -> dict[int, Task]:
+        return self.by_field[field].setdefault(value, {})
+
+    def _discard(self, field: str, value, task_id: int) -> None:
+        bucket = self.by_field[field].get(value)
+        if bucket is not None:
+            bucket.pop(task_id, None)
+            if not bucket:
+                del self.by_field[field][value]
+
+    def _add_due_date(self, task_id: int, due_date: str, status: str) -> None:
+        ordinal = to_ordinal(due_date)
+        if ordinal is not None:
+            insort(self.by_due_date, (ordinal, task_id))
+            if status != "Выполнена":
+                insort(self.pending_by_due_date, (ordinal, task_id))
+
+    def _discard_due_date(self, task_id: int, due_date: str, status: str) -> None:
+        ordinal = to_ordinal(due_date)
+        if ordinal is None:
+            return
+        lists = [self.by_due_date]
+        if status != "Выполнена":
+            lists.append(self.pending_by_due_date)
+        for keys in lists:
+            i = bisect_left(keys, (ordinal, task_id))
+            if i < len(keys) and keys[i] == (ordinal, task_id):
+                del keys[i]
+
+    def add(self, task: Task) -> None:
+        """
+        Adds a task to all indexes.
+
+        Args:
+            task (Task): The task to add.
+        """
+        self.by_id[task.id] = task
+        for field in self.FIELDS:
+            self._bucket(field, getattr(task, field))[task.id] = task
+        self._add_due_date(task.id, task.due_date, task.status)
+
+    def remove(self, task: Task) -> None:
+        """
+        Removes a task from all indexes.
+
+        Args:
+            task (Task): The task to remove.
+        """
+        del self.by_id[task.id]
+        for field in self.FIELDS:
+            self._discard(field, getattr(task, field), task.id)
+        self._discard_due_date(task.id, task.due_date, task.status)
+
+    def update(self, task: Task, old: dict) -> None:
+        """
+        Moves a task that has already been modified in place between index
+        entries.
+
+        Args:
+            task (Task): The modified task.
+            old (dict): The values the modified attributes had before the change.
+        """
+        old_id = old.get('id', task.id)
+        if old_id != task.id:
+            del self.by_id[old_id]
+            self.by_id[task.id] = task
+        for field in self.FIELDS:
+            old_value = old.get(field, getattr(task, field))
+            if old_id != task.id or old_value != getattr(task, field):
+                self._discard(field, old_value, old_id)
+                self._bucket(field, getattr(task, field))[task.id] = task
+        old_due_date = old.get('due_date', task.due_date)
+        old_status = old.get('status', task.status)
+        if old_id != task.id or old_due_date != task.due_date or \
+                old_status != task.status:
+            self._discard_due_date(old_id, old_due_date, old_status)
+            self._add_due_date(task.id, task.due_date, task.status)
+
+    def get(self, task_id: int) -> Optional[Task]:
+        """
+        Returns the task with the given id, or None.
+        """
+        return self.by_id.get(task_id)
+
+    def lookup(self, **kwargs) -> list[Task]:
+        """
+        Returns the tasks matching all given field values, ordered by id.
+        The smallest matching bucket is scanned and checked against the rest.
+
+        Args:
+            **kwargs: Values for any of the indexed fields.
+
+        Returns:
+            list[Task]: The matching tasks.
+        """
+        buckets = sorted(
+            (self.by_field[field].get(value, {}) for field, value in kwargs.items()),
+            key=len)
+        if not buckets:
+            return list(self.by_id.values())
+        smallest, rest = buckets[0], buckets[1:]
+        results = [task for task_id, task in smallest.items()
+                   if all(task_id in bucket for bucket in rest)]
+        results.sort(key=lambda task: task.id)
+        return results
+
+    def due_between(self, start: int = None, end: int = None,
+                    pending: bool = False) -> list[Task]:
+        """
+        Returns the tasks whose due date lies in [start, end], ordered by due date.
+
+        Args:
+            start (int, optional): The ordinal of the first due date to include.
+            end (int, optional): The ordinal of the last due date to include.
+            pending (bool): If True, only tasks that are not completed are returned.
+
+        Returns:
+            list[Task]: The matching tasks.
+        """
+        keys = self.pending_by_due_date if pending else self.by_due_date
+        lo = 0 if start is None else bisect_left(keys, (start,))
+        hi = len(keys) if end is None else bisect_right(keys, (end, float('inf')))
+        return [self.by_id[task_id] for _, task_id in keys[lo:hi]]
+
+    def next_due(self, count: int, start: int) -> list[Task]:
+        """
+        Returns the first tasks that are not completed and are due on or after
+        the given day, ordered by due date.
+
+        Args:
+            count (int): The maximum number of tasks to return.
+            start (int): The ordinal of the first due date to include.
+
+        Returns:
+            list[Task]: The matching tasks.
+        """
+        lo = bisect_left(self.pending_by_due_date, (start,))
+        return [self.by_id[task_id]
+                for _, task_id in self.pending_by_due_date[lo:lo + count]]
@@ -1,18 +1,43 @@
+import contextlib
 import os
+import sys
+import tempfile
 
-from colorama import Style, Fore
-
+from batch import CHECKPOINT_OPS, run_batch
 from constants import DELIMITER, BASE_EXCEPTION_MESSAGE, COMMAND_PALETTE, \
-    ERROR_PALETTE
+    ERROR_PALETTE, Fore, Style
 from exceptions import TaskManagerException
+from output import write_tasks
+from sync import sync_stores
 from task import Task
 from task_manager import TaskManager
 
 
+PAGE_SIZE = 20
+
+
 class IOHandler:
-    tm: TaskManager = TaskManager()
+    def __init__(self, tm: TaskManager = None, write_behind: bool = False,
+                 filename: str = 'tasks.json'):
+        self._tm = tm
+        self.write_behind = write_behind
+        self.filename = filename
+
+    @property
+    def tm(self) -> TaskManager:
+        if self._tm is None:
+            self._tm = TaskManager(self.filename, lazy=True,
+                                   write_behind=self.write_behind)
+        return self._tm
 
-    def get_tasks(self):
+    @property
+    def load_time(self) -> float:
+        return self._tm.load_time if self._tm is not None else 0.0
+
+    def get_tasks(self, fmt='text'):
+        if fmt != 'text':
+            self.write_records(self.tm.records(), fmt)
+            return
         tasks = self.tm.get_tasks()
         self.print_(tasks)
 
@@ -63,9 +88,11 @@ class IOHandler:
             due_date = kwargs.get('due_date')
             priority = kwargs.get('priority')
         try:
-            self.tm.edit_task(task_id, title=title, description=description,
-                              category=category, due_date=due_date,
-                              priority=priority)
+            changes = dict(title=title, description=description,
+                           category=category, due_date=due_date,
+                           priority=priority)
+            self.tm.edit_task(task_id, **{key: value for key, value
+                                          in changes.items() if value is not None})
         except TaskManagerException as e:
             print(BASE_EXCEPTION_MESSAGE, e)
         else:
@@ -91,16 +118,150 @@ class IOHandler:
         else:
             print("Задача удалена.")
 
-    def find_task(self):
-        keyword = input(
-            "Введите ключевое слово для поиска (или оставьте пустым): ")
-        category = input("Введите категорию для поиска (или оставьте пустым): ")
-        status = input(
-            "Введите статус для поиска (Выполнена/Не выполнена или оставьте пустым): ")
-        tasks = self.tm.find_task(keyword=keyword or None,
-                                  category=category or None,
-                                  status=status or None)
-        self.print_(tasks)
+    def delete_cat_tasks(self, category=None):
+        if not category:
+            category = input("Введите категорию задач для удаления: ")
+        try:
+            count = self.tm.delete_tasks_by_category(category)
+        except TaskManagerException as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+        else:
+            print(f"Удалено задач: {count}.")
+
+    def find_task(self, fmt='text', page=None, **kwargs):
+        if fmt != 'text' or page is not None:
+            self.show(fmt, page, keyword=kwargs.get('keyword'),
+                      category=kwargs.get('category') or None,
+                      status=kwargs.get('status') or None,
+                      order_by=kwargs.get('order_by'), limit=kwargs.get('limit'),
+                      offset=kwargs.get('offset') or 0)
+            return
+        if not kwargs:
+            kwargs = {
+                'keyword': input(
+                    "Введите ключевое слово для поиска (или оставьте пустым): "),
+                'category': input(
+                    "Введите категорию для поиска (или оставьте пустым): "),
+                'status': input("Введите статус для поиска "
+                                "(Выполнена/Не выполнена или оставьте пустым): "),
+            }
+        try:
+            tasks = self.tm.find_task(**kwargs)
+        except (TaskManagerException, ValueError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+        else:
+            self.print_(tasks)
+
+    def fuzzy_search(self, keyword, category=None, status=None, limit=None,
+                     min_score=0.7, fmt='text'):
+        try:
+            results = self.tm.fuzzy_search(keyword, category, status,
+                                           limit=limit or 10, min_score=min_score)
+        except (TaskManagerException, ValueError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+            return
+        if fmt != 'text':
+            self.write_records(({**task.to_dict(), 'score': score}
+                                for task, score in results), fmt)
+            return
+        if not results:
+            print(ERROR_PALETTE + 'Задачи не найдены.')
+        print(DELIMITER)
+        for task, score in results:
+            print(f'Совпадение: {score:.0%}')
+            print(task)
+            print(DELIMITER)
+
+    def sync(self, filename, delta_dir=None):
+        other = TaskManager(os.path.abspath(filename))
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                sent, received = sync_stores(self.tm, other, delta_dir or directory)
+        except (TaskManagerException, ValueError, OSError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+            return
+        finally:
+            other.close()
+        print(f"Отправлено задач: {sent}, получено: {received}.")
+
+    def import_tasks(self, filename, errors=None, workers=None):
+        errors = os.path.abspath(errors or filename + '.errors.jsonl')
+        try:
+            imported, failed = self.tm.import_file(os.path.abspath(filename),
+                                                   errors, workers)
+        except (TaskManagerException, ValueError, OSError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+            return
+        print(f"Импортировано задач: {imported}.")
+        if failed:
+            print(ERROR_PALETTE + f"Отклонено строк: {failed}, подробности в {errors}"
+                  + Fore.RESET)
+        else:
+            os.remove(errors)
+
+    def run_batch(self, filename=None, output=None, checkpoint=CHECKPOINT_OPS):
+        try:
+            with contextlib.ExitStack() as stack:
+                source = sys.stdin if filename in (None, '-') else \
+                    stack.enter_context(open(filename, 'r', encoding='utf-8'))
+                target = sys.stdout if output is None else \
+                    stack.enter_context(open(output, 'w', encoding='utf-8'))
+                done, failed = run_batch(self.tm, source, target, checkpoint)
+        except (TaskManagerException, ValueError, OSError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e, file=sys.stderr)
+            return
+        print(f"Выполнено операций: {done}, с ошибками: {failed}.", file=sys.stderr)
+
+    def export_tasks(self, filename):
+        try:
+            count = self.tm.export_file(os.path.abspath(filename))
+        except (TaskManagerException, ValueError, OSError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+        else:
+            print(f"Экспортировано задач: {count}.")
+
+    def get_overdue_tasks(self):
+        try:
+            tasks = self.tm.get_overdue_tasks()
+        except TaskManagerException as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+        else:
+            self.print_(tasks)
+
+    def get_due_tasks(self, start=None, end=None):
+        if start is None and end is None:
+            start = input("Введите начальную дату (ГГГГ-ММ-ДД или оставьте пустым): ")
+            end = input("Введите конечную дату (ГГГГ-ММ-ДД или оставьте пустым): ")
+        try:
+            tasks = self.tm.get_tasks_due(start or None, end or None)
+        except TaskManagerException as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+        else:
+            self.print_(tasks)
+
+    def get_next_due_tasks(self, count=None):
+        if count is None:
+            count = int(input("Сколько задач показать: ") or 10)
+        self.print_(self.tm.get_next_due_tasks(count))
+
+    def show_stats(self, today=None):
+        try:
+            stats = self.tm.stats(today)
+        except TaskManagerException as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+            return
+        print(f"Всего задач: {stats['total']}, выполнено: {stats['done']}, "
+              f"просрочено: {stats['overdue']}")
+        print(DELIMITER)
+        for status, count in stats['by_status'].items():
+            print(f'{status}: {count}')
+        for priority, count in stats['by_priority'].items():
+            print(f'Приоритет {priority}: {count}')
+        print(DELIMITER)
+        print(f"{'Категория':<24}{'Всего':>8}{'Выполн.':>9}{'%':>6}{'Просроч.':>10}")
+        for category, row in stats['categories'].items():
+            print(f"{category[:23]:<24}{row['total']:>8}{row['done']:>9}"
+                  f"{row['completion']:>6.0%}{row['overdue']:>10}")
 
     def interactive(self):
         actions = {
@@ -111,6 +272,11 @@ class IOHandler:
             5: ('Выполнить задачу', self.complete_task),
             6: ('Удалить задачу', self.delete_task),
             7: ('Поиск задач', self.find_task),
+            8: ('Удалить задачи категории', self.delete_cat_tasks),
+            9: ('Просроченные задачи', self.get_overdue_tasks),
+            10: ('Ближайшие задачи', self.get_next_due_tasks),
+            11: ('Задачи по сроку выполнения', self.get_due_tasks),
+            12: ('Статистика', self.show_stats),
             0: ('Выход', self.exit),
         }
 
@@ -133,15 +299,55 @@ class IOHandler:
                 print(Fore.RED + "Не понял тебя. Попробуй снова.")
                 print(Style.RESET_ALL)
 
-    def get_tasks_by(self, category):
-        self.tm.get_tasks_by(category=category)
+    def get_tasks_by(self, category=None, order_by=None, limit=None, offset=0,
+                     fmt='text', page=None):
+        if fmt != 'text' or page is not None:
+            self.show(fmt, page, category=category or None, order_by=order_by,
+                      limit=limit, offset=offset)
+            return
+        try:
+            tasks = self.tm.get_tasks_by(category=category or None,
+                                         order_by=order_by, limit=limit,
+                                         offset=offset)
+        except (TaskManagerException, ValueError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+        else:
+            self.print_(tasks)
+
+    def show(self, fmt='text', page=None, limit=None, offset=0, **kwargs):
+        if page is not None:
+            limit = limit or PAGE_SIZE
+            offset = (page - 1) * limit
+        try:
+            if fmt == 'text':
+                tasks = self.tm.get_tasks_by(limit=limit, offset=offset, **kwargs)
+                self.print_(tasks)
+            else:
+                self.write_records(self.tm.records(limit=limit, offset=offset,
+                                                   **kwargs), fmt)
+                return
+        except (TaskManagerException, ValueError) as e:
+            print(BASE_EXCEPTION_MESSAGE, e)
+            return
+        if page is not None and tasks:
+            print(f"Страница {page}: задачи {offset + 1}–{offset + len(tasks)}.")
+            if len(tasks) == limit:
+                print(f"Следующая страница: --page {page + 1}")
+
+    @staticmethod
+    def write_records(records, fmt):
+        try:
+            write_tasks(records, sys.stdout, fmt)
+        except BrokenPipeError:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
 
     @staticmethod
     def clear():
         os.system('cls') if os.name == 'nt' else os.system('clear')
 
-    @staticmethod
-    def exit():
+    def exit(self):
+        if self._tm is not None:
+            self._tm.close()
         print('Пока-пока')
         exit()
 
@@ -151,6 +357,4 @@ class IOHandler:
             print(ERROR_PALETTE + 'Задачи не найдены.')
 
         print(DELIMITER)
-        for task in tasks:
-            print(task)
-            print(DELIMITER)
\ No newline at end of file
+        IOHandler.write_records(tasks, 'text')
\ No newline at end of file
@@ -0,0 +1,80 @@
+import json
+import os
+from typing import Iterator
+
+from metrics import metrics
+
+
+class Journal:
+    """
+    Append-only log of task mutations stored next to the snapshot file.
+
+    Every record is a single JSON line of the form
+    ``{"op": "add" | "edit" | "delete", "id": <task id>, "fields": {...}}``,
+    or ``{"op": "batch", "changes": [...]}`` for changes that must be applied
+    together.
+    Records are idempotent (``add`` is an upsert, ``edit`` overwrites fields,
+    ``delete`` ignores missing tasks), so replaying a journal on top of a
+    snapshot that already contains some of its effects is harmless.
+    """
+
+    def __init__(self, filename: str):
+        """
+        Args:
+            filename (str): The path of the journal file.
+        """
+        self.filename = filename
+        self.size = 0
+
+    @staticmethod
+    def _count(record: dict) -> int:
+        return len(record['changes']) if record['op'] == 'batch' else 1
+
+    def append(self, records: list[dict]) -> None:
+        """
+        Appends records to the journal and forces them to disk.
+
+        Args:
+            records (list[dict]): The mutation records to append.
+        """
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                       for record in records).encode('utf-8')
+        with open(self.filename, 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        metrics.count('bytes_written', len(data))
+        self.size += sum(map(self._count, records))
+
+    def replay(self) -> Iterator[dict]:
+        """
+        Yields the records stored in the journal in the order they were written.
+        A torn last line left by a crash in the middle of an append is cut off,
+        so that subsequent appends start on a clean line.
+
+        Yields:
+            dict: A mutation record.
+        """
+        self.size = 0
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'rb+') as file:
+            data = file.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                file.truncate(end)
+        metrics.count('bytes_read', len(data))
+        for line in data[:end].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self.size += self._count(record)
+                metrics.count('journal_records')
+                yield record
+
+    def truncate(self) -> None:
+        """
+        Empties the journal once its records are part of the snapshot.
+        """
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        self.size = 0
@@ -0,0 +1,39 @@
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class FileLock:
+    """
+    Advisory lock on a file shared by the processes working with the same task
+    store. Readers take it shared, writers exclusive. On platforms without
+    fcntl the lock does nothing.
+
+    Example:
+        with FileLock('tasks.json.lock'):
+            ...
+    """
+
+    def __init__(self, filename: str, shared: bool = False):
+        """
+        Args:
+            filename (str): The path of the lock file. It is created if needed.
+            shared (bool): If True, other shared holders are allowed at the same time.
+        """
+        self.filename = filename
+        self.shared = shared
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.filename, 'a')
+            fcntl.flock(self._file.fileno(),
+                        fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
@@ -1,95 +1,258 @@
 import argparse
+import sys
+import time
+
+started = time.perf_counter()
 
-from iohandler import IOHandler
 from priority import Priority
-from task_manager import TaskManager
-
-task_manager = TaskManager()
-
-parser = argparse.ArgumentParser(description='Менеджер задач')
-subparsers = parser.add_subparsers(dest='command', help='Доступные команды')
-
-# Команда для добавления задачи
-p_add = subparsers.add_parser('add', help='Добавить новую задачу')
-p_add.add_argument('--title',
-                   required=True, help='Название задачи')
-p_add.add_argument('--description',
-                   required=True, help='Описание задачи')
-
-p_add.add_argument('--category',
-                   required=True, help='Категория задачи')
-p_add.add_argument('--due_date',
-                   required=True, help='Срок выполнения (ГГГГ-ММ-ДД)')
-p_add.add_argument('--priority', required=True,
-                   choices=Priority.list(), help='Приоритет задачи')
-
-# Команда для просмотра задач
-p_list = subparsers.add_parser('list', help='Просмотр задач')
-p_list.add_argument('--category',
-                    help='Категория для отображения задач')
-
-# Команда для редактирования задачи
-p_edit = subparsers.add_parser('edit', help='Редактировать задачу')
-p_edit.add_argument('--id', required=True, type=int,
-                    help='ID задачи для редактирования')
-p_edit.add_argument('--title', help='Новое название задачи')
-p_edit.add_argument('--description', help='Новое описание задачи')
-p_edit.add_argument('--category', help='Новая категория задачи')
-p_edit.add_argument('--due_date',
-                    help='Новый срок выполнения (ГГГГ-ММ-ДД)')
-p_edit.add_argument('--priority', help='Новый приоритет задачи',
-                    choices=Priority.list())
-
-# Команда для отметки задачи как выполненной
-p_complete = subparsers.add_parser('complete',
-                                   help='Отметить задачу как выполненную')
-p_complete.add_argument('--id', required=True, type=int,
-                        help='ID задачи для отметки как выполненной')
-
-# Команда для удаления задачи
-p_delete = subparsers.add_parser('delete', help='Удалить задачу')
-p_delete.add_argument('--id', type=int, help='ID задачи для удаления')
-p_delete.add_argument('--category', help='Категория задач для удаления')
-
-# Команда для поиска задач
-p_search = subparsers.add_parser('search', help='Поиск задач')
-p_search.add_argument('--keyword', help='Ключевое слово для поиска')
-p_search.add_argument('--category', help='Категория для поиска')
-p_search.add_argument('--status', choices=['Выполнена', 'Не выполнена'],
-                      help='Статус задачи для поиска')
-
-# Команда для интерактивного режима
-p_interactive = subparsers.add_parser('it',
-                                      help='Режим интерактивного взаимодействия')
-args = parser.parse_args()
-
-display = IOHandler()
-
-match args.command:
-    case 'it':
-        display.interactive()
-    case 'add':
-        display.add_task(**vars(args))
-    case 'list':
-        if args.category:
-            tasks = display.get_tasks_by(category=args.category)
-        else:
-            tasks = display.get_tasks()
-    case 'edit':
-        data = {
-            'id': args.id,
-            'title': args.title,
-            'description': args.description,
-            'category': args.category,
-            'due_date': args.due_date,
-            'priority': args.priority
-        }
-        display.edit_task(**data)
-    case 'complete':
-        display.complete_task(args.id)
-    case 'delete':
-        display.delete_task(args.id)
-    case 'search':
-        display.find_task(**args)
-    case _:
-        parser.print_help()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Менеджер задач')
+    parser.add_argument('--timing', action='store_true',
+                        help='Показать время запуска, загрузки и выполнения команды')
+    parser.add_argument('--profile', action='store_true',
+                        help='Вывести в stderr профиль cProfile и время операций')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='Сохранить метрики в файл (.prom — формат Prometheus, '
+                             'иначе JSON)')
+    parser.add_argument('--file', dest='task_file', metavar='FILE', default='tasks.json',
+                        help='Файл задач, формат хранения выбирается по расширению '
+                             '(по умолчанию tasks.json)')
+    parser.add_argument('--socket',
+                        help='Сокет сервера задач (по умолчанию <файл задач>.sock)')
+    subparsers = parser.add_subparsers(dest='command', help='Доступные команды')
+
+    # Команда для добавления задачи
+    p_add = subparsers.add_parser('add', help='Добавить новую задачу')
+    p_add.add_argument('--title',
+                       required=True, help='Название задачи')
+    p_add.add_argument('--description',
+                       required=True, help='Описание задачи')
+
+    p_add.add_argument('--category',
+                       required=True, help='Категория задачи')
+    p_add.add_argument('--due_date',
+                       required=True, help='Срок выполнения (ГГГГ-ММ-ДД)')
+    p_add.add_argument('--priority', required=True,
+                       choices=Priority.list(), help='Приоритет задачи')
+
+    # Команда для просмотра задач
+    p_list = subparsers.add_parser('list', help='Просмотр задач')
+    p_list.add_argument('--category',
+                        help='Категория для отображения задач')
+
+    # Команда для редактирования задачи
+    p_edit = subparsers.add_parser('edit', help='Редактировать задачу')
+    p_edit.add_argument('--id', required=True, type=int,
+                        help='ID задачи для редактирования')
+    p_edit.add_argument('--title', help='Новое название задачи')
+    p_edit.add_argument('--description', help='Новое описание задачи')
+    p_edit.add_argument('--category', help='Новая категория задачи')
+    p_edit.add_argument('--due_date',
+                        help='Новый срок выполнения (ГГГГ-ММ-ДД)')
+    p_edit.add_argument('--priority', help='Новый приоритет задачи',
+                        choices=Priority.list())
+
+    # Команда для отметки задачи как выполненной
+    p_complete = subparsers.add_parser('complete',
+                                       help='Отметить задачу как выполненную')
+    p_complete.add_argument('--id', required=True, type=int,
+                            help='ID задачи для отметки как выполненной')
+
+    # Команда для удаления задачи
+    p_delete = subparsers.add_parser('delete', help='Удалить задачу')
+    p_delete.add_argument('--id', type=int, help='ID задачи для удаления')
+    p_delete.add_argument('--category', help='Категория задач для удаления')
+
+    # Команда для поиска задач
+    p_search = subparsers.add_parser('search', help='Поиск задач')
+    p_search.add_argument('--keyword', help='Ключевое слово для поиска')
+    p_search.add_argument('--category', help='Категория для поиска')
+    p_search.add_argument('--status', choices=['Выполнена', 'Не выполнена'],
+                          help='Статус задачи для поиска')
+    p_search.add_argument('--fuzzy', action='store_true',
+                          help='Нечёткий поиск: ключевое слово может содержать опечатки, '
+                               'задачи выводятся по убыванию сходства (--limit, по умолчанию 10)')
+    p_search.add_argument('--min-score', type=float, default=0.7,
+                          help='Наименьшее сходство при нечётком поиске (по умолчанию 0.7)')
+
+    # Сортировка и постраничный вывод для просмотра и поиска
+    for subparser in (p_list, p_search):
+        subparser.add_argument('--sort',
+                               help='Поля для сортировки через запятую, "-" перед '
+                                    'полем — по убыванию (например: --sort=-priority,due_date)')
+        subparser.add_argument('--limit', type=int,
+                               help='Максимальное количество задач')
+        subparser.add_argument('--offset', type=int, default=0,
+                               help='Сколько первых задач пропустить (по умолчанию 0)')
+        subparser.add_argument('--page', type=int,
+                               help='Номер страницы по --limit задач (по умолчанию 20)')
+        subparser.add_argument('--format', choices=['text', 'json', 'ndjson', 'tsv'],
+                               default='text', help='Формат вывода (по умолчанию text)')
+
+    # Команды для работы со сроками выполнения
+    p_overdue = subparsers.add_parser('overdue', help='Просроченные задачи')
+
+    p_due = subparsers.add_parser('due', help='Задачи со сроком в заданном интервале')
+    p_due.add_argument('--start', help='Начальная дата (ГГГГ-ММ-ДД)')
+    p_due.add_argument('--end', help='Конечная дата (ГГГГ-ММ-ДД)')
+
+    p_next = subparsers.add_parser('next', help='Ближайшие невыполненные задачи')
+    p_next.add_argument('--count', type=int, default=10,
+                        help='Количество задач (по умолчанию 10)')
+
+    # Команда для сводки по задачам
+    p_stats = subparsers.add_parser('stats', help='Статистика задач по статусам и категориям')
+    p_stats.add_argument('--today', help='Текущая дата (ГГГГ-ММ-ДД) для подсчёта просроченных')
+
+    # Команды для массового импорта и экспорта задач
+    p_import = subparsers.add_parser('import', help='Импортировать задачи из CSV или JSON Lines')
+    p_import.add_argument('file', help='Файл .csv (со строкой заголовков) или .jsonl')
+    p_import.add_argument('--errors',
+                          help='Файл отчёта об отклонённых строках '
+                               '(по умолчанию <файл>.errors.jsonl)')
+    p_import.add_argument('--workers', type=int,
+                          help='Количество процессов проверки (по умолчанию по числу ядер)')
+
+    p_export = subparsers.add_parser('export', help='Экспортировать задачи в файл')
+    p_export.add_argument('file', help='Файл .csv, .json или .jsonl')
+
+    # Команда для выполнения операций из файла JSON Lines
+    p_batch = subparsers.add_parser('batch',
+                                    help='Выполнить операции из файла JSON Lines или stdin')
+    p_batch.add_argument('file', nargs='?', default='-',
+                         help='Файл операций, по одной на строку (по умолчанию stdin)')
+    p_batch.add_argument('--output',
+                         help='Файл результатов JSON Lines (по умолчанию stdout)')
+    p_batch.add_argument('--checkpoint', type=int, default=10000,
+                         help='Сколько операций сохранять одной записью '
+                              '(по умолчанию 10000, 0 — один раз в конце)')
+
+    # Команда для синхронизации с другим хранилищем
+    p_sync = subparsers.add_parser('sync', help='Синхронизировать задачи с другим файлом задач')
+    p_sync.add_argument('file', help='Файл задач другого хранилища')
+    p_sync.add_argument('--delta-dir',
+                        help='Каталог для файлов изменений (по умолчанию временный)')
+
+    # Команда для запуска сервера
+    p_serve = subparsers.add_parser('serve',
+                                    help='Запустить сервер, держащий задачи в памяти')
+
+    # Команда для интерактивного режима
+    p_interactive = subparsers.add_parser('it',
+                                          help='Режим интерактивного взаимодействия')
+    args = parser.parse_args()
+    socket_path = args.socket or args.task_file + '.sock'
+
+    if args.profile or args.metrics:
+        from metrics import metrics
+
+        metrics.enable()
+
+    if args.command == 'serve':
+        from server import serve
+        serve(socket_path, args.task_file)
+        if args.metrics:
+            metrics.write(args.metrics)
+        return
+
+    # Если сервер запущен, команды выполняются через него;
+    # синхронизация читает файлы задач сама
+    from client import TaskClient
+
+    client = TaskClient.connect(socket_path) if args.command != 'sync' else None
+
+    # Менеджер задач импортируется и создаётся только для команд, которым он нужен
+    from iohandler import IOHandler
+
+    imported = time.perf_counter()
+    # В интерактивном режиме изменения записываются в фоне
+    display = IOHandler(client, write_behind=args.command == 'it',
+                        filename=args.task_file)
+
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    match args.command:
+        case 'it':
+            display.interactive()
+        case 'add':
+            display.add_task(**vars(args))
+        case 'list':
+            if args.category or args.sort or args.limit is not None or args.offset \
+                    or args.page is not None:
+                display.get_tasks_by(category=args.category, order_by=args.sort,
+                                     limit=args.limit, offset=args.offset,
+                                     fmt=args.format, page=args.page)
+            else:
+                display.get_tasks(args.format)
+        case 'edit':
+            data = {
+                'id': args.id,
+                'title': args.title,
+                'description': args.description,
+                'category': args.category,
+                'due_date': args.due_date,
+                'priority': args.priority
+            }
+            display.edit_task(**data)
+        case 'complete':
+            display.complete_task(args.id)
+        case 'delete':
+            if args.category:
+                display.delete_cat_tasks(args.category)
+            else:
+                display.delete_task(args.id)
+        case 'overdue':
+            display.get_overdue_tasks()
+        case 'due':
+            display.get_due_tasks(args.start or '', args.end or '')
+        case 'next':
+            display.get_next_due_tasks(args.count)
+        case 'stats':
+            display.show_stats(args.today)
+        case 'sync':
+            display.sync(args.file, args.delta_dir)
+        case 'import':
+            display.import_tasks(args.file, args.errors, args.workers)
+        case 'batch':
+            display.run_batch(args.file, args.output, args.checkpoint)
+        case 'export':
+            display.export_tasks(args.file)
+        case 'search' if args.fuzzy and args.keyword:
+            display.fuzzy_search(args.keyword, args.category, args.status,
+                                 args.limit, args.min_score, args.format)
+        case 'search':
+            display.find_task(keyword=args.keyword, category=args.category,
+                              status=args.status, order_by=args.sort,
+                              limit=args.limit, offset=args.offset,
+                              fmt=args.format, page=args.page)
+        case _:
+            parser.print_help()
+
+    if args.profile:
+        profiler.disable()
+        import pstats
+
+        print(metrics.summary(), file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+    if args.metrics:
+        metrics.write(args.metrics)
+
+    if args.timing:
+        finished = time.perf_counter()
+        load = display.load_time
+        print(f"Запуск: {(imported - started) * 1000:.1f} мс, "
+              f"загрузка: {load * 1000:.1f} мс, "
+              f"команда: {(finished - imported - load) * 1000:.1f} мс, "
+              f"всего: {(finished - started) * 1000:.1f} мс", file=sys.stderr)
+
+
+# Пул процессов импорта запускает этот модуль заново в каждом процессе
+# (метод spawn в Windows и macOS), поэтому команда выполняется только здесь
+if __name__ == '__main__':
+    main()
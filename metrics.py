@@ -0,0 +1,190 @@
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import nullcontext
+
+# upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Counts observed durations in the BUCKETS ranges and keeps their sum.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        Returns (upper bound, number of observations up to it) pairs, ending
+        with '+Inf', as in the Prometheus histogram format.
+        """
+        pairs = []
+        total = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), self.counts):
+            total += count
+            pairs.append((str(bound), total))
+        return pairs
+
+
+class _Timer:
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+
+
+class Metrics:
+    """
+    Operation counters, latency histograms and byte/task counters of
+    TaskManager and the storage backends. Disabled by default: until enable
+    is called, every recording method returns after a single flag check.
+
+    Example:
+        metrics.enable()
+        ...
+        metrics.write('metrics.prom')
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """
+        Drops everything recorded so far.
+        """
+        self.counters: dict[str, int] = defaultdict(int)
+        self.histograms: dict[str, Histogram] = defaultdict(Histogram)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Adds a value to a counter, e.g. 'bytes_read' or 'tasks_hydrated'.
+        """
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Records the duration of an operation.
+        """
+        if self.enabled:
+            with self._lock:
+                self.histograms[name].observe(seconds)
+
+    def timer(self, name: str):
+        """
+        Returns a context manager that records the duration of its block as
+        an operation.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return _Timer(self, name)
+
+    def timed(self, method):
+        """
+        Decorator that records the duration of every call of a function as
+        an operation named after it, without the leading underscore.
+        """
+        name = method.__name__.lstrip('_')
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return method(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - started)
+        return wrapper
+
+    def to_dict(self) -> dict:
+        """
+        Returns the recorded metrics as JSON-compatible values.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'operations': {
+                    name: {'count': histogram.count, 'sum': histogram.sum,
+                           'buckets': dict(histogram.cumulative())}
+                    for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the recorded metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE taskmanager_{name}_total counter')
+                lines.append(f'taskmanager_{name}_total {value}')
+            if self.histograms:
+                lines.append('# TYPE taskmanager_operation_seconds histogram')
+            for name, histogram in sorted(self.histograms.items()):
+                label = f'operation="{name}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'taskmanager_operation_seconds_bucket'
+                                 f'{{{label},le="{bound}"}} {count}')
+                lines.append(f'taskmanager_operation_seconds_sum{{{label}}} '
+                             f'{histogram.sum}')
+                lines.append(f'taskmanager_operation_seconds_count{{{label}}} '
+                             f'{histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """
+        Returns a human-readable table of the operations and counters.
+        """
+        lines = [f"{'операция':<28} {'вызовы':>8} {'всего, мс':>12} {'среднее, мс':>12}"]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items(),
+                                          key=lambda item: -item[1].sum):
+                lines.append(f'{name:<28} {histogram.count:>8} '
+                             f'{histogram.sum * 1000:>12.3f} '
+                             f'{histogram.sum / histogram.count * 1000:>12.3f}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{name:<28} {value:>8}')
+        return '\n'.join(lines)
+
+    def write(self, filename: str) -> None:
+        """
+        Writes the metrics to a file: in the Prometheus text format for files
+        ending in '.prom' or '.txt', as JSON otherwise.
+        """
+        if filename.endswith(('.prom', '.txt')):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.to_dict(), ensure_ascii=False, indent=4)
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write(data)
+
+
+metrics = Metrics()
@@ -0,0 +1,89 @@
+import json
+from itertools import islice
+from typing import IO, Iterable, Union
+
+from codec import FIELDS, encode_json
+from constants import DELIMITER
+from task import Task
+
+FORMATS = ('text', 'json', 'ndjson', 'tsv')
+# tasks rendered into a single write call
+CHUNK_TASKS = 1000
+
+_TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _text(task: Union[Task, dict]) -> str:
+    if isinstance(task, dict):
+        task = Task.from_dict(task)
+    return f'{task}\n{DELIMITER}\n'
+
+
+def _json(task: Union[Task, dict]) -> str:
+    if isinstance(task, Task):
+        return encode_json(task)
+    return json.dumps(task, ensure_ascii=False)
+
+
+def _escape(value) -> str:
+    value = str(value)
+    # most values have nothing to escape, and these checks run in C
+    if value.isprintable() and '\\' not in value:
+        return value
+    return value.translate(_TSV_ESCAPES)
+
+
+def _tsv(task: Union[Task, dict]) -> str:
+    data = task.to_dict() if isinstance(task, Task) else task
+    return '\t'.join(_escape(data.get(field, "Не выполнена" if field == 'status' else ''))
+                     for field in FIELDS) + '\n'
+
+
+def write_tasks(tasks: Iterable[Union[Task, dict]], stream: IO[str],
+                fmt: str = 'text') -> int:
+    """
+    Writes tasks to a stream as they come, rendering CHUNK_TASKS tasks at a
+    time into a single write, so that long listings cost one write call per
+    chunk instead of a print call per line.
+
+    Formats:
+        text: the tasks as shown in the interactive mode, each followed by
+            a delimiter line;
+        json: a JSON array of task objects;
+        ndjson: one JSON task object per line;
+        tsv: a header line with the field names, then one line per task with
+            backslashes, tabs and line breaks escaped as \\\\, \\t, \\n and \\r.
+
+    Args:
+        tasks (Iterable[Task | dict]): The tasks, or task dictionaries.
+        stream (IO[str]): The stream to write to.
+        fmt (str): One of FORMATS.
+
+    Returns:
+        int: The number of tasks written.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Неизвестный формат вывода: {fmt}')
+    tasks = iter(tasks)
+    count = 0
+    if fmt == 'tsv':
+        stream.write('\t'.join(FIELDS) + '\n')
+    elif fmt == 'json':
+        stream.write('[')
+    while chunk := list(islice(tasks, CHUNK_TASKS)):
+        if fmt == 'text':
+            stream.write(''.join(map(_text, chunk)))
+        elif fmt == 'tsv':
+            stream.write(''.join(map(_tsv, chunk)))
+        elif fmt == 'ndjson':
+            stream.write('\n'.join(map(_json, chunk)) + '\n')
+        else:
+            stream.write((',\n' if count else '\n') + ',\n'.join(map(_json, chunk)))
+        count += len(chunk)
+    if fmt == 'json':
+        stream.write('\n]\n' if count else ']\n')
+    stream.flush()
+    return count
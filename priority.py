@@ -15,3 +15,7 @@ class Priority(enum.Enum):
     @classmethod
     def list(cls):
         return list(map(lambda c: c.value, cls))
+
+
+# priorities by value, so that parsing one is a dictionary lookup
+PRIORITIES = {priority.value: priority for priority in Priority}
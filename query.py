@@ -0,0 +1,496 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from operator import attrgetter
+from typing import Iterable, NamedTuple, Optional, Sequence, Union
+
+from dates import to_ordinal
+from exceptions import InvalidDate, InvalidPriority
+from index import TaskIndex
+from priority import PRIORITIES, Priority
+from task import Task
+from text_index import TextIndex
+
+FIELDS = Task.__slots__
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(Priority)}
+
+
+def _get(item: Union[Task, dict], field: str):
+    """
+    Returns a field of a task, or of a task dictionary read from a task file.
+    """
+    if type(item) is not dict:
+        return getattr(item, field)
+    if field == 'priority':
+        return PRIORITIES[item['priority']]
+    if field == 'status':
+        return item.get('status', "Не выполнена")
+    return item[field]
+
+
+def _check_field(field: str) -> None:
+    if field not in FIELDS:
+        raise ValueError(f"Invalid attribute: {field}")
+
+
+def _coerce(field: str, value):
+    """
+    Converts a value given for a field into the type the field is stored as.
+    """
+    if field == 'priority' and not isinstance(value, Priority):
+        if not isinstance(value, str) or value not in PRIORITIES:
+            raise InvalidPriority(value)
+        return PRIORITIES[value]
+    return value
+
+
+def sort_value(field: str, value):
+    """
+    Returns the value a field is compared and sorted by: priorities by
+    rank, due dates by day (invalid dates first), other fields as they are.
+    """
+    if field == 'priority':
+        return PRIORITY_RANK[value]
+    if field == 'due_date':
+        ordinal = to_ordinal(value)
+        return -1 if ordinal is None else ordinal
+    return value
+
+
+class Predicate:
+    """
+    A condition on tasks. Predicates are combined with & and |.
+
+    Besides checking single tasks, a predicate can tell how many tasks the
+    in-memory indexes would hand it (estimate) and return them (candidates),
+    so that a query scans the most selective index instead of all tasks.
+    """
+
+    def matches(self, item: Union[Task, dict]) -> bool:
+        """
+        Checks a task, or a task dictionary read from a task file.
+        """
+        raise NotImplementedError
+
+    def estimate(self, index: TaskIndex,
+                 text_index: Optional[TextIndex] = None) -> Optional[int]:
+        """
+        Returns the number of candidates an index would provide, or None if
+        no index can narrow the search.
+        """
+        return None
+
+    def candidates(self, index: TaskIndex,
+                   text_index: Optional[TextIndex] = None) -> Iterable[Task]:
+        """
+        Returns a superset of the matching tasks taken from an index. Only
+        called when estimate is not None.
+        """
+        raise NotImplementedError
+
+    def to_sql(self) -> tuple[str, list]:
+        """
+        Returns an SQL condition over the tasks table and its parameters.
+        """
+        raise NotImplementedError
+
+    def __and__(self, other: 'Predicate') -> 'Predicate':
+        return And(self, other)
+
+    def __or__(self, other: 'Predicate') -> 'Predicate':
+        return Or(self, other)
+
+
+class Eq(Predicate):
+    """
+    The field equals a value.
+    """
+
+    def __init__(self, field: str, value):
+        _check_field(field)
+        self.field = field
+        self.value = _coerce(field, value)
+
+    def matches(self, item) -> bool:
+        return _get(item, self.field) == self.value
+
+    def estimate(self, index, text_index=None):
+        if self.field == 'id':
+            return 1
+        if self.field in TaskIndex.FIELDS:
+            return len(index.by_field[self.field].get(self.value, ()))
+        return None
+
+    def candidates(self, index, text_index=None):
+        if self.field == 'id':
+            task = index.get(self.value)
+            return [task] if task is not None else []
+        return index.by_field[self.field].get(self.value, {}).values()
+
+    def to_sql(self):
+        value = self.value.value if isinstance(self.value, Priority) else self.value
+        return f'{self.field} = ?', [value]
+
+
+class In(Predicate):
+    """
+    The field equals one of the values.
+    """
+
+    def __init__(self, field: str, values: Iterable):
+        _check_field(field)
+        self.field = field
+        self.values = {_coerce(field, value) for value in values}
+
+    def matches(self, item) -> bool:
+        return _get(item, self.field) in self.values
+
+    def estimate(self, index, text_index=None):
+        if self.field == 'id':
+            return len(self.values)
+        if self.field in TaskIndex.FIELDS:
+            buckets = index.by_field[self.field]
+            return sum(len(buckets.get(value, ())) for value in self.values)
+        return None
+
+    def candidates(self, index, text_index=None):
+        if self.field == 'id':
+            return [task for task in map(index.get, self.values) if task is not None]
+        buckets = index.by_field[self.field]
+        return chain.from_iterable(buckets.get(value, {}).values()
+                                   for value in self.values)
+
+    def to_sql(self):
+        values = [value.value if isinstance(value, Priority) else value
+                  for value in self.values]
+        return f"{self.field} IN ({', '.join('?' * len(values))})", values
+
+
+class Range(Predicate):
+    """
+    The field lies between start and end, both included; either bound may be
+    omitted. Due dates are compared as dates and priorities by rank. Ranges
+    of due dates are looked up in the due date index, and ranges of IDs with
+    both bounds in the ID index, or by scanning it if they are wider than
+    the number of tasks.
+    """
+
+    def __init__(self, field: str, start=None, end=None):
+        _check_field(field)
+        self.field = field
+        self.start = self._bound(start)
+        self.end = self._bound(end)
+
+    def _bound(self, value):
+        if value is None:
+            return None
+        if self.field == 'due_date' and to_ordinal(value) is None:
+            raise InvalidDate(value)
+        return sort_value(self.field, _coerce(self.field, value))
+
+    def matches(self, item) -> bool:
+        value = sort_value(self.field, _get(item, self.field))
+        if self.field == 'due_date' and value < 0:
+            return False
+        return (self.start is None or value >= self.start) and \
+            (self.end is None or value <= self.end)
+
+    def _slice(self, index: TaskIndex) -> tuple[int, int]:
+        keys = index.by_due_date
+        lo = 0 if self.start is None else bisect_left(keys, (self.start,))
+        hi = len(keys) if self.end is None else \
+            bisect_right(keys, (self.end, float('inf')))
+        return lo, hi
+
+    def estimate(self, index, text_index=None):
+        if self.field == 'id' and self.start is not None and self.end is not None:
+            return min(max(self.end - self.start + 1, 0), len(index.by_id))
+        if self.field != 'due_date':
+            return None
+        lo, hi = self._slice(index)
+        return max(hi - lo, 0)
+
+    def candidates(self, index, text_index=None):
+        if self.field == 'id':
+            if self.end - self.start + 1 > len(index.by_id):
+                return [task for task_id, task in index.by_id.items()
+                        if self.start <= task_id <= self.end]
+            return [index.by_id[task_id] for task_id in range(self.start, self.end + 1)
+                    if task_id in index.by_id]
+        lo, hi = self._slice(index)
+        return [index.by_id[task_id] for _, task_id in index.by_due_date[lo:hi]]
+
+    def to_sql(self):
+        column, clauses, params = _sql_column(self.field), [], []
+        for operator, bound in (('>=', self.start), ('<=', self.end)):
+            if bound is not None:
+                clauses.append(f'{column} {operator} ?')
+                params.append(bound)
+        if self.field == 'due_date':
+            clauses.append(f'{column} IS NOT NULL')
+        return ' AND '.join(clauses) or '1', params
+
+
+class Contains(Predicate):
+    """
+    The title or the description contains a keyword, ignoring case.
+    """
+
+    def __init__(self, keyword: str):
+        self.keyword = keyword.lower()
+        self._ids = None
+
+    def matches(self, item) -> bool:
+        if type(item) is not dict:
+            return self.keyword in item.title.lower() or \
+                self.keyword in item.description.lower()
+        return self.keyword in item['title'].lower() or \
+            self.keyword in item['description'].lower()
+
+    def _candidate_ids(self, text_index: Optional[TextIndex]) -> Optional[set]:
+        if self._ids is None and text_index is not None:
+            self._ids = text_index.candidates(self.keyword)
+        return self._ids
+
+    def estimate(self, index, text_index=None):
+        ids = self._candidate_ids(text_index)
+        return None if ids is None else len(ids)
+
+    def candidates(self, index, text_index=None):
+        return [index.by_id[task_id] for task_id in self._candidate_ids(text_index)
+                if task_id in index.by_id]
+
+    def to_sql(self):
+        return ('(instr(py_lower(title), ?) > 0 '
+                'OR instr(py_lower(description), ?) > 0)', [self.keyword] * 2)
+
+
+class And(Predicate):
+    """
+    All of the predicates hold. The index of the most selective one is scanned.
+    """
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def matches(self, item) -> bool:
+        return all(predicate.matches(item) for predicate in self.predicates)
+
+    def _best(self, index, text_index) -> tuple[Optional[int], Optional[Predicate]]:
+        best = (None, None)
+        for predicate in self.predicates:
+            estimate = predicate.estimate(index, text_index)
+            if estimate is not None and (best[0] is None or estimate < best[0]):
+                best = (estimate, predicate)
+        return best
+
+    def estimate(self, index, text_index=None):
+        return self._best(index, text_index)[0]
+
+    def candidates(self, index, text_index=None):
+        return self._best(index, text_index)[1].candidates(index, text_index)
+
+    def to_sql(self):
+        return _join_sql(self.predicates, ' AND ')
+
+
+class Or(Predicate):
+    """
+    At least one of the predicates holds. Indexes are used only if every
+    predicate can use one.
+    """
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def matches(self, item) -> bool:
+        return any(predicate.matches(item) for predicate in self.predicates)
+
+    def estimate(self, index, text_index=None):
+        estimates = [predicate.estimate(index, text_index)
+                     for predicate in self.predicates]
+        if None in estimates:
+            return None
+        return sum(estimates)
+
+    def candidates(self, index, text_index=None):
+        tasks = {}
+        for predicate in self.predicates:
+            for task in predicate.candidates(index, text_index):
+                tasks[task.id] = task
+        return tasks.values()
+
+    def to_sql(self):
+        return _join_sql(self.predicates, ' OR ')
+
+
+def _join_sql(predicates: Sequence[Predicate], operator: str) -> tuple[str, list]:
+    clauses, params = [], []
+    for predicate in predicates:
+        clause, clause_params = predicate.to_sql()
+        clauses.append(f'({clause})')
+        params += clause_params
+    return operator.join(clauses) or '1', params
+
+
+def _sql_column(field: str) -> str:
+    if field == 'priority':
+        return 'CASE priority ' + ' '.join(
+            f"WHEN '{priority.value}' THEN {rank}"
+            for priority, rank in PRIORITY_RANK.items()) + ' END'
+    if field == 'due_date':
+        # the ordinal as in sort_value: SQLite's date() rejects dates such as
+        # 2024-1-5, and invalid dates become NULL and sort first
+        return 'py_ordinal(due_date)'
+    return field
+
+
+def where(keyword: str = None, **kwargs) -> Optional[Predicate]:
+    """
+    Builds a predicate from keyword arguments, all of which must hold:
+    ``field=value`` for equality, ``field__in=values`` for a set of values,
+    ``field__gte=value`` and ``field__lte=value`` for a range, and
+    ``keyword=text`` for a case-insensitive search in the title and
+    description. Arguments that are None are ignored.
+
+    Example:
+        where(category='Работа', due_date__lte='2024-12-31',
+              priority__in=['Высокий', 'Средний'])
+
+    Returns:
+        Predicate | None: The predicate, or None if there are no conditions.
+
+    Raises:
+        ValueError: If a field does not exist.
+    """
+    predicates = [Contains(keyword)] if keyword else []
+    ranges = {}
+    for name, value in kwargs.items():
+        if value is None:
+            continue
+        field, _, operator = name.partition('__')
+        if operator == '':
+            predicates.append(Eq(field, value))
+        elif operator == 'in':
+            predicates.append(In(field, value))
+        elif operator in ('gte', 'lte'):
+            ranges.setdefault(field, {})['start' if operator == 'gte' else 'end'] = value
+        else:
+            raise ValueError(f"Invalid condition: {name}")
+    predicates += [Range(field, **bounds) for field, bounds in ranges.items()]
+    if not predicates:
+        return None
+    return predicates[0] if len(predicates) == 1 else And(*predicates)
+
+
+class _Descending:
+    """
+    Wraps a sort key so that it sorts in reverse.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: '_Descending') -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: '_Descending') -> bool:
+        return self.value == other.value
+
+
+class Query(NamedTuple):
+    """
+    A task query: the tasks matching a predicate, sorted by one or more
+    fields, with an optional offset and limit.
+
+    Attributes:
+        where (Predicate): The condition, or None for all tasks.
+        order_by (tuple[str]): The fields to sort by, each optionally prefixed
+            with '-' for descending order. Tasks are sorted by ID by default.
+        limit (int): The maximum number of tasks to return, or None.
+        offset (int): The number of leading tasks to skip.
+    """
+    where: Optional[Predicate] = None
+    order_by: tuple = ()
+    limit: Optional[int] = None
+    offset: int = 0
+
+    @classmethod
+    def build(cls, where: Predicate = None, order_by=None, limit: int = None,
+              offset: int = 0) -> 'Query':
+        """
+        Builds a query, accepting order_by as a comma-separated string.
+
+        Raises:
+            ValueError: If a sort field does not exist.
+        """
+        if isinstance(order_by, str):
+            order_by = order_by.split(',')
+        order_by = tuple(field.strip() for field in order_by or () if field.strip())
+        for field in order_by:
+            _check_field(field.lstrip('-'))
+        return cls(where, order_by, limit, offset or 0)
+
+    def key(self):
+        """
+        Returns the sort key function for the tasks: their ID unless the
+        query sorts by other fields.
+        """
+        if not self.order_by:
+            return attrgetter('id')
+        fields = [(field.lstrip('-'), field.startswith('-'))
+                  for field in self.order_by]
+
+        def key(task: Task) -> tuple:
+            return tuple(_Descending(sort_value(field, getattr(task, field)))
+                         if descending else sort_value(field, getattr(task, field))
+                         for field, descending in fields) + (task.id,)
+        return key
+
+    def arrange(self, tasks: Iterable[Task]) -> list[Task]:
+        """
+        Sorts matching tasks and applies the offset and limit. With a limit,
+        only offset + limit tasks are kept in a bounded heap.
+        """
+        if self.limit is None:
+            return sorted(tasks, key=self.key())[self.offset:]
+        return heapq.nsmallest(self.offset + self.limit, tasks,
+                               key=self.key())[self.offset:]
+
+    def filter(self, items: Iterable) -> Iterable:
+        """
+        Yields the tasks or task dictionaries matching the predicate.
+        """
+        if self.where is None:
+            return items
+        return filter(self.where.matches, items)
+
+    def run(self, index: TaskIndex, text_index: TextIndex = None) -> list[Task]:
+        """
+        Answers the query from the in-memory indexes, scanning the candidates
+        of the most selective predicate instead of all tasks when possible.
+        """
+        tasks = index
+        if self.where is not None and \
+                self.where.estimate(index, text_index) is not None:
+            tasks = self.where.candidates(index, text_index)
+        return self.arrange(self.filter(tasks))
+
+    def to_sql(self) -> tuple[str, list]:
+        """
+        Returns the WHERE, ORDER BY, LIMIT and OFFSET clauses of the query
+        over the tasks table and their parameters.
+        """
+        sql, params = '', []
+        if self.where is not None:
+            clause, params = self.where.to_sql()
+            sql = f'WHERE {clause}'
+        order = [f"{_sql_column(field.lstrip('-'))}"
+                 f"{' DESC' if field.startswith('-') else ''}"
+                 for field in self.order_by]
+        sql += ' ORDER BY ' + ', '.join(order + ['id'])
+        if self.limit is not None or self.offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params = params + [-1 if self.limit is None else self.limit, self.offset]
+        return sql, params
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import signal
+from typing import Iterator
+
+from exceptions import TaskManagerException
+from metrics import metrics
+from task import Task
+from task_manager import TaskManager
+
+METHODS = ('get_tasks', 'get_task_by_id', 'records', 'find_task', 'get_tasks_by',
+           'fuzzy_search', 'get_overdue_tasks', 'get_tasks_due', 'get_next_due_tasks',
+           'add_task', 'edit_task', 'delete_task', 'complete_task',
+           'delete_tasks_by_category', 'import_file', 'export_file', 'stats',
+           'flush')
+
+
+def encode_result(result):
+    """
+    Converts the result of a TaskManager method into JSON-compatible values.
+    """
+    if isinstance(result, Task):
+        return result.to_dict()
+    if isinstance(result, (list, tuple, Iterator)):
+        return [encode_result(item) for item in result]
+    return result
+
+
+class TaskServer:
+    """
+    Serves a single resident TaskManager over a Unix domain socket.
+
+    Requests and responses are JSON objects, one per line:
+    ``{"method": "add_task", "args": [...], "kwargs": {...}}`` is answered with
+    ``{"result": ...}`` or ``{"error": {"type": ..., "args": [...]}}``, where
+    tasks are encoded as by Task.to_dict. A connection can send any number of
+    requests. The "metrics" method returns the metrics of the server process,
+    if they are enabled.
+
+    The task manager is expected to run in write-behind mode, so that
+    mutations are acknowledged as soon as they are applied in memory and many
+    of them are persisted with a single store write. Requests are handled in
+    the default executor of the event loop, so a request that waits for the
+    task manager does not hold up the connections of other clients.
+    """
+
+    def __init__(self, task_manager: TaskManager, path: str):
+        """
+        Args:
+            task_manager (TaskManager): The task manager to serve.
+            path (str): The path of the Unix domain socket.
+        """
+        self.task_manager = task_manager
+        self.path = path
+
+    def handle_request(self, request: dict) -> dict:
+        """
+        Calls the requested TaskManager method.
+
+        Args:
+            request (dict): The decoded request.
+
+        Returns:
+            dict: The response to send back.
+        """
+        method = request.get('method')
+        if method == 'metrics':
+            return {'result': metrics.to_dict()}
+        if method not in METHODS:
+            return {'error': {'type': 'ValueError',
+                              'args': [f'Unknown method: {method}']}}
+        try:
+            result = getattr(self.task_manager, method)(
+                *request.get('args', ()), **request.get('kwargs', {}))
+        except (TaskManagerException, ValueError, TypeError, OSError) as e:
+            return {'error': {'type': type(e).__name__,
+                              'args': [str(arg) for arg in e.args]}}
+        return {'result': encode_result(result)}
+
+    def respond(self, line: bytes) -> bytes:
+        """
+        Decodes a request line, calls the requested method and encodes the
+        response line.
+        """
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            response = {'error': {'type': 'ValueError', 'args': [str(e)]}}
+        else:
+            if isinstance(request, dict):
+                response = self.handle_request(request)
+            else:
+                response = {'error': {'type': 'ValueError',
+                                      'args': ['Request must be a JSON object']}}
+        return json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                # the task manager may wait for its lock or the store, so it
+                # runs in a thread while the loop keeps serving other clients
+                writer.write(await loop.run_in_executor(None, self.respond, line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        """
+        Accepts connections until cancelled, then removes the socket.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = await asyncio.start_unix_server(self._handle, self.path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def serve(path: str, filename: str = 'tasks.json') -> None:
+    """
+    Runs a TaskServer for the given task file until interrupted. Mutations
+    are persisted in the background every 50 ms and when the server stops;
+    JSON task files get a journal, so that a flush appends the mutations
+    instead of rewriting the whole file.
+    """
+    async def main():
+        # stop on SIGTERM as on Ctrl+C, flushing the waiting mutations
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel)
+        await TaskServer(task_manager, path).serve()
+
+    task_manager = TaskManager(filename, journal=True, write_behind=True,
+                               flush_interval=0.05)
+    print(f"Сервер запущен: {path}")
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        task_manager.close()
+        print("Сервер остановлен")
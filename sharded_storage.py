@@ -0,0 +1,347 @@
+import json
+import os
+import struct
+from array import array
+from dataclasses import replace
+from typing import Iterable, Optional
+
+from codec import task_from_dict
+from metrics import metrics
+from query import And, Eq, In, Query, Range
+from storage import Change, JsonStorage, Storage, file_version
+from streaming import iter_records
+from task import Task
+
+MANIFEST = 'manifest.json'
+IDS = 'ids'
+# generation of the manifest the ID map was written for
+IDS_HEADER = struct.Struct('<Q')
+
+
+class ShardedStorage(Storage):
+    """
+    Stores tasks in a directory with one JSON Lines shard per category, a
+    manifest with the file and task count of every shard and the highest task
+    ID, and a map from task IDs to shard numbers.
+
+    Shards are read only when a call needs them: a query on a category reads
+    only that shard, and a lookup by ID reads only the shard the ID map
+    points to. A commit rewrites only the shards its changes touch. Shard
+    files are never overwritten: changed shards are written under the new
+    generation of the manifest, and renaming the new manifest into place
+    switches to all of them at once, so a task moved between categories is
+    never lost or duplicated, even by a crash.
+
+    Like SqliteStorage, the backend is not resident and merges concurrent
+    changes itself: commits re-read the manifest under the store lock and
+    apply edits field by field to the current shards.
+    """
+    resident = False
+
+    def __init__(self, filename: str):
+        """
+        Args:
+            filename (str): The path of the shard directory.
+        """
+        self.filename = filename
+        self._manifest = None
+        self._version = None
+        self._shards: dict[str, dict[int, Task]] = {}
+        self._categories_by_number: dict[int, str] = {}
+        self._ids: Optional[array] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.filename, name)
+
+    def _refresh(self) -> dict:
+        """
+        Reads the manifest unless it has not changed since it was last read.
+        Loaded shards stay cached by file name, so only shards rewritten by
+        another process are read again.
+        """
+        path = self._path(MANIFEST)
+        if not os.path.exists(path):
+            os.makedirs(self.filename, exist_ok=True)
+            self._write_manifest({'generation': 0, 'next_id': 0, 'next_shard': 1,
+                                  'shards': {}})
+        version = file_version(path)
+        if self._manifest is not None and version == self._version:
+            return self._manifest
+        with open(path, 'r', encoding='utf-8') as file:
+            self._manifest = json.load(file)
+        self._version = version
+        self._categories_by_number = {shard['number']: category for category, shard
+                                      in self._manifest['shards'].items()}
+        files = {shard['file'] for shard in self._manifest['shards'].values()}
+        self._shards = {name: tasks for name, tasks in self._shards.items()
+                        if name in files}
+        self._ids = None
+        return self._manifest
+
+    def _write_manifest(self, manifest: dict) -> None:
+        path = self._path(MANIFEST)
+        tmp_filename = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, path)
+
+    def _shard(self, name: str) -> dict[int, Task]:
+        """
+        Returns the tasks of a shard file by ID, reading it on first use.
+        """
+        tasks = self._shards.get(name)
+        if tasks is None:
+            tasks = {data['id']: task_from_dict(data)
+                     for data in iter_records(self._path(name))}
+            metrics.count('tasks_hydrated', len(tasks))
+            self._shards[name] = tasks
+        return tasks
+
+    def _read(self, categories: Iterable[str]) -> list[dict[int, Task]]:
+        """
+        Returns the shards of some categories.
+        """
+        categories = list(categories)
+        try:
+            shards = self._refresh()['shards']
+            return [self._shard(shards[category]['file'])
+                    for category in categories if category in shards]
+        except FileNotFoundError:
+            # another process replaced the shards after the manifest was read
+            self._manifest = None
+            shards = self._refresh()['shards']
+            return [self._shard(shards[category]['file'])
+                    for category in categories if category in shards]
+
+    def _all(self) -> list[dict[int, Task]]:
+        return self._read(self._refresh()['shards'])
+
+    def _id_map(self) -> array:
+        """
+        Returns the shard number of every task ID (0 for none), reading the
+        persisted map, or rebuilding it from all shards if it was not written
+        for the current manifest.
+        """
+        manifest = self._refresh()
+        if self._ids is not None:
+            return self._ids
+        path = self._path(IDS)
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                header = file.read(IDS_HEADER.size)
+                if len(header) == IDS_HEADER.size and \
+                        IDS_HEADER.unpack(header)[0] == manifest['generation']:
+                    self._ids = array('I')
+                    self._ids.frombytes(file.read())
+                    return self._ids
+        ids = array('I', bytes(4 * (manifest['next_id'] + 1)))
+        for category, shard in manifest['shards'].items():
+            for task_id in self._read([category])[0]:
+                ids[task_id] = shard['number']
+        self._ids = ids
+        return ids
+
+    def load(self) -> list[Task]:
+        tasks = [task for shard in self._all() for task in shard.values()]
+        tasks.sort(key=lambda task: task.id)
+        return tasks
+
+    def get(self, task_id: int) -> Optional[Task]:
+        """
+        Returns a copy of the task, so that callers can modify it before
+        committing the change. Only the shard holding the task is read.
+        """
+        ids = self._id_map()
+        number = ids[task_id] if 0 < task_id < len(ids) else 0
+        category = self._category(number)
+        if category is None:
+            return None
+        task = self._read([category])[0].get(task_id)
+        return replace(task) if task is not None else None
+
+    def _category(self, number: int) -> Optional[str]:
+        self._refresh()
+        return self._categories_by_number.get(number)
+
+    def query(self, query: Query) -> list[Task]:
+        """
+        Reads only the shards of the categories the query is restricted to,
+        or of the tasks of a range of IDs.
+        """
+        categories = self._categories(query.where)
+        shards = self._all() if categories is None else self._read(categories)
+        return query.arrange(query.filter(
+            task for shard in shards for task in shard.values()))
+
+    def _categories(self, where) -> Optional[set]:
+        """
+        Returns the categories a predicate is restricted to, or None if it
+        may match tasks of any category.
+        """
+        conditions = where.predicates if isinstance(where, And) else (where,)
+        categories = None
+        for condition in conditions:
+            if isinstance(condition, (Eq, In)) and condition.field == 'category':
+                values = {condition.value} if isinstance(condition, Eq) \
+                    else condition.values
+            elif isinstance(condition, Range) and condition.field == 'id' and \
+                    condition.start is not None and condition.end is not None:
+                ids = self._id_map()
+                values = {self._category(ids[task_id])
+                          for task_id in range(max(condition.start, 1),
+                                               min(condition.end + 1, len(ids)))}
+                values.discard(None)
+            else:
+                continue
+            categories = values if categories is None else categories & values
+        return categories
+
+    def max_id(self) -> int:
+        """
+        Returns the highest task ID ever assigned, so that the IDs of deleted
+        tasks are not reused.
+        """
+        return self._refresh()['next_id']
+
+    def save(self, tasks: Iterable[Task]) -> None:
+        manifest = self._refresh()
+        touched = {category: {} for category in manifest['shards']}
+        moved = {}
+        next_id = 0
+        for task in tasks:
+            touched.setdefault(task.category, {})[task.id] = task
+            moved[task.id] = task.category
+            next_id = max(next_id, task.id)
+        self._write(manifest, touched, moved, next_id, array('I'))
+
+    def commit(self, changes: list[Change], tasks: Iterable[Task]) -> bool:
+        """
+        Applies the changes to the current shards and writes the touched
+        shards and the manifest. Edits only set the changed fields, so edits
+        made by other processes to other fields are kept, and a new task whose
+        ID was taken by another process in the meantime gets the next free ID.
+        """
+        manifest = self._refresh()
+        shards = manifest['shards']
+        ids = self._id_map()
+        next_id = manifest['next_id']
+        # the tasks of the touched categories after the changes, by ID
+        touched: dict[str, dict[int, Task]] = {}
+        # the category of every added, moved or deleted task ID, None if deleted
+        moved: dict[int, Optional[str]] = {}
+
+        def shard_of(category: str) -> dict[int, Task]:
+            if category not in touched:
+                touched[category] = dict(self._read([category])[0]) \
+                    if category in shards else {}
+            return touched[category]
+
+        def locate(task_id: int) -> Optional[str]:
+            if task_id in moved:
+                return moved[task_id]
+            return self._category(ids[task_id] if 0 < task_id < len(ids) else 0)
+
+        renumbered = {}
+        for change in changes:
+            task_id = renumbered.get(change.task_id, change.task_id)
+            category = locate(task_id)
+            if change.op == 'add':
+                if category is not None:
+                    change.task.id = next_id + 1
+                    renumbered[change.task_id] = change.task.id
+                task = replace(change.task)
+            elif category is None:
+                continue
+            elif change.op == 'edit' and change.fields:
+                task = shard_of(category).pop(task_id, None)
+                if task is None:
+                    continue
+                task = replace(task, **{key: getattr(change.task, key)
+                                        for key in change.fields})
+                moved[task_id] = None
+            elif change.op == 'delete':
+                shard_of(category).pop(task_id, None)
+                moved[task_id] = None
+                continue
+            else:
+                continue
+            shard_of(task.category)[task.id] = task
+            moved[task.id] = task.category
+            next_id = max(next_id, task.id)
+        if touched:
+            self._write(manifest, touched, moved, next_id, ids)
+        return False
+
+    def _write(self, manifest: dict, touched: dict[str, dict[int, Task]],
+               moved: dict[int, Optional[str]], next_id: int, ids: array) -> None:
+        """
+        Writes the touched shards under the next generation, then the ID map
+        and the manifest that switches to them, and removes the replaced
+        shard files.
+
+        Args:
+            manifest (dict): The current manifest.
+            touched (dict[str, dict[int, Task]]): The complete new contents
+                of the rewritten shards, by category.
+            moved (dict[int, str | None]): The new category of every task ID
+                whose shard changed, or None for deleted tasks.
+            next_id (int): The highest task ID ever assigned.
+            ids (array): The ID map to apply the moves to.
+        """
+        generation = manifest['generation'] + 1
+        shards = dict(manifest['shards'])
+        next_shard = manifest['next_shard']
+        obsolete = []
+        for category, tasks in touched.items():
+            old = shards.pop(category, None)
+            if old is not None:
+                obsolete.append(old['file'])
+            if not tasks:
+                continue
+            if old is not None:
+                number = old['number']
+            else:
+                number, next_shard = next_shard, next_shard + 1
+            name = f'{number}.{generation}.jsonl'
+            JsonStorage(self._path(name)).save(
+                sorted(tasks.values(), key=lambda task: task.id))
+            shards[category] = {'number': number, 'file': name, 'count': len(tasks)}
+            self._shards[name] = tasks
+
+        ids = array('I', ids)
+        if len(ids) <= next_id:
+            ids.extend(bytes(4 * (next_id + 1 - len(ids))))
+        for task_id, category in moved.items():
+            ids[task_id] = shards[category]['number'] if category is not None else 0
+        path = self._path(IDS)
+        tmp_filename = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'wb') as file:
+            file.write(IDS_HEADER.pack(generation))
+            ids.tofile(file)
+        os.replace(tmp_filename, path)
+
+        manifest = {'generation': generation, 'next_id': next_id,
+                    'next_shard': next_shard, 'shards': shards}
+        self._write_manifest(manifest)
+        self._manifest = manifest
+        self._version = file_version(self._path(MANIFEST))
+        self._categories_by_number = {shard['number']: category
+                                      for category, shard in shards.items()}
+        self._ids = ids
+        for name in obsolete:
+            self._shards.pop(name, None)
+            os.remove(self._path(name))
+
+    def signature(self) -> Optional[list]:
+        return [self._refresh()['generation']]
+
+    def version(self) -> Optional[list]:
+        return None
+
+    def close(self) -> None:
+        self._manifest = None
+        self._shards = {}
+        self._categories_by_number = {}
+        self._ids = None
@@ -0,0 +1,197 @@
+import heapq
+import sqlite3
+from datetime import date
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from codec import task_from_row, task_to_row
+from constants import DATE_FORMAT
+from dates import to_ordinal
+from metrics import metrics
+from priority import Priority
+from query import Query
+from stats import TaskStats
+from storage import Change, Storage
+from task import Task
+
+COLUMNS = ('id', 'title', 'description', 'category', 'due_date', 'priority',
+           'status')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    due_date TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_category ON tasks (category);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (priority);
+CREATE INDEX IF NOT EXISTS tasks_due_date ON tasks (due_date);
+CREATE INDEX IF NOT EXISTS tasks_counts ON tasks (category, status, due_date);
+CREATE INDEX IF NOT EXISTS tasks_odd_due_date ON tasks (id)
+    WHERE due_date IS NOT date(due_date);
+'''
+
+
+class SqliteStorage(Storage):
+    """
+    Stores tasks in an SQLite database with indexed category, status,
+    priority and due_date columns. Each change is a single-row statement,
+    and reads are answered by SQL queries, so the tasks are never loaded
+    into memory as a whole.
+    """
+    resident = False
+    aggregates = True
+
+    def __init__(self, filename: str):
+        """
+        Args:
+            filename (str): The path of the database file.
+        """
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        self.conn.create_function('py_lower', 1, str.lower, deterministic=True)
+        self.conn.create_function('py_ordinal', 1, to_ordinal, deterministic=True)
+        self.conn.executescript(SCHEMA)
+
+    # the columns are in codec.FIELDS order
+    _row = staticmethod(task_to_row)
+    _task = staticmethod(task_from_row)
+
+    def _select(self, where: str = '', params: tuple = (),
+                order: str = 'id') -> list[Task]:
+        query = f"SELECT {', '.join(COLUMNS)} FROM tasks {where} ORDER BY {order}"
+        tasks = [self._task(row) for row in self.conn.execute(query, params)]
+        metrics.count('tasks_hydrated', len(tasks))
+        return tasks
+
+    def load(self) -> list[Task]:
+        return self._select()
+
+    def records(self) -> Iterator[dict]:
+        """
+        Streams the rows straight from the cursor, without building Task objects.
+        """
+        for row in self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM tasks ORDER BY id"):
+            yield dict(zip(COLUMNS, row))
+
+    def get(self, task_id: int) -> Optional[Task]:
+        tasks = self._select('WHERE id = ?', (task_id,))
+        return tasks[0] if tasks else None
+
+    def query(self, query: Query) -> list[Task]:
+        """
+        Translates the whole query, including sorting, offset and limit, into
+        SQL, so that SQLite picks the index and only the returned tasks are
+        built.
+        """
+        sql, params = query.to_sql()
+        cursor = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM tasks {sql}",
+                                   params)
+        tasks = [self._task(row) for row in cursor]
+        metrics.count('tasks_hydrated', len(tasks))
+        return tasks
+
+    def due(self, start: int = None, end: int = None, pending: bool = False,
+            limit: int = None) -> list[Task]:
+        """
+        Reads the range of zero-padded ISO dates from the due_date index, where
+        they sort as text. Dates such as 2024-1-5 do not, so they are read
+        from their own partial index, compared as ordinals like in select_due
+        and merged in; tasks with invalid due dates are left out.
+        """
+        clauses, params = ['due_date = date(due_date)'], []
+        odd_clauses, odd_params = ['due_date IS NOT date(due_date)',
+                                   'py_ordinal(due_date) IS NOT NULL'], []
+        if start is not None:
+            clauses.append('due_date >= ?')
+            params.append(date.fromordinal(start).strftime(DATE_FORMAT))
+            odd_clauses.append('py_ordinal(due_date) >= ?')
+            odd_params.append(start)
+        if end is not None:
+            clauses.append('due_date <= ?')
+            params.append(date.fromordinal(end).strftime(DATE_FORMAT))
+            odd_clauses.append('py_ordinal(due_date) <= ?')
+            odd_params.append(end)
+        if pending:
+            clauses.append("status != 'Выполнена'")
+            odd_clauses.append("status != 'Выполнена'")
+        order = 'due_date, id'
+        if limit is not None:
+            order += ' LIMIT ?'
+            params.append(limit)
+        tasks = self._select('WHERE ' + ' AND '.join(clauses), tuple(params), order)
+        odd = self._select('WHERE ' + ' AND '.join(odd_clauses), tuple(odd_params),
+                           'py_ordinal(due_date), id')
+        if not odd:
+            return tasks
+        return list(islice(heapq.merge(tasks, odd,
+                                       key=lambda task: (to_ordinal(task.due_date),
+                                                         task.id)),
+                           limit))
+
+    def max_id(self) -> int:
+        return self.conn.execute('SELECT MAX(id) FROM tasks').fetchone()[0] or 0
+
+    def stats(self) -> TaskStats:
+        """
+        Counts the tasks with GROUP BY queries, so that the counters always
+        match the database, whichever process changed it. Both queries scan
+        a covering index instead of the table.
+        """
+        stats = TaskStats()
+        for category, status, due_date, count in self.conn.execute(
+                'SELECT category, status, due_date, COUNT(*) FROM tasks '
+                'GROUP BY category, status, due_date'):
+            stats.count(category, status, None, due_date, count)
+        stats.by_priority = dict(self.conn.execute(
+            'SELECT priority, COUNT(*) FROM tasks GROUP BY priority'))
+        return stats
+
+    def save(self, tasks: Iterable[Task]) -> None:
+        with self.conn:
+            self.conn.execute('DELETE FROM tasks')
+            self.conn.executemany(
+                f"INSERT INTO tasks VALUES ({', '.join('?' * len(COLUMNS))})",
+                (self._row(task) for task in tasks))
+
+    def commit(self, changes: list[Change], tasks: Iterable[Task]) -> bool:
+        """
+        Applies the changes as single-row statements in one write transaction.
+        Edits only touch the changed columns, so edits made by other processes
+        to other fields are kept. A new task whose ID was taken by another
+        process in the meantime gets the next free ID instead.
+        """
+        renumbered = {}
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            for change in changes:
+                task_id = renumbered.get(change.task_id, change.task_id)
+                if change.op == 'add':
+                    if self.conn.execute('SELECT 1 FROM tasks WHERE id = ?',
+                                         (task_id,)).fetchone():
+                        change.task.id = self.max_id() + 1
+                        renumbered[change.task_id] = change.task.id
+                    self.conn.execute(
+                        f"INSERT OR REPLACE INTO tasks "
+                        f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                        self._row(change.task))
+                elif change.op == 'edit' and change.fields:
+                    keys = [key for key in COLUMNS if key in change.fields]
+                    values = [getattr(change.task, key) for key in keys]
+                    values = [value.value if isinstance(value, Priority) else value
+                              for value in values]
+                    self.conn.execute(
+                        f"UPDATE tasks SET {', '.join(f'{key} = ?' for key in keys)} "
+                        f"WHERE id = ?", (*values, task_id))
+                elif change.op == 'delete':
+                    self.conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        return False
+
+    def close(self) -> None:
+        self.conn.close()
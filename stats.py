@@ -0,0 +1,204 @@
+import json
+import os
+from dataclasses import replace
+from typing import Iterable, Optional
+
+from dates import to_ordinal
+from storage import Change
+from task import Task
+
+DONE = "Выполнена"
+
+
+def _bump(counter: dict, key, delta: int) -> None:
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+class TaskStats:
+    """
+    Counters of tasks by status, priority and category, with the number of
+    completed tasks and of pending tasks by due date in every category.
+    They are updated task by task as tasks change, so answering a summary
+    never scans the tasks: overdue counts only add up the due-date counters
+    before the given day.
+
+    Attributes:
+        total (int): The number of tasks.
+        by_status (dict[str, int]): The number of tasks by status.
+        by_priority (dict[str, int]): The number of tasks by priority value.
+        by_category (dict[str, int]): The number of tasks by category.
+        done_by_category (dict[str, int]): The number of completed tasks by category.
+        pending_by_due_date (dict[str, dict[int, int]]): The number of tasks
+            that are not completed by category and due date ordinal. Invalid
+            due dates are not counted.
+    """
+
+    def __init__(self, tasks: Iterable[Task] = ()):
+        self.total = 0
+        self.by_status: dict[str, int] = {}
+        self.by_priority: dict[str, int] = {}
+        self.by_category: dict[str, int] = {}
+        self.done_by_category: dict[str, int] = {}
+        self.pending_by_due_date: dict[str, dict[int, int]] = {}
+        for task in tasks:
+            self.add(task)
+
+    def count(self, category: str, status: str, priority: Optional[str],
+              due_date: str, delta: int) -> None:
+        """
+        Adds delta tasks with the given fields to the counters, the priority
+        by value. A priority of None leaves by_priority to be counted apart.
+        """
+        self.total += delta
+        _bump(self.by_status, status, delta)
+        if priority is not None:
+            _bump(self.by_priority, priority, delta)
+        _bump(self.by_category, category, delta)
+        if status == DONE:
+            _bump(self.done_by_category, category, delta)
+            return
+        ordinal = to_ordinal(due_date)
+        if ordinal is not None:
+            due = self.pending_by_due_date.setdefault(category, {})
+            _bump(due, ordinal, delta)
+            if not due:
+                del self.pending_by_due_date[category]
+
+    def _update(self, task: Task, delta: int) -> None:
+        self.count(task.category, task.status, task.priority.value, task.due_date, delta)
+
+    def add(self, task: Task) -> None:
+        self._update(task, 1)
+
+    def remove(self, task: Task) -> None:
+        self._update(task, -1)
+
+    def apply(self, change: Change, old: dict = None) -> None:
+        """
+        Counts a change.
+
+        Args:
+            change (Change): The change.
+            old (dict, optional): The previous values of the attributes
+                changed by an 'edit'.
+        """
+        if change.op == 'add':
+            self.add(change.task)
+        elif change.op == 'delete':
+            self.remove(change.task)
+        elif old:
+            self.remove(_before(change.task, old))
+            self.add(change.task)
+
+    def revert(self, change: Change, old: dict = None) -> None:
+        """
+        Takes back a change counted by apply.
+        """
+        if change.op == 'add':
+            self.remove(change.task)
+        elif change.op == 'delete':
+            self.add(change.task)
+        elif old:
+            self.remove(change.task)
+            self.add(_before(change.task, old))
+
+    def overdue(self, today: int, category: str = None) -> int:
+        """
+        Returns the number of tasks that are not completed and were due
+        before a day, in a category or in all of them.
+
+        Args:
+            today (int): The ordinal of the current day.
+            category (str, optional): The category.
+        """
+        categories = [category] if category is not None else self.pending_by_due_date
+        return sum(count for name in categories
+                   for ordinal, count in self.pending_by_due_date.get(name, {}).items()
+                   if ordinal < today)
+
+    def summary(self, today: int) -> dict:
+        """
+        Returns the counters as JSON-compatible values, with the overdue
+        count and completion ratio of every category, largest categories first.
+
+        Args:
+            today (int): The ordinal of the current day.
+        """
+        categories = {}
+        for category, total in sorted(self.by_category.items(),
+                                      key=lambda item: (-item[1], item[0])):
+            done = self.done_by_category.get(category, 0)
+            categories[category] = {
+                'total': total,
+                'done': done,
+                'completion': done / total,
+                'overdue': self.overdue(today, category),
+            }
+        return {
+            'total': self.total,
+            'done': self.by_status.get(DONE, 0),
+            'overdue': self.overdue(today),
+            'by_status': dict(self.by_status),
+            'by_priority': dict(self.by_priority),
+            'categories': categories,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            'total': self.total,
+            'by_status': self.by_status,
+            'by_priority': self.by_priority,
+            'by_category': self.by_category,
+            'done_by_category': self.done_by_category,
+            'pending_by_due_date': self.pending_by_due_date,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TaskStats':
+        stats = cls()
+        stats.total = data['total']
+        stats.by_status = data['by_status']
+        stats.by_priority = data['by_priority']
+        stats.by_category = data['by_category']
+        stats.done_by_category = data['done_by_category']
+        # JSON object keys are strings
+        stats.pending_by_due_date = {
+            category: {int(ordinal): count for ordinal, count in due.items()}
+            for category, due in data['pending_by_due_date'].items()}
+        return stats
+
+    def save(self, filename: str, stamp: list) -> None:
+        """
+        Writes the counters along with the version of the store they count.
+        """
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump({'stamp': stamp, 'stats': self.to_dict()}, file,
+                      ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str, stamp: list) -> Optional['TaskStats']:
+        """
+        Reads counters saved by save, or returns None if the file is missing
+        or was written for another version of the store.
+        """
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get('stamp') != stamp:
+            return None
+        return cls.from_dict(data['stats'])
+
+
+def _before(task: Task, old: dict) -> Task:
+    """
+    Returns a copy of an edited task with the attributes it had before the edit.
+    """
+    return replace(task, **old)
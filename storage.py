@@ -0,0 +1,360 @@
+import heapq
+import json
+import os
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from codec import task_from_dict
+from compression import base_name, codec_of, open_text
+from dates import to_ordinal
+from journal import Journal
+from locking import FileLock
+from metrics import metrics
+from priority import Priority
+from query import Query
+from streaming import dump_tasks, iter_records
+from task import Task
+
+
+def file_version(filename: str) -> list:
+    """
+    Returns the inode, size and mtime of a file, which together change
+    whenever the file is rewritten or renamed over, or [] if it does not exist.
+    """
+    if not os.path.exists(filename):
+        return []
+    stat = os.stat(filename)
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+class Change(NamedTuple):
+    """
+    A single mutation to be persisted by a storage backend.
+
+    Attributes:
+        op (str): The kind of mutation: 'add', 'edit' or 'delete'.
+        task_id (int): The ID the task had before the mutation.
+        task (Task): The task after the mutation.
+        fields (dict): The changed attributes for an 'edit'.
+    """
+    op: str
+    task_id: int
+    task: Task
+    fields: Optional[dict] = None
+
+    def to_record(self) -> dict:
+        """
+        Serializes the change into a JSON-compatible journal record.
+        """
+        if self.op == 'add':
+            fields = self.task.to_dict()
+        elif self.op == 'edit':
+            fields = {key: value.value if isinstance(value, Priority) else value
+                      for key, value in self.fields.items()}
+        else:
+            fields = None
+        return {'op': self.op, 'id': self.task_id, 'fields': fields}
+
+
+def select_due(items: Iterable[tuple], start: int = None, end: int = None,
+               pending: bool = False, limit: int = None) -> list:
+    """
+    Picks the items due in [start, end] in due-date order. With a limit, only
+    the first items are kept in a bounded heap instead of sorting everything.
+
+    Args:
+        items (Iterable[tuple]): (id, due_date, status, item) tuples.
+        start (int, optional): The ordinal of the first due date to include.
+        end (int, optional): The ordinal of the last due date to include.
+        pending (bool): If True, completed tasks are skipped.
+        limit (int, optional): The maximum number of items to return.
+
+    Returns:
+        list: The selected items.
+    """
+    def keyed():
+        for task_id, due_date, status, item in items:
+            if pending and status == "Выполнена":
+                continue
+            ordinal = to_ordinal(due_date)
+            if ordinal is None or (start is not None and ordinal < start) or \
+                    (end is not None and ordinal > end):
+                continue
+            yield ordinal, task_id, item
+
+    if limit is None:
+        selected = sorted(keyed())
+    else:
+        selected = heapq.nsmallest(limit, keyed())
+    return [item for _, _, item in selected]
+
+
+class Storage:
+    """
+    Base class for task storage backends used by TaskManager.
+
+    Resident backends hand all tasks to TaskManager, which keeps them in
+    memory and answers reads from its own indexes. Non-resident backends
+    answer get and find themselves, so TaskManager never holds more than
+    the tasks a call returns.
+    """
+    resident = True
+    # backends that count tasks with queries (stats) keep no counter file
+    aggregates = False
+
+    def load(self) -> list[Task]:
+        """
+        Returns all stored tasks.
+        """
+        raise NotImplementedError
+
+    def replay(self) -> Iterator[dict]:
+        """
+        Yields mutation records that still have to be applied on top of load.
+        """
+        return iter(())
+
+    def records(self) -> Iterator[dict]:
+        """
+        Yields the stored tasks as dictionaries, one at a time, in ID order.
+        """
+        return (task.to_dict() for task in self.load())
+
+    def can_stream(self) -> bool:
+        """
+        Returns True if get and find can be answered without loading the store.
+        """
+        return not self.resident
+
+    def get(self, task_id: int) -> Optional[Task]:
+        """
+        Returns the task with the given ID, or None.
+        """
+        raise NotImplementedError
+
+    def query(self, query: Query) -> list[Task]:
+        """
+        Returns the tasks selected by a query, in its order.
+        """
+        return query.arrange(query.filter(self.load()))
+
+    def due(self, start: int = None, end: int = None, pending: bool = False,
+            limit: int = None) -> list[Task]:
+        """
+        Returns the tasks due in [start, end], ordered by due date.
+
+        Args:
+            start (int, optional): The ordinal of the first due date to include.
+            end (int, optional): The ordinal of the last due date to include.
+            pending (bool): If True, only tasks that are not completed are returned.
+            limit (int, optional): The maximum number of tasks to return.
+        """
+        return select_due(((task.id, task.due_date, task.status, task)
+                           for task in self.load()), start, end, pending, limit)
+
+    def max_id(self) -> int:
+        """
+        Returns the highest stored task ID, or 0 if the store is empty.
+        """
+        return max((task.id for task in self.load()), default=0)
+
+    def stats(self):
+        """
+        Returns the counters of the stored tasks, as a stats.TaskStats.
+        Only used for backends that set aggregates.
+        """
+        raise NotImplementedError
+
+    def save(self, tasks: Iterable[Task]) -> None:
+        """
+        Replaces the stored tasks with the given ones.
+        """
+        raise NotImplementedError
+
+    def commit(self, changes: list[Change], tasks: Iterable[Task]) -> bool:
+        """
+        Persists a group of changes.
+
+        Args:
+            changes (list[Change]): The changes, in the order they were made.
+            tasks (Iterable[Task]): All tasks after the changes, for backends
+                that can only write full snapshots.
+
+        Returns:
+            bool: True if a full snapshot of the tasks was written.
+        """
+        raise NotImplementedError
+
+    def signature(self) -> Optional[list]:
+        """
+        Identifies the current state of the stored snapshot, or None.
+        """
+        return None
+
+    def version(self) -> Optional[list]:
+        """
+        Identifies the current state of the whole store, so that a writer can
+        tell whether another process changed it since it was loaded. None means
+        the backend merges concurrent changes itself.
+        """
+        return self.signature()
+
+    def lock(self, shared: bool = False) -> FileLock:
+        """
+        Returns a lock on '<filename>.lock' that serializes writers across
+        processes and keeps readers from seeing a half-compacted store.
+        """
+        return FileLock(self.filename + '.lock', shared)
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the backend.
+        """
+
+
+class JsonStorage(Storage):
+    """
+    Stores tasks in a JSON array (or JSON Lines, for '.jsonl' files), with an
+    optional append-only journal of mutations next to it. Task files ending
+    in '.gz', '.bz2' or '.xz' are compressed, and streamed through the codec
+    both ways; the journal is not.
+    """
+
+    def __init__(self, filename: str, journal: bool = False,
+                 compact_threshold: int = 1000, compact: bool = False):
+        """
+        Args:
+            filename (str): The path of the task file.
+            journal (bool): If True, changes are appended to '<filename>.journal'
+                instead of rewriting the task file.
+            compact_threshold (int): The number of journal records after which
+                the journal is compacted into the task file.
+            compact (bool): If True, a JSON array is written with one task per
+                line instead of indented. Defaults to False.
+        """
+        self.filename = filename
+        self.journal = Journal(filename + '.journal') if journal else None
+        self.compact_threshold = compact_threshold
+        self.compact = compact
+
+    def load(self) -> list[Task]:
+        """
+        Loads tasks from the task file, parsing it incrementally one task at a
+        time. If the file does not exist, it creates an empty task file.
+        """
+        if not os.path.exists(self.filename):
+            self._write([])
+        return self._scan(lambda data: True)
+
+    def replay(self) -> Iterator[dict]:
+        if self.journal is None:
+            return iter(())
+        return self.journal.replay()
+
+    def records(self) -> Iterator[dict]:
+        """
+        Streams the records of the task file as they are, without building
+        Task objects. Only valid while can_stream is True.
+        """
+        return iter_records(self.filename)
+
+    def can_stream(self) -> bool:
+        return os.path.exists(self.filename) and \
+            (self.journal is None or not os.path.exists(self.journal.filename))
+
+    def get(self, task_id: int) -> Optional[Task]:
+        return next(iter(self._scan(lambda data: data['id'] == task_id)), None)
+
+    def query(self, query: Query) -> list[Task]:
+        """
+        Streams the task file and builds Task objects only for the matching
+        records.
+        """
+        if query.where is None:
+            return query.arrange(self._scan(lambda data: True))
+        return query.arrange(self._scan(query.where.matches))
+
+    def due(self, start: int = None, end: int = None, pending: bool = False,
+            limit: int = None) -> list[Task]:
+        """
+        Streams the task file and builds Task objects only for the selected records.
+        """
+        try:
+            records = select_due(((data['id'], data['due_date'],
+                                   data.get('status', "Не выполнена"), data)
+                                  for data in iter_records(self.filename)),
+                                 start, end, pending, limit)
+        except json.JSONDecodeError as e:
+            print(f"Error loading tasks: {e}")
+            return []
+        metrics.count('tasks_hydrated', len(records))
+        return [task_from_dict(data) for data in records]
+
+    def _scan(self, predicate) -> list[Task]:
+        try:
+            tasks = [task_from_dict(data) for data in iter_records(self.filename)
+                     if predicate(data)]
+        except json.JSONDecodeError as e:
+            print(f"Error loading tasks: {e}")
+            return []
+        metrics.count('tasks_hydrated', len(tasks))
+        return tasks
+
+    def save(self, tasks: Iterable[Task]) -> None:
+        """
+        Writes a snapshot of the tasks and empties the journal.
+        """
+        self._write(tasks)
+        if self.journal is not None:
+            self.journal.truncate()
+
+    def _write(self, tasks: Iterable[Task]) -> None:
+        """
+        Writes the tasks to a temporary file and atomically renames it over the
+        task file, so that a crash in the middle of the write never leaves a
+        truncated task file behind.
+        """
+        # the compression extension stays last, so that it selects the codec
+        tmp_filename = f'{base_name(self.filename)}.{os.getpid()}.tmp' \
+                       f'{codec_of(self.filename) or ""}'
+        with open_text(tmp_filename, 'w', sync=True) as file:
+            dump_tasks(tasks, file,
+                       json_lines=base_name(self.filename).endswith('.jsonl'),
+                       indent=not self.compact)
+        metrics.count('bytes_written', os.path.getsize(tmp_filename))
+        os.replace(tmp_filename, self.filename)
+
+    def commit(self, changes: list[Change], tasks: Iterable[Task]) -> bool:
+        """
+        Without a journal the whole task file is rewritten; with a journal only
+        the changes are appended, and the journal is compacted once it reaches
+        compact_threshold records.
+        """
+        if self.journal is None:
+            self.save(tasks)
+            return True
+        records = [change.to_record() for change in changes]
+        if len(records) > 1:
+            # a single line is written atomically, so a batch is never half-applied
+            records = [{'op': 'batch', 'changes': records}]
+        self.journal.append(records)
+        if self.journal.size >= self.compact_threshold:
+            self.save(tasks)
+            return True
+        return False
+
+    def signature(self) -> Optional[list]:
+        """
+        Identifies the current state of the task file by its size and mtime.
+        """
+        stat = os.stat(self.filename)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def version(self) -> Optional[list]:
+        """
+        Identifies the task file by its inode, size and mtime, which all change
+        when a snapshot is renamed over it, and the journal by its size.
+        """
+        journal_size = 0
+        if self.journal is not None and os.path.exists(self.journal.filename):
+            journal_size = os.path.getsize(self.journal.filename)
+        return file_version(self.filename) + [journal_size]
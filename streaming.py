@@ -0,0 +1,194 @@
+import json
+import re
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from codec import encode_json, encode_json_indented
+from compression import base_name, open_text
+from metrics import metrics
+from task import Task
+
+CHUNK_SIZE = 1 << 16
+# records serialized into a single write
+CHUNK_RECORDS = 1000
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+_comma = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+
+
+def iter_json_array(file: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """
+    Incrementally parses a JSON array from a text file and yields its
+    elements one at a time, keeping at most one element plus one chunk of
+    the file in memory. An empty file is treated as an empty array.
+
+    Args:
+        file (IO[str]): A file opened in text mode.
+        chunk_size (int): The number of characters read at a time.
+
+    Yields:
+        The decoded elements of the array.
+
+    Raises:
+        json.JSONDecodeError: If the file does not contain a JSON array.
+    """
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace() -> bool:
+        nonlocal pos
+        while True:
+            pos = _whitespace.match(buffer, pos).end()
+            if pos < len(buffer):
+                return True
+            if not fill():
+                return False
+
+    if not skip_whitespace():
+        return
+    if buffer[pos] != '[':
+        raise json.JSONDecodeError('Expecting "["', buffer, pos)
+    pos += 1
+    expect_value = True
+    first = True
+    while True:
+        if not skip_whitespace():
+            raise json.JSONDecodeError('Unterminated array', buffer, pos)
+        char = buffer[pos]
+        if char == ']' and (first or not expect_value):
+            return
+        if not expect_value:
+            if char != ',':
+                raise json.JSONDecodeError('Expecting "," delimiter', buffer, pos)
+            pos += 1
+            expect_value = True
+            continue
+        while True:
+            while True:
+                try:
+                    value, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof or not fill():
+                        raise
+                    continue
+                if end == len(buffer) and not eof and fill():
+                    # a scalar may continue in the next chunk
+                    continue
+                break
+            yield value
+            # most elements are followed by a comma and the next element in
+            # the same chunk: decode it right away
+            match = _comma.match(buffer, end)
+            if match is None or match.end() == len(buffer):
+                break
+            pos = match.end()
+        pos = end
+        first = False
+        expect_value = False
+
+
+def iter_jsonl(file: IO[str]) -> Iterator:
+    """
+    Yields the values of a JSON Lines file, skipping blank lines.
+
+    Args:
+        file (IO[str]): A file opened in text mode.
+    """
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_records(filename: str) -> Iterator[dict]:
+    """
+    Streams task dictionaries from a task file. Files ending in '.jsonl' are
+    read as JSON Lines, anything else as a JSON array. Files ending in '.gz',
+    '.bz2' or '.xz' are decompressed as they are read, and their format is
+    chosen by the extension before that ('tasks.jsonl.gz').
+
+    Args:
+        filename (str): The path of the task file.
+
+    Yields:
+        dict: A task dictionary as produced by Task.to_dict.
+    """
+    with open_text(filename) as file:
+        try:
+            if base_name(filename).endswith('.jsonl'):
+                yield from iter_jsonl(file)
+            else:
+                yield from iter_json_array(file)
+        finally:
+            metrics.count('bytes_read', file.buffer.tell())
+
+
+# separators that lay out a flat object as json.dump(..., indent=4) does
+# inside an array, so that it is still serialized by the C encoder
+_indented_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',\n        ', ': '))
+_compact_encoder = json.JSONEncoder(ensure_ascii=False)
+
+
+def _indented(record: dict) -> str:
+    text = _indented_encoder.encode(record)
+    return '    {\n        ' + text[1:-1] + '\n    }'
+
+
+def _dump(items: Iterable, file: IO[str], json_lines: bool, encode) -> int:
+    items = iter(items)
+    separator = '\n' if json_lines else ',\n'
+    count = 0
+    if not json_lines:
+        file.write('[')
+    while chunk := list(islice(items, CHUNK_RECORDS)):
+        if json_lines:
+            file.write(separator.join(map(encode, chunk)) + '\n')
+        else:
+            file.write((separator if count else '\n') + separator.join(map(encode, chunk)))
+        count += len(chunk)
+    if not json_lines:
+        file.write('\n]' if count else ']')
+    return count
+
+
+def dump_records(records: Iterable[dict], file: IO[str], json_lines: bool = False,
+                 indent: bool = True) -> int:
+    """
+    Writes task dictionaries to a text file as they come, CHUNK_RECORDS
+    records per write call.
+
+    Args:
+        records (Iterable[dict]): Flat task dictionaries.
+        file (IO[str]): A file opened in text mode.
+        json_lines (bool): If True, writes JSON Lines, one record per line;
+            otherwise a JSON array. Defaults to False.
+        indent (bool): If True, the array is laid out as by json.dump with
+            indent=4; otherwise every record takes a single line.
+            Defaults to True.
+
+    Returns:
+        int: The number of records written.
+    """
+    encode = _indented if indent and not json_lines else _compact_encoder.encode
+    return _dump(records, file, json_lines, encode)
+
+
+def dump_tasks(tasks: Iterable[Task], file: IO[str], json_lines: bool = False,
+               indent: bool = True) -> int:
+    """
+    Writes tasks to a text file as dump_records writes their dictionaries,
+    encoding them with the codec instead of building the dictionaries.
+    """
+    encode = encode_json_indented if indent and not json_lines else encode_json
+    return _dump(tasks, file, json_lines, encode)
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Iterable, Iterator, Optional
+
+from metrics import metrics
+from task import Task
+
+# consecutive task IDs whose hashes are combined into one leaf of the tree
+BUCKET_SIZE = 256
+# children of every inner node of the tree
+FANOUT = 16
+
+
+def task_hash(task: Task) -> int:
+    """
+    Returns a 64-bit hash of the contents of a task, its ID included.
+    """
+    data = json.dumps(task.to_dict(), ensure_ascii=False, sort_keys=True)
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(),
+                          'big')
+
+
+class SyncState:
+    """
+    Version stamps and a Merkle tree of the tasks of a store, kept next to
+    the store by TaskManager mutations once the store has been synchronized.
+
+    Task IDs are split into buckets of BUCKET_SIZE consecutive IDs. The
+    digest of a bucket is the XOR of the hashes of its tasks, so a mutation
+    updates it without reading the other tasks, and every inner node of the
+    tree is the XOR of FANOUT nodes below it. Two stores with the same tasks
+    have the same tree; comparing the trees from the root down only visits
+    the subtrees that differ.
+
+    Every task changed since the state was created has a stamp: its version,
+    incremented by every change, the time of the last change in nanoseconds,
+    its hash (0 once deleted) and the store it was added to, so that tasks
+    added to different stores under the same ID are told apart. Tasks that
+    have not changed have no stamp and count as older than any change.
+
+    Attributes:
+        node (str): The ID of the store, recorded as the origin of its new tasks.
+        leaves (list[int]): The digest of every bucket.
+        stamps (dict[int, list]): [version, modified, hash, origin] by task ID.
+        max_id (int): The highest task ID the state has seen.
+    """
+
+    def __init__(self, node: str = None, leaves: list[int] = None,
+                 stamps: dict[int, list] = None, max_id: int = 0):
+        self.node = node or uuid.uuid4().hex
+        self.leaves = leaves or []
+        self.stamps = stamps or {}
+        self.max_id = max_id
+
+    @classmethod
+    def build(cls, tasks: Iterable[Task], previous: 'SyncState' = None) -> 'SyncState':
+        """
+        Hashes all tasks of a store. The stamps of a previous state are kept
+        for tasks that did not change, and tasks that another program changed
+        or deleted since then get a new version. Tasks without a stamp are
+        not hashed one by one, so in the buckets whose digest changed they
+        all get version 1 with no time of change: newer than the untouched
+        copies of other stores, older than any change made through a
+        TaskManager.
+        """
+        hashes = {task.id: task_hash(task) for task in tasks}
+        state = cls(previous.node if previous is not None else None,
+                    max_id=max(hashes, default=0))
+        for task_id, value in hashes.items():
+            state._toggle(task_id, value)
+        if previous is not None:
+            now = time.time_ns()
+            state.max_id = max(state.max_id, previous.max_id)
+            for task_id, (version, modified, value, origin) in previous.stamps.items():
+                current = hashes.get(task_id, 0)
+                if current != value:
+                    version, modified, value = version + 1, now, current
+                state.stamps[task_id] = [version, modified, value, origin]
+            size = max(len(state.leaves), len(previous.leaves))
+            leaves = state.leaves + [0] * (size - len(state.leaves))
+            previous_leaves = previous.leaves + [0] * (size - len(previous.leaves))
+            for bucket in range(size):
+                if leaves[bucket] == previous_leaves[bucket]:
+                    continue
+                start = bucket * BUCKET_SIZE
+                for task_id in range(max(start, 1), min(start + BUCKET_SIZE,
+                                                        state.max_id + 1)):
+                    if task_id not in state.stamps:
+                        state.stamps[task_id] = [1, 0, hashes.get(task_id, 0), None]
+        return state
+
+    def _toggle(self, task_id: int, value: int) -> None:
+        if value:
+            bucket = task_id // BUCKET_SIZE
+            if bucket >= len(self.leaves):
+                self.leaves.extend([0] * (bucket + 1 - len(self.leaves)))
+            self.leaves[bucket] ^= value
+
+    def entry(self, task_id: int, task: Optional[Task]) -> Optional[list]:
+        """
+        Returns [version, modified, hash, origin] of a task, None if the store
+        never had it.
+        """
+        stamp = self.stamps.get(task_id)
+        if stamp is not None:
+            return stamp
+        return [0, 0, task_hash(task), None] if task is not None else None
+
+    def record(self, task_id: int, before: Optional[Task], after: Optional[Task],
+               stamp: list = None) -> None:
+        """
+        Records a change of a task.
+
+        Args:
+            task_id (int): The ID of the task.
+            before (Task | None): The task before the change, None if it did
+                not exist.
+            after (Task | None): The task after the change, None if deleted.
+            stamp (list, optional): [version, modified, origin] of a change
+                received from another store. Local changes get the next
+                version and the current time.
+        """
+        old = self.stamps.get(task_id)
+        if old is not None:
+            old_hash = old[2]
+        elif before is not None:
+            old_hash = task_hash(before)
+        elif after is None and stamp is None:
+            return
+        else:
+            old_hash = 0
+        new_hash = task_hash(after) if after is not None else 0
+        if stamp is None:
+            if old is not None and old[2]:
+                origin = old[3]
+            else:
+                origin = None if before is not None else self.node
+            stamp = [old[0] + 1 if old is not None else 1, time.time_ns(), origin]
+        self._toggle(task_id, old_hash)
+        self._toggle(task_id, new_hash)
+        self.stamps[task_id] = [stamp[0], stamp[1], new_hash, stamp[2]]
+        self.max_id = max(self.max_id, task_id)
+
+    def tree(self, size: int = None) -> list[list[int]]:
+        """
+        Returns the levels of the tree, leaves first, over at least size leaves.
+        """
+        level = self.leaves + [0] * (max(size or 0, len(self.leaves), 1) - len(self.leaves))
+        levels = [level]
+        while len(level) > 1:
+            level = [_xor(level[i:i + FANOUT]) for i in range(0, len(level), FANOUT)]
+            levels.append(level)
+        return levels
+
+    def diff(self, other: 'SyncState') -> list[int]:
+        """
+        Returns the buckets whose tasks differ between two states, descending
+        the trees only where their nodes differ.
+        """
+        size = max(len(self.leaves), len(other.leaves), 1)
+        ours, theirs = self.tree(size), other.tree(size)
+        nodes = [0]
+        for depth in range(len(ours) - 1, 0, -1):
+            below = len(ours[depth - 1])
+            nodes = [child for node in nodes if ours[depth][node] != theirs[depth][node]
+                     for child in range(node * FANOUT, min((node + 1) * FANOUT, below))]
+            metrics.count('sync_nodes_compared', len(nodes))
+        return [node for node in nodes if ours[0][node] != theirs[0][node]]
+
+    def deleted(self, bucket: int) -> list[int]:
+        """
+        Returns the IDs of the deleted tasks of a bucket that have a stamp.
+        """
+        start = bucket * BUCKET_SIZE
+        return [task_id for task_id in range(start, start + BUCKET_SIZE)
+                if task_id in self.stamps and not self.stamps[task_id][2]]
+
+    def save(self, filename: str, stamp: list) -> None:
+        """
+        Writes the state along with the version of the store it describes.
+        """
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump({'stamp': stamp, 'node': self.node, 'max_id': self.max_id,
+                       'leaves': self.leaves, 'stamps': self.stamps}, file)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str, stamp: list = None) -> Optional['SyncState']:
+        """
+        Reads a state written by save, or returns None if the file is missing
+        or, when a stamp is given, was written for another version of the store.
+        """
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if stamp is not None and data.get('stamp') != stamp:
+            return None
+        # JSON object keys are strings
+        return cls(data['node'], data['leaves'],
+                   {int(task_id): value for task_id, value in data['stamps'].items()},
+                   data['max_id'])
+
+
+def _xor(values: Iterable[int]) -> int:
+    result = 0
+    for value in values:
+        result ^= value
+    return result
+
+
+def bucket_entries(task_manager, state: SyncState,
+                   buckets: Iterable[int]) -> dict[int, tuple[list, Optional[Task]]]:
+    """
+    Returns the stamp and the task, None if deleted, of every task ID of some
+    buckets that the store has or had.
+    """
+    entries = {}
+    for bucket in buckets:
+        start = bucket * BUCKET_SIZE
+        for task in task_manager.get_tasks_by(id__gte=start,
+                                              id__lte=start + BUCKET_SIZE - 1):
+            entries[task.id] = (state.entry(task.id, task), task)
+        for task_id in state.deleted(bucket):
+            entries[task_id] = (state.stamps[task_id], None)
+    return entries
+
+
+def plan(ours: dict, theirs: dict, next_id: int) -> tuple[list[dict], list[dict]]:
+    """
+    Decides which tasks each of two stores needs from the other.
+
+    A task changed on both stores takes the most recent change, by time and
+    then version, and ours on a tie. Tasks added to the two stores under the
+    same ID are both kept: the one added to the store with the greater ID
+    moves to a new ID on both stores.
+
+    Args:
+        ours (dict): The entries of the differing buckets of the first store.
+        theirs (dict): The entries of the same buckets of the second store.
+        next_id (int): The first ID that neither store has used.
+
+    Returns:
+        tuple[list[dict], list[dict]]: The delta records to apply to the
+            first store and to the second one, moves first.
+    """
+    to_ours, to_theirs = ([], []), ([], [])
+    for task_id in sorted(ours.keys() | theirs.keys()):
+        mine, other = ours.get(task_id), theirs.get(task_id)
+        if mine is not None and other is not None and mine[0][2] == other[0][2]:
+            continue
+        if mine is None or other is None or mine[0][3] != other[0][3]:
+            if mine is not None and other is not None and mine[1] and other[1]:
+                # different tasks under one ID: the greater origin moves away
+                if (mine[0][3] or '') > (other[0][3] or ''):
+                    moving, side = mine, (to_ours, to_theirs)
+                    staying, there = other, to_ours
+                else:
+                    moving, side = other, (to_theirs, to_ours)
+                    staying, there = mine, to_theirs
+                stamp = [moving[0][0], moving[0][1], moving[0][3]]
+                side[0][0].append({'id': task_id, 'move': next_id, 'stamp': stamp})
+                side[1][1].append(_record(next_id, stamp, moving[1]))
+                there[1].append(_record(task_id, staying[0], staying[1]))
+                next_id += 1
+                continue
+            # the task exists on one store only
+            if mine is not None and mine[1]:
+                to_theirs[1].append(_record(task_id, mine[0], mine[1]))
+            elif other is not None and other[1]:
+                to_ours[1].append(_record(task_id, other[0], other[1]))
+            continue
+        if (other[0][1], other[0][0]) > (mine[0][1], mine[0][0]):
+            to_ours[1].append(_record(task_id, other[0], other[1]))
+        else:
+            to_theirs[1].append(_record(task_id, mine[0], mine[1]))
+    return to_ours[0] + to_ours[1], to_theirs[0] + to_theirs[1]
+
+
+def _record(task_id: int, stamp: list, task: Optional[Task]) -> dict:
+    if len(stamp) == 4:
+        stamp = [stamp[0], stamp[1], stamp[3]]
+    data = task.to_dict() if task is not None else None
+    if data is not None:
+        data['id'] = task_id
+    return {'id': task_id, 'stamp': stamp, 'task': data}
+
+
+def write_delta(records: Iterable[dict], filename: str) -> int:
+    """
+    Writes delta records as JSON Lines.
+
+    Returns:
+        int: The number of records written.
+    """
+    count = 0
+    with open(filename, 'w', encoding='utf-8') as file:
+        for count, record in enumerate(records, 1):
+            file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+                       + '\n')
+    return count
+
+
+def read_delta(filename: str) -> Iterator[dict]:
+    """
+    Reads the records of a delta file written by write_delta.
+    """
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def sync_stores(local, remote, directory: str) -> tuple[int, int]:
+    """
+    Synchronizes two task stores in both directions. The stores exchange
+    their trees, then the entries of the buckets that differ, and each one
+    receives a delta file with the tasks it is missing or has older versions
+    of, so the work depends on the number of changes rather than on the
+    number of tasks.
+
+    Args:
+        local (TaskManager): The first store.
+        remote (TaskManager): The second store.
+        directory (str): Where the delta files are written.
+
+    Returns:
+        tuple[int, int]: The number of records sent to the second store and
+            received from it.
+    """
+    ours, theirs = local.sync_state(), remote.sync_state()
+    buckets = ours.diff(theirs)
+    metrics.count('sync_buckets', len(buckets))
+    if not buckets:
+        return 0, 0
+    to_local, to_remote = plan(bucket_entries(local, ours, buckets),
+                               bucket_entries(remote, theirs, buckets),
+                               max(ours.max_id, theirs.max_id) + 1)
+    sent = write_delta(to_remote, os.path.join(directory, 'outgoing.delta.jsonl'))
+    received = write_delta(to_local, os.path.join(directory, 'incoming.delta.jsonl'))
+    remote.apply_delta(read_delta(os.path.join(directory, 'outgoing.delta.jsonl')))
+    local.apply_delta(read_delta(os.path.join(directory, 'incoming.delta.jsonl')))
+    return sent, received
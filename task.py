@@ -1,10 +1,16 @@
+import sys
 from dataclasses import dataclass
 
-from priority import Priority
+from priority import PRIORITIES, Priority
 
 
-@dataclass
+@dataclass(slots=True)
 class Task:
+    """
+    A task. Instances have no __dict__, and the category, due date and status
+    strings, which repeat heavily across tasks, are interned so that all
+    tasks share a single copy of each value.
+    """
     id: int
     title: str
     description: str
@@ -13,6 +19,11 @@ class Task:
     priority: Priority
     status: str = "Не выполнена"
 
+    def __post_init__(self):
+        self.category = _intern(self.category)
+        self.due_date = _intern(self.due_date)
+        self.status = _intern(self.status)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -32,7 +43,7 @@ class Task:
             description=data["description"],
             category=data["category"],
             due_date=data["due_date"],
-            priority=Priority(data["priority"]),
+            priority=PRIORITIES[data["priority"]],
             status=data.get("status", "Не выполнена")
         )
 
@@ -43,3 +54,7 @@ class Task:
             f"📅: {self.due_date}\n" + \
             f"⚡: {self.priority}\n" + \
             f"✅: {self.status}\n"
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
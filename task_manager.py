@@ -1,57 +1,645 @@
-import json
-import os
-from datetime import datetime
+import atexit
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from itertools import islice
+from typing import Iterable, Iterator
 
-from constants import DATE_FORMAT
-from exceptions import TaskNotFound, InvalidPriority, InvalidDate
-from priority import Priority
+from codec import task_from_dict, task_to_dict
+from compression import base_name, codec_of
+from dates import date_ordinal, to_ordinal
+from exceptions import ConflictError, TaskNotFound, InvalidPriority, InvalidDate
+from index import TaskIndex
+from metrics import metrics
+from priority import PRIORITIES
+from query import Query, where
+from stats import TaskStats
+from storage import Change, JsonStorage, Storage, file_version
+from sync import SyncState
 from task import Task
+from text_index import TextIndex, fuzzy_bounds, fuzzy_rank
 
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+BINARY_EXTENSIONS = ('.bin',)
+SHARDED_EXTENSIONS = ('.shards',)
 
-class TaskManager:
-    next_id = 0
 
-    def __init__(self, filename: str = 'tasks.json'):
+def synchronized(method):
+    """
+    Runs a TaskManager method under the manager's lock, so that it never
+    overlaps with a background flush or a call from another thread.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class TaskManager:
+    def __init__(self, filename: str = 'tasks.json', journal: bool = False,
+                 compact_threshold: int = 1000, text_index: bool = False,
+                 lazy: bool = False, storage: Storage = None,
+                 write_behind: bool = False, flush_interval: float = 0.1,
+                 flush_threshold: int = 1000, compact: bool = False):
         """
         Initializes the TaskManager with a specific filename for storing tasks.
 
         Args:
             filename (str): The name of the file where tasks are stored. Defaults to 'tasks.json'.
+                Files ending in '.jsonl' are stored as JSON Lines, one task per line,
+                files ending in '.db', '.sqlite' or '.sqlite3' in an SQLite database,
+                files ending in '.bin' as a memory-mapped binary snapshot, and
+                paths ending in '.shards' as a directory with one shard per category.
+                JSON and JSON Lines files can be compressed with gzip, bzip2 or
+                xz by adding '.gz', '.bz2' or '.xz' ('tasks.json.gz').
+            journal (bool): If True, mutations are appended to a journal next to the
+                task file instead of rewriting the whole file. Defaults to False.
+            compact_threshold (int): The number of journal records after which the
+                journal is compacted back into the task file. Defaults to 1000.
+            text_index (bool): If True, keyword search goes through a trigram index
+                that is persisted next to the task file. Defaults to False.
+            lazy (bool): If True, tasks are not loaded until they are first needed,
+                and filtered reads before that stream the file and only build
+                the matching tasks. Defaults to False.
+            storage (Storage, optional): The storage backend to use instead of the
+                one chosen by the filename.
+            write_behind (bool): If True, mutations return as soon as they are applied
+                in memory, and a background thread persists them together at most
+                flush_interval seconds later, or once flush_threshold of them are
+                waiting. Waiting mutations are also persisted by flush, close and
+                at exit. Ignored for backends that are not resident, which answer
+                reads from the store. Defaults to False.
+            flush_interval (float): The longest time in seconds a mutation waits to
+                be persisted in write-behind mode. Defaults to 0.1.
+            flush_threshold (int): The number of waiting mutations that triggers
+                a flush right away in write-behind mode. Defaults to 1000.
+            compact (bool): If True, JSON task files are written with one task
+                per line instead of indented, which is faster to write and
+                smaller. Defaults to False.
         """
         self.filename = filename
-        self.tasks: list[Task] = []
-        self.tasks = self._load_tasks()
+        # the highest task ID used in the store
+        self.next_id = 0
+        if storage is None:
+            storage = self._storage_for(filename, journal, compact_threshold, compact)
+        self.storage = storage
+        self.use_text_index = text_index and storage.resident
+        self.text_index = None
+        self.loaded = False
+        self.load_time = 0.0
+        self._index = TaskIndex()
+        self._stats = None
+        # stamps of the changes received by apply_delta, by task ID
+        self._received = {}
+        self._batch = None
+        self._version = None
+        self._lock = threading.RLock()
+        self._pending = []
+        self._writer = None
+        # True while the background writer commits outside the manager's lock
+        self._writing = False
+        self.write_behind = write_behind and storage.resident
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.flush_error = None
+        if self.write_behind:
+            self._changed = threading.Condition(self._lock)
+            self._written = threading.Condition(self._lock)
+            self._closing = False
+            self._writer = threading.Thread(target=self._write_behind, daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+        if not lazy:
+            self._load()
+
+    @staticmethod
+    def _storage_for(filename: str, journal: bool, compact_threshold: int,
+                     compact: bool = False) -> Storage:
+        """
+        Chooses the storage backend by the extension of the task file.
+
+        Raises:
+            ValueError: If a file of another backend has a compression extension.
+        """
+        if codec_of(filename) and base_name(filename).endswith(
+                SQLITE_EXTENSIONS + BINARY_EXTENSIONS + SHARDED_EXTENSIONS):
+            raise ValueError(f'Сжатыми могут быть только файлы JSON и JSON Lines: {filename}')
+        # backends are imported here so that JSON stores do not pay for them at startup
+        if filename.endswith(SQLITE_EXTENSIONS):
+            from sqlite_storage import SqliteStorage
+            return SqliteStorage(filename)
+        if filename.endswith(BINARY_EXTENSIONS):
+            from binary_storage import BinaryStorage
+            return BinaryStorage(filename)
+        if filename.endswith(SHARDED_EXTENSIONS):
+            from sharded_storage import ShardedStorage
+            return ShardedStorage(filename)
+        return JsonStorage(filename, journal, compact_threshold, compact)
+
+    @property
+    def index(self) -> TaskIndex:
+        """
+        TaskIndex: The in-memory indexes over all tasks, loaded on first access.
+        """
+        if not self.loaded:
+            self._load()
+        return self._index
+
+    @property
+    def tasks(self) -> list[Task]:
+        """
+        list[Task]: All tasks in the order they were added.
+        """
+        if not self.storage.resident:
+            return self.storage.load()
+        return list(self.index)
+
+    @tasks.setter
+    def tasks(self, tasks: list[Task]) -> None:
+        self._index = TaskIndex(tasks)
+
+    @metrics.timed
+    def _load(self) -> None:
+        """
+        Loads the tasks, the trigram index and the journal into memory.
+        Backends that are not resident only report the highest task ID.
+        The store is read under a shared lock, and its version is remembered
+        so that later writes can detect changes made by other processes.
+        The time spent is recorded in load_time.
+        """
+        started = time.perf_counter()
+        self.loaded = True
+        if not self.storage.resident:
+            max_id = self.storage.max_id()
+            if max_id:
+                self.next_id = max_id
+        else:
+            with self._locked_store(shared=True):
+                self.tasks = self._load_tasks()
+                if self.use_text_index:
+                    self.text_index = self._load_text_index()
+                self._replay_journal()
+                self._version = self.storage.version()
+        self.load_time += time.perf_counter() - started
 
     def _load_tasks(self) -> list[Task]:
         """
-        Loads tasks from a JSON file specified by the filename attribute.
-        If the file does not exist, it creates an empty task file.
-        Updates the TaskManager's next_id to the highest ID found in the file.
+        Loads tasks from the storage backend.
+        Updates the TaskManager's next_id to the highest ID found in the store.
 
         Returns:
-            list[Task]: A list of Task objects loaded from the file.
+            list[Task]: A list of Task objects loaded from the store.
         """
-        if not os.path.exists(self.filename):
-            self._save_tasks()
-        try:
-            with open(self.filename, 'r', encoding='utf-8') as file:
-                tasks = json.load(file)
-                if tasks:
-                    TaskManager.next_id = max(tasks, key=lambda t: t['id'])['id']
-                    return [Task.from_dict(task) for task in tasks]
-        except json.JSONDecodeError as e:
-            print(f"Error loading tasks: {e}")
-        return []
+        with metrics.timer('storage.load'):
+            tasks = self.storage.load()
+        if tasks:
+            self.next_id = max(task.id for task in tasks)
+        return tasks
+
+    def _load_text_index(self) -> TextIndex:
+        """
+        Reads the persisted trigram index if it matches the task file,
+        otherwise builds it from the loaded tasks.
+
+        Returns:
+            TextIndex: The index over the titles and descriptions of the tasks.
+        """
+        text_index = TextIndex.load(self.filename + '.trgm',
+                                    self.storage.signature())
+        if text_index is None:
+            text_index = TextIndex()
+            for task in self._index:
+                text_index.add(task.id, task.title, task.description)
+        return text_index
+
+    def _store_stamp(self) -> list:
+        """
+        Identifies the version of the store that persisted counters and sync
+        states belong to.
+        """
+        version = self.storage.version()
+        return version if version is not None else file_version(self.storage.filename)
+
+    def _save_text_index(self) -> None:
+        """
+        Persists the trigram index for the snapshot that was just written.
+        """
+        if self.text_index is not None:
+            self.text_index.save(self.filename + '.trgm',
+                                 self.storage.signature())
+
+    def _replay_journal(self) -> None:
+        """
+        Applies the journal records of the backend on top of the loaded tasks.
+        """
+        for record in self.storage.replay():
+            self._apply_record(record)
+
+    def _apply_record(self, record: dict) -> None:
+        """
+        Applies a single journal record to the in-memory tasks.
+        """
+        if record['op'] == 'batch':
+            for change in record['changes']:
+                self._apply_record(change)
+            return
+        task = self._index.get(record['id'])
+        if record['op'] == 'add':
+            if task:
+                self._remove(task)
+            task = task_from_dict(record['fields'])
+            self.next_id = max(self.next_id, task.id)
+            self._insert(task)
+        elif record['op'] == 'edit' and task:
+            changes = dict(record['fields'])
+            if 'priority' in changes:
+                changes['priority'] = PRIORITIES[changes['priority']]
+            self._modify(task, changes)
+        elif record['op'] == 'delete' and task:
+            self._remove(task)
+
+    def _pushdown(self) -> bool:
+        """
+        Returns True if reads should be answered by the storage backend
+        rather than by the in-memory indexes.
+        """
+        return not self.storage.resident or \
+            (not self.loaded and self.storage.can_stream())
+
+    def _get(self, task_id) -> Task:
+        """
+        Returns the task to be mutated, loading the store if needed.
+        """
+        if not self.loaded:
+            self._load()
+        if not self.storage.resident:
+            return self.storage.get(task_id)
+        return self._index.get(task_id)
+
+    def _insert(self, task: Task) -> None:
+        """
+        Adds a task to the in-memory indexes.
+        """
+        if not self.storage.resident:
+            return
+        self._index.add(task)
+        if self.text_index is not None:
+            self.text_index.add(task.id, task.title, task.description)
+
+    def _insert_many(self, tasks: list[Task]) -> None:
+        """
+        Adds many tasks to the in-memory indexes at once.
+        """
+        if not self.storage.resident:
+            return
+        self._index.extend(tasks)
+        if self.text_index is not None:
+            for task in tasks:
+                self.text_index.add(task.id, task.title, task.description)
+
+    def _modify(self, task: Task, changes: dict) -> dict:
+        """
+        Sets attributes of a task and moves it between index entries.
+        Returns the previous values of the changed attributes.
+        """
+        old = {key: getattr(task, key) for key in changes}
+        for key, value in changes.items():
+            setattr(task, key, value)
+        if not self.storage.resident:
+            return old
+        self._index.update(task, old)
+        if self.text_index is not None and \
+                old.keys() & {'id', 'title', 'description'}:
+            self.text_index.remove(old.get('id', task.id),
+                                   old.get('title', task.title),
+                                   old.get('description', task.description))
+            self.text_index.add(task.id, task.title, task.description)
+        return old
+
+    def _remove(self, task: Task) -> None:
+        """
+        Removes a task from the in-memory indexes.
+        """
+        if not self.storage.resident:
+            return
+        self._index.remove(task)
+        if self.text_index is not None:
+            self.text_index.remove(task.id, task.title, task.description)
 
     def _save_tasks(self) -> None:
         """
-        Saves the current list of tasks to the JSON file specified by the filename attribute.
-        The tasks are serialized to a list of dictionaries, using each task's to_dict method.
+        Saves the current list of tasks through the storage backend.
+        For the JSON backend this rewrites the task file and compacts the journal.
+        """
+        if not self.storage.resident:
+            return
+        self.storage.save(self.index)
+        self._save_text_index()
+
+    def _commit(self, change: Change, old: dict = None) -> None:
+        """
+        Persists a single mutation through the storage backend, or queues it
+        until the end of the current batch.
+
+        Args:
+            change (Change): The mutation to persist.
+            old (dict, optional): The previous values of the attributes changed
+                by an 'edit', used to roll the batch back.
+        """
+        if self._stats is not None:
+            self._stats.apply(change, old)
+        if self._batch is not None:
+            self._batch.append((change, old))
+            return
+        self._submit([(change, old)])
+
+    def _submit(self, batch: list[tuple[Change, dict]]) -> None:
+        """
+        Persists a group of mutations, or hands it to the background writer
+        in write-behind mode.
+        """
+        if not self.write_behind:
+            self._persist(batch)
+            return
+        if not self._pending or \
+                len(self._pending) + len(batch) >= self.flush_threshold:
+            self._changed.notify()
+        self._pending.extend(batch)
+
+    def _write_behind(self) -> None:
+        """
+        The background writer: once mutations are waiting, waits for up to
+        flush_interval seconds for more to arrive, then persists them all.
+        """
+        with self._changed:
+            while True:
+                while not self._pending and not self._closing:
+                    self._changed.wait()
+                if self._closing:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.flush_threshold and \
+                        not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                if self._closing:
+                    return
+                try:
+                    self._flush_pending()
+                except Exception as e:
+                    self.flush_error = e
+                    print(f"Error saving tasks: {e!r}", file=sys.stderr)
+
+    def _flush_pending(self) -> None:
+        """
+        Persists the mutations waiting in write-behind mode. If writing fails,
+        they are kept for the next flush, unless they conflicted with changes
+        made by another process and were dropped.
+        """
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            self._persist(batch)
+        except ConflictError:
+            raise
+        except BaseException:
+            self._pending[:0] = batch
+            raise
+
+    def _persist(self, batch: list[tuple[Change, dict]]) -> None:
+        """
+        Writes a group of mutations under the exclusive store lock. If another
+        process changed the store since it was loaded, the mutations are first
+        merged into its current contents.
+
+        Raises:
+            ConflictError: If another process edited the same field of a task
+                to a different value, or deleted a task that was edited.
+                Nothing is written, and the in-memory tasks are replaced with
+                the current contents of the store.
         """
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump([task.to_dict() for task in self.tasks], file,
-                      ensure_ascii=False, indent=4)
+        with self._locked_store():
+            version = self.storage.version()
+            stats = self._stats
+            if stats is None and not self.storage.aggregates:
+                # the counters are not kept in memory: update the persisted ones
+                stats = TaskStats.load(self.filename + '.stats', self._store_stamp())
+                if stats is not None:
+                    for change, old in batch:
+                        stats.apply(change, old)
+            sync = SyncState.load(self.filename + '.sync', self._store_stamp())
+            if self._version is not None and version != self._version:
+                batch = self._merge(batch)
+                stats = None
+            if sync is not None and self.storage.resident:
+                # the tasks after the batch, before a background write lets
+                # other threads change them
+                self._record_sync(sync, batch)
+            with metrics.timer('storage.commit'):
+                saved = self._write([change for change, _ in batch])
+            # the trigram index and the counters already include the
+            # mutations made during a background write: they are saved by
+            # the flush that persists those mutations
+            if saved and not self._pending:
+                self._save_text_index()
+            self._version = self.storage.version()
+            # missing counters of a store that is not resident are rebuilt by
+            # stats, rather than by loading the whole store on a mutation
+            if stats is None and self.storage.resident:
+                stats = TaskStats(self._index)
+            if stats is not None and not self._pending:
+                stats.save(self.filename + '.stats', self._store_stamp())
+            if self.storage.resident:
+                self._stats = stats
+            if sync is not None:
+                if not self.storage.resident:
+                    self._record_sync(sync, batch)
+                sync.save(self.filename + '.sync', self._store_stamp())
+        for change, _ in batch:
+            if change.op == 'add':
+                self.next_id = max(self.next_id, change.task.id)
+
+    def _write(self, changes: list[Change]) -> bool:
+        """
+        Commits changes through the storage backend. The background writer
+        commits outside the manager's lock, with the list of tasks taken under
+        it, so that foreground calls are not held up by the write.
+
+        Returns:
+            bool: True if a full snapshot of the tasks was written.
+        """
+        if threading.current_thread() is not self._writer:
+            return self.storage.commit(changes, self._index)
+        tasks = list(self._index) if self.storage.resident else ()
+        self._writing = True
+        self._lock.release()
+        try:
+            return self.storage.commit(changes, tasks)
+        finally:
+            self._lock.acquire()
+            self._writing = False
+            self._written.notify_all()
+
+    @contextmanager
+    def _locked_store(self, shared: bool = False):
+        """
+        Takes the store lock while holding the manager's lock. If the
+        background writer is committing, waits for it first: it holds the
+        store lock and needs the manager's lock to finish.
+        """
+        while self._writing:
+            self._written.wait()
+        with self.storage.lock(shared):
+            yield
+
+    def _record_sync(self, sync: SyncState, batch: list[tuple[Change, dict]]) -> None:
+        """
+        Records the tasks changed by a persisted batch in the sync state.
+        """
+        # the tasks as they were before the batch, None for new ones
+        before = {}
+        for change, old in reversed(batch):
+            if change.op == 'add':
+                before[change.task.id] = None
+            elif change.op == 'delete':
+                before[change.task.id] = change.task
+            elif change.op == 'edit':
+                task = before.get(change.task.id, change.task)
+                if task is not None:
+                    before[change.task.id] = replace(task, **old)
+        for task_id, task in before.items():
+            after = self._index.get(task_id) if self.storage.resident \
+                else self.storage.get(task_id)
+            sync.record(task_id, task, after, self._received.get(task_id))
+
+    @metrics.timed
+    def _merge(self, batch: list[tuple[Change, dict]]) -> list[tuple[Change, dict]]:
+        """
+        Reloads the store and re-applies the mutations of a batch on top of it.
+
+        Edited tasks keep the fields this process changed and take every other
+        field from the store, so edits of different fields by different
+        processes are both kept. New tasks are renumbered after the highest ID
+        in the store if another process has used their IDs.
 
+        Returns:
+            list[tuple[Change, dict]]: The batch with the IDs of new tasks updated.
+        """
+        self._stats = None
+        new = {}
+        edited = {}
+        deleted = set()
+        for change, old in batch:
+            key = id(change.task)
+            if change.op == 'add':
+                new[key] = change.task
+            elif key in new:
+                if change.op == 'delete':
+                    del new[key]
+            elif change.op == 'edit':
+                task_id, base = edited.setdefault(key, (change.task_id, {}))
+                for field, value in old.items():
+                    base.setdefault(field, value)
+            elif change.op == 'delete':
+                deleted.add(edited.pop(key, (change.task_id,))[0])
+        tasks = {id(change.task): change.task for change, _ in batch}
+
+        self.tasks = self.storage.load()
+        self.text_index = self._load_text_index() if self.use_text_index else None
+        self._replay_journal()
+        merged = []
+        for key, (task_id, base) in edited.items():
+            task = tasks[key]
+            current = self._index.get(task_id)
+            if current is None or any(
+                    getattr(current, field) not in (value, getattr(task, field))
+                    for field, value in base.items()):
+                raise ConflictError
+            merged.append((current, task, base))
+        for current, task, base in merged:
+            for field in Task.__slots__:
+                if field not in base:
+                    setattr(task, field, getattr(current, field))
+            self._remove(current)
+            self._insert(task)
+        for task_id in deleted:
+            task = self._index.get(task_id)
+            if task is not None:
+                self._remove(task)
+
+        renumbered = {}
+        max_id = max((task.id for task in self._index), default=0)
+        if new and min(task.id for task in new.values()) <= max_id:
+            for task in sorted(new.values(), key=lambda t: t.id):
+                max_id += 1
+                renumbered[task.id] = max_id
+                task.id = max_id
+        for task in new.values():
+            self._insert(task)
+        self.next_id = max(self.next_id, max_id)
+        return [(change._replace(task_id=renumbered.get(change.task_id,
+                                                        change.task_id)), old)
+                for change, old in batch]
+
+    def _undo(self, change: Change, old: dict = None) -> None:
+        """
+        Reverts a mutation in memory.
+        """
+        if self._stats is not None:
+            self._stats.revert(change, old)
+        if change.op == 'add':
+            self._remove(change.task)
+        elif change.op == 'edit':
+            self._modify(change.task, old)
+        elif change.op == 'delete':
+            self._insert(change.task)
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups mutations so that they are persisted together with a single
+        write when the block exits. If the block raises, every mutation made
+        inside it is rolled back and nothing is written. Nested batches join
+        the outermost one.
+
+        Example:
+            with task_manager.batch():
+                task_manager.add_task(...)
+                task_manager.complete_task(1)
+        """
+        with self._lock:
+            if self._batch is not None:
+                yield
+                return
+            if not self.loaded:
+                self._load()
+            # tasks are changed in place: a rolled back change must not end
+            # up in a snapshot that the background writer is writing
+            while self._writing:
+                self._written.wait()
+            next_id = self.next_id
+            self._batch = []
+            try:
+                yield
+            except BaseException:
+                batch, self._batch = self._batch, None
+                for change, old in reversed(batch):
+                    self._undo(change, old)
+                self.next_id = next_id
+                raise
+            batch, self._batch = self._batch, None
+            if batch:
+                self._submit(batch)
+
+    @metrics.timed
+    @synchronized
     def get_tasks(self) -> list[Task]:
         """
         Returns the current list of tasks.
@@ -61,6 +649,8 @@ class TaskManager:
         """
         return self.tasks
 
+    @metrics.timed
+    @synchronized
     def add_task(self, title, description, category, due_date, priority) -> Task:
         """
         Adds a new task to the task list and saves it.
@@ -79,15 +669,18 @@ class TaskManager:
             InvalidPriority: If the provided priority is not valid.
             InvalidDate: If the provided due date is not valid.
         """
-
-        TaskManager.next_id += 1
+        if not self.loaded:
+            self._load()
+        self.next_id += 1
         self.validate_data(priority, due_date)
-        task = Task(TaskManager.next_id, title, description,
-                    category, due_date, Priority(priority))
-        self.tasks.append(task)
-        self._save_tasks()
+        task = Task(self.next_id, title, description,
+                    category, due_date, PRIORITIES[priority])
+        self._insert(task)
+        self._commit(Change('add', task.id, task))
         return task
 
+    @metrics.timed
+    @synchronized
     def edit_task(self, task_id, **kwargs) -> bool:
         """
         Edits an existing task with given attributes and saves the changes.
@@ -101,17 +694,27 @@ class TaskManager:
 
         Raises:
             TaskNotFound: If the task with the specified ID is not found.
+            InvalidPriority: If the new priority is not valid.
+            InvalidDate: If the new due date is not valid.
         """
-        task = self.get_task_by_id(task_id)
+        task = self._get(task_id)
         if not task:
             raise TaskNotFound
-        for key, value in kwargs.items():
+        for key in kwargs:
             if not hasattr(task, key):
                 raise ValueError(f"Invalid attribute: {key}")
-            setattr(task, key, value)
-        self._save_tasks()
+        if 'due_date' in kwargs and to_ordinal(kwargs['due_date']) is None:
+            raise InvalidDate
+        if isinstance(kwargs.get('priority'), str):
+            if kwargs['priority'] not in PRIORITIES:
+                raise InvalidPriority(kwargs['priority'])
+            kwargs['priority'] = PRIORITIES[kwargs['priority']]
+        old = self._modify(task, kwargs)
+        self._commit(Change('edit', task_id, task, kwargs), old)
         return True
 
+    @metrics.timed
+    @synchronized
     def delete_task(self, task_id) -> bool:
         """
         Deletes a task by its ID and saves the change.
@@ -125,13 +728,179 @@ class TaskManager:
         Raises:
             TaskNotFound: If the task with the specified ID is not found.
         """
-        task = self.get_task_by_id(task_id)
+        task = self._get(task_id)
         if not task:
             raise TaskNotFound
-        self.tasks.remove(task)
-        self._save_tasks()
+        self._remove(task)
+        self._commit(Change('delete', task_id, task))
         return True
 
+    @metrics.timed
+    @synchronized
+    def add_tasks(self, tasks: Iterable[dict]) -> list[Task]:
+        """
+        Adds several tasks and saves them with a single write.
+
+        Args:
+            tasks (Iterable[dict]): The tasks to add, as keyword arguments of add_task.
+
+        Returns:
+            list[Task]: The newly created Task objects.
+
+        Raises:
+            InvalidPriority: If a priority is not valid. No task is added.
+            InvalidDate: If a due date is not valid. No task is added.
+        """
+        with self.batch():
+            return [self.add_task(**data) for data in tasks]
+
+    @metrics.timed
+    @synchronized
+    def edit_tasks(self, changes: dict[int, dict]) -> bool:
+        """
+        Edits several tasks and saves the changes with a single write.
+
+        Args:
+            changes (dict[int, dict]): The attributes to update, by task ID.
+
+        Returns:
+            bool: True if all tasks were successfully edited.
+
+        Raises:
+            TaskNotFound: If one of the tasks is not found. No task is edited.
+            InvalidPriority: If a new priority is not valid. No task is edited.
+        """
+        with self.batch():
+            for task_id, kwargs in changes.items():
+                self.edit_task(task_id, **kwargs)
+        return True
+
+    @metrics.timed
+    @synchronized
+    def delete_tasks(self, task_ids: Iterable[int]) -> int:
+        """
+        Deletes several tasks and saves the change with a single write.
+
+        Args:
+            task_ids (Iterable[int]): The IDs of the tasks to delete.
+
+        Returns:
+            int: The number of deleted tasks.
+
+        Raises:
+            TaskNotFound: If one of the tasks is not found. No task is deleted.
+        """
+        count = 0
+        with self.batch():
+            for task_id in task_ids:
+                self.delete_task(task_id)
+                count += 1
+        return count
+
+    @metrics.timed
+    @synchronized
+    def delete_tasks_by_category(self, category) -> int:
+        """
+        Deletes all tasks of a category and saves the change with a single write.
+
+        Args:
+            category (str): The category of the tasks to delete.
+
+        Returns:
+            int: The number of deleted tasks.
+        """
+        with self.batch():
+            return self.delete_tasks(
+                [task.id for task in self.get_tasks_by(category=category)])
+
+    @metrics.timed
+    @synchronized
+    def import_file(self, filename, errors=None, workers=None) -> tuple[int, int]:
+        """
+        Imports tasks from a CSV or JSON Lines file. Rows are streamed and
+        validated in chunks across a process pool; the valid ones get
+        consecutive IDs and are saved with a single write, the rejected ones
+        are reported.
+
+        Args:
+            filename (str): A '.csv' file with a header line naming the task
+                fields, or a JSON Lines file of task objects. IDs in the file
+                are ignored, and a missing status means "Не выполнена". It
+                can be compressed with gzip, bzip2 or xz ('tasks.csv.gz').
+            errors (str, optional): A file the rejected rows are written to,
+                one JSON object with their 'line' and 'error' per line.
+            workers (int, optional): The number of validation processes.
+                Defaults to the number of CPUs.
+
+        Returns:
+            tuple[int, int]: The number of imported and of rejected rows.
+        """
+        # the pipeline is imported here so that other commands do not pay for it
+        from bulk import read_records
+        if errors is None:
+            records, failed = read_records(filename, workers=workers)
+        else:
+            with open(errors, 'w', encoding='utf-8') as file:
+                records, failed = read_records(filename, file, workers)
+        with self.batch():
+            first_id = self.next_id + 1
+            self.next_id += len(records)
+            tasks = [Task(task_id, data['title'], data['description'],
+                          data['category'], data['due_date'],
+                          PRIORITIES[data['priority']], data['status'])
+                     for task_id, data in enumerate(records, first_id)]
+            self._insert_many(tasks)
+            for task in tasks:
+                self._commit(Change('add', task.id, task))
+        return len(tasks), failed
+
+    @metrics.timed
+    @synchronized
+    def export_file(self, filename) -> int:
+        """
+        Exports all tasks to a CSV, JSON or JSON Lines file, chosen by the
+        extension of the file, and compressed if it ends in '.gz', '.bz2' or
+        '.xz'. Tasks are written one at a time, straight from the store when
+        it can be streamed.
+
+        Args:
+            filename (str): The file to write.
+
+        Returns:
+            int: The number of exported tasks.
+        """
+        from bulk import write_records
+        if self._pushdown():
+            return write_records(self.storage.records(), filename)
+        return write_records(map(task_to_dict, self.index), filename)
+
+    @metrics.timed
+    @synchronized
+    def records(self, keyword=None, order_by=None, limit=None, offset=0,
+                **kwargs) -> Iterator[dict]:
+        """
+        Returns the tasks selected as by get_tasks_by, as dictionaries.
+        Without conditions and sort order they are streamed straight from the
+        store when it can be streamed, without building Task objects.
+
+        Args:
+            keyword (str, optional): A keyword to search in the task title or description.
+            order_by (str | list[str], optional): The fields to sort by, see query.
+            limit (int, optional): The maximum number of tasks to return.
+            offset (int, optional): The number of leading tasks to skip.
+            **kwargs: Conditions on task attributes, as accepted by query.where.
+
+        Returns:
+            Iterator[dict]: The task dictionaries, as written by Task.to_dict.
+        """
+        condition = where(keyword=keyword or None, **kwargs)
+        if condition is None and not order_by and self._pushdown():
+            return islice(self.storage.records(), offset,
+                          None if limit is None else offset + limit)
+        return map(task_to_dict, self.query(condition, order_by, limit, offset))
+
+    @metrics.timed
+    @synchronized
     def get_task_by_id(self, task_id) -> Task:
         """
         Retrieves a task by its ID.
@@ -142,9 +911,14 @@ class TaskManager:
         Returns:
             Task: The Task object with the specified ID, or None if not found.
         """
-        return next((task for task in self.tasks if task.id == task_id), None)
+        if self._pushdown():
+            return self.storage.get(task_id)
+        return self.index.get(task_id)
 
-    def find_task(self, keyword=None, category=None, status=None) -> list[Task]:
+    @metrics.timed
+    @synchronized
+    def find_task(self, keyword=None, category=None, status=None, order_by=None,
+                  limit=None, offset=0, fuzzy=False) -> list[Task]:
         """
         Searches for tasks based on keyword, category, or status.
 
@@ -152,19 +926,82 @@ class TaskManager:
             keyword (str, optional): A keyword to search in the task title or description.
             category (str, optional): The category to filter tasks by.
             status (str, optional): The status to filter tasks by.
+            order_by (str | list[str], optional): The fields to sort by, see query.
+            limit (int, optional): The maximum number of tasks to return.
+            offset (int, optional): The number of leading tasks to skip.
+            fuzzy (bool, optional): If True, the keyword may be misspelled:
+                tasks are ranked by fuzzy_search instead of sorted by order_by.
 
         Returns:
             list[Task]: A list of Task objects that match the search criteria.
         """
-        results = self.tasks
-        if keyword:
-            results = [task for task in results if keyword.lower() in task.title.lower() or keyword.lower() in task.description.lower()]
-        if category:
-            results = [task for task in results if task.category == category]
-        if status:
-            results = [task for task in results if task.status == status]
-        return results
+        if fuzzy and keyword:
+            end = None if limit is None else offset + limit
+            return [task for task, _ in self.fuzzy_search(
+                keyword, category, status, limit=end)[offset:]]
+        return self.query(where(keyword=keyword or None, category=category or None,
+                                status=status or None),
+                          order_by, limit, offset)
+
+    @metrics.timed
+    @synchronized
+    def fuzzy_search(self, keyword, category=None, status=None, limit=10,
+                     min_score=0.7) -> list[tuple[Task, float]]:
+        """
+        Searches for tasks whose title or description contains the keyword
+        with a few typos, ranked by similarity. The score of a task is
+        1 - d / len(keyword), where d is the smallest number of edits that
+        turn the keyword into a substring of the title or description.
+
+        Only tasks sharing enough trigrams with the keyword are scored: with
+        the tasks in memory they are found in the trigram index, which is
+        built on first use if the task manager was created without one;
+        otherwise the tasks of the category and status are scanned. A short
+        keyword may share no trigram with the word it misspells, so the
+        vocabulary of the index is searched for words close to it as well.
+        Keywords shorter than three characters are matched exactly.
+
+        Args:
+            keyword (str): The keyword to search in the task title or description.
+            category (str, optional): The category to filter tasks by.
+            status (str, optional): The status to filter tasks by.
+            limit (int, optional): The number of best tasks to return, all if None.
+            min_score (float, optional): The lowest score of a returned task.
+
+        Returns:
+            list[tuple[Task, float]]: The tasks and their scores, best first.
+        """
+        keyword = keyword.lower()
+        if len(keyword) < TextIndex.N:
+            return [(task, 1.0) for task in self.find_task(keyword, category, status,
+                                                          limit=limit)]
+        filters = where(category=category or None, status=status or None)
+        grams = TextIndex.trigrams(keyword)
+        max_distance, needed = fuzzy_bounds(keyword, min_score)
+        if self._pushdown():
+            candidates = []
+            for task in self.query(filters):
+                title, description = task.title.lower(), task.description.lower()
+                shared = sum(gram in title or gram in description for gram in grams)
+                if shared or not needed:
+                    candidates.append((shared, task))
+        else:
+            index = self.index
+            if self.text_index is None:
+                self.text_index = self._load_text_index()
+            overlap = self.text_index.overlap(keyword)
+            if not needed:
+                near = self.text_index.near(keyword, max_distance)
+                for task_id in index.by_id if near is None else near:
+                    overlap.setdefault(task_id, 0)
+            candidates = [(shared, index.by_id[task_id]) for task_id, shared
+                          in overlap.items()
+                          if filters is None or filters.matches(index.by_id[task_id])]
+        metrics.count('fuzzy_candidates', len(candidates))
+        return fuzzy_rank(keyword, candidates, limit, min_score)
 
+    @metrics.timed
+    @synchronized
     def complete_task(self, task_id) -> bool:
         """
         Marks a task as completed by setting its status to "Выполнена".
@@ -177,25 +1014,299 @@ class TaskManager:
         """
         return self.edit_task(task_id, status="Выполнена")
 
-    def get_tasks_by(self, **kwargs) -> list[Task]:
+    @metrics.timed
+    @synchronized
+    def get_tasks_by(self, order_by=None, limit=None, offset=0, **kwargs) -> list[Task]:
         """
         Retrieves tasks filtered by specified attributes.
 
         Args:
-            **kwargs: Arbitrary keyword arguments for task attributes to filter by.
+            order_by (str | list[str], optional): The fields to sort by, see query.
+            limit (int, optional): The maximum number of tasks to return.
+            offset (int, optional): The number of leading tasks to skip.
+            **kwargs: Conditions on task attributes, as accepted by query.where:
+                ``priority='Высокий'``, ``priority__in=[...]``,
+                ``due_date__gte='2024-01-01'``, ``due_date__lte=...``.
+                Without conditions all tasks are returned.
 
         Returns:
             list[Task]: A list of Task objects that match the specified attributes.
+
+        Raises:
+            ValueError: If an attribute does not exist.
         """
-        if 'category' in kwargs:
-            return [task for task in self.tasks if task.category == kwargs['category']]
-        return []
+        return self.query(where(**kwargs), order_by, limit, offset)
+
+    @metrics.timed
+    @synchronized
+    def query(self, where=None, order_by=None, limit=None, offset=0) -> list[Task]:
+        """
+        Runs a query. In memory, the index of the most selective condition is
+        scanned; non-resident backends evaluate the query themselves (SQLite
+        in SQL). With a limit, only the first offset + limit tasks are kept
+        while sorting.
+
+        Args:
+            where (Predicate, optional): The condition, built with query.where
+                or from Eq, In, Range, Contains combined with & and |.
+            order_by (str | list[str], optional): The fields to sort by,
+                comma-separated, each optionally prefixed with '-' for
+                descending order. Defaults to the task ID.
+            limit (int, optional): The maximum number of tasks to return.
+            offset (int, optional): The number of leading tasks to skip.
+
+        Returns:
+            list[Task]: The matching tasks.
+
+        Raises:
+            ValueError: If a sort field does not exist.
+        """
+        query = Query.build(where, order_by, limit, offset)
+        if self._pushdown():
+            return self.storage.query(query)
+        return query.run(self.index, self.text_index)
+
+    @metrics.timed
+    @synchronized
+    def get_overdue_tasks(self, today=None) -> list[Task]:
+        """
+        Retrieves the tasks that are not completed and were due before today.
+
+        Args:
+            today (str, optional): The current date (ГГГГ-ММ-ДД). Defaults to the system date.
+
+        Returns:
+            list[Task]: The overdue tasks, ordered by due date.
+
+        Raises:
+            InvalidDate: If today is not a valid date.
+        """
+        end = date_ordinal(today) - 1
+        if self._pushdown():
+            return self.storage.due(end=end, pending=True)
+        return self.index.due_between(end=end, pending=True)
+
+    @metrics.timed
+    @synchronized
+    def get_tasks_due(self, start=None, end=None, pending=False) -> list[Task]:
+        """
+        Retrieves the tasks due within a date range.
+
+        Args:
+            start (str, optional): The first due date to include (ГГГГ-ММ-ДД).
+            end (str, optional): The last due date to include (ГГГГ-ММ-ДД).
+            pending (bool): If True, only tasks that are not completed are returned.
+
+        Returns:
+            list[Task]: The matching tasks, ordered by due date.
+
+        Raises:
+            InvalidDate: If start or end is not a valid date.
+        """
+        start = date_ordinal(start) if start else None
+        end = date_ordinal(end) if end else None
+        if self._pushdown():
+            return self.storage.due(start, end, pending)
+        return self.index.due_between(start, end, pending)
+
+    @metrics.timed
+    @synchronized
+    def get_next_due_tasks(self, count, today=None) -> list[Task]:
+        """
+        Retrieves the next tasks that are not completed and are due today or later.
+
+        Args:
+            count (int): The maximum number of tasks to return.
+            today (str, optional): The current date (ГГГГ-ММ-ДД). Defaults to the system date.
+
+        Returns:
+            list[Task]: The matching tasks, ordered by due date.
+
+        Raises:
+            InvalidDate: If today is not a valid date.
+        """
+        start = date_ordinal(today)
+        if self._pushdown():
+            return self.storage.due(start, pending=True, limit=count)
+        return self.index.next_due(count, start)
+
+    @metrics.timed
+    @synchronized
+    def stats(self, today=None) -> dict:
+        """
+        Returns the number of tasks by status, priority and category, the
+        number of overdue tasks, and the completion ratio and overdue count of
+        every category. The counters are kept up to date by every mutation and
+        persisted next to the task file, so the store is not scanned unless
+        the counters are missing or another program changed the store.
+        Backends that count tasks with queries (SQLite) are asked every time.
+
+        Args:
+            today (str, optional): The current date (ГГГГ-ММ-ДД). Defaults to the system date.
+
+        Returns:
+            dict: 'total', 'done' and 'overdue' counts, 'by_status' and
+                'by_priority' counts, and 'categories', mapping every category,
+                largest first, to its 'total', 'done', 'completion' and 'overdue'.
+
+        Raises:
+            InvalidDate: If today is not a valid date.
+        """
+        today = date_ordinal(today)
+        if self.storage.aggregates:
+            return self.storage.stats().summary(today)
+        stats = self._stats
+        if stats is None and not (self.loaded and self.storage.resident):
+            with self._locked_store(shared=True):
+                stats = TaskStats.load(self.filename + '.stats', self._store_stamp())
+        if stats is None:
+            with self._locked_store(shared=True):
+                stats = TaskStats(self.tasks)
+                stamp = self._store_stamp()
+            if self._version in (None, stamp) and not self._pending:
+                stats.save(self.filename + '.stats', stamp)
+            if self.storage.resident:
+                self._stats = stats
+        return stats.summary(today)
+
+    @metrics.timed
+    @synchronized
+    def sync_state(self) -> SyncState:
+        """
+        Returns the version stamps and the Merkle tree of the tasks, used by
+        sync.sync_stores. They are created on first use and from then on kept
+        up to date by every mutation. If another program changed the store
+        in the meantime, they are rebuilt, and the tasks it changed get new
+        versions.
+
+        Returns:
+            SyncState: The state of the store.
+        """
+        self.flush()
+        filename = self.filename + '.sync'
+        if self.storage.resident:
+            self.index
+            with self._locked_store(shared=True):
+                stamp = self.storage.version()
+                if stamp != self._version:
+                    self._stats = None
+                    self.tasks = self.storage.load()
+                    self.text_index = self._load_text_index() \
+                        if self.use_text_index else None
+                    self._replay_journal()
+                    self._version = stamp
+        else:
+            stamp = self._store_stamp()
+        state = SyncState.load(filename, stamp)
+        if state is None:
+            tasks = self._index if self.storage.resident else self.storage.load()
+            state = SyncState.build(tasks, SyncState.load(filename))
+            state.save(filename, stamp)
+        return state
+
+    @metrics.timed
+    @synchronized
+    def apply_delta(self, records: Iterable[dict]) -> int:
+        """
+        Applies the records of a delta file received from another store, as
+        written by sync.sync_stores, with a single write: moves of tasks to
+        new IDs, then tasks to store under their ID, or to delete. The tasks
+        keep the version stamps they had on the other store.
+
+        Args:
+            records (Iterable[dict]): The records, each with the task 'id',
+                its 'stamp' and either the new ID to 'move' the task to or
+                the 'task' dictionary, None for a deleted task.
+
+        Returns:
+            int: The number of records applied.
+        """
+        received = {}
+        # the tasks changed by the records applied so far, None if removed
+        changed = {}
+        count = 0
+        try:
+            with self.batch():
+                for count, record in enumerate(records, 1):
+                    task_id = record['id']
+                    current = changed[task_id] if task_id in changed \
+                        else self._get(task_id)
+                    if 'move' in record:
+                        if current is None:
+                            continue
+                        moved = replace(current, id=record['move'])
+                        self._remove(current)
+                        self._commit(Change('delete', task_id, current))
+                        self._insert(moved)
+                        self._commit(Change('add', moved.id, moved))
+                        changed[task_id], changed[moved.id] = None, moved
+                        received[moved.id] = record['stamp']
+                        continue
+                    received[task_id] = record['stamp']
+                    if record['task'] is None:
+                        if current is not None:
+                            self._remove(current)
+                            self._commit(Change('delete', task_id, current))
+                            changed[task_id] = None
+                    elif current is None:
+                        task = task_from_dict(record['task'])
+                        self._insert(task)
+                        self._commit(Change('add', task_id, task))
+                        changed[task_id] = task
+                    else:
+                        task = task_from_dict(record['task'])
+                        fields = {field: getattr(task, field) for field in Task.__slots__
+                                  if getattr(task, field) != getattr(current, field)}
+                        if fields:
+                            old = self._modify(current, fields)
+                            self._commit(Change('edit', task_id, current, fields), old)
+                        changed[task_id] = current
+                self._received = received
+            self.flush()
+        finally:
+            self._received = {}
+        return count
+
+    @metrics.timed
+    @synchronized
+    def flush(self) -> None:
+        """
+        Persists the mutations waiting in write-behind mode.
+
+        Raises:
+            ConflictError: If the mutations conflicted with changes made by
+                another process. The mutations are dropped.
+            Exception: The error of a failed background flush, if any.
+        """
+        if self.flush_error is not None:
+            error, self.flush_error = self.flush_error, None
+            if not self._pending:
+                raise error
+        self._flush_pending()
+
+    def close(self) -> None:
+        """
+        Persists the waiting mutations, stops the background writer and
+        releases the resources held by the storage backend.
+        """
+        if self._writer is not None:
+            with self._changed:
+                self._closing = True
+                self._changed.notify()
+            self._writer.join()
+            self._writer = None
+            atexit.unregister(self.close)
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self.storage.close()
 
     @staticmethod
+    @metrics.timed
     def validate_data(priority, due_date):
-        if priority not in Priority.list():
+        if not isinstance(priority, str) or priority not in PRIORITIES:
             raise InvalidPriority(priority)
-        try:
-            datetime.strptime(due_date, DATE_FORMAT)
-        except ValueError:
+        # parsed dates are cached, and tasks share few distinct due dates
+        if to_ordinal(due_date) is None:
             raise InvalidDate
@@ -1,11 +1,45 @@
+import io
+import json
+import asyncio
+import contextlib
+import gzip
+import multiprocessing
+import subprocess
+import sys
 import tempfile
+import threading
 import time
 import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
+from batch import CHECKPOINT_OPS, run_batch
+from benchmarks.compress import run_codecs
+from benchmarks.generate import generate_tasks, write_task_file
+from benchmarks.run import compare, run_scenarios
+from benchmarks.serialize import run_codec
+from bulk import FIELDS, read_records, validate_rows
+from binary_storage import BinaryStorage, export_json, import_json
+from client import TaskClient
+from codec import encode_json, encode_json_indented, task_from_dict, task_from_row, \
+    task_to_dict, task_to_row
+from dates import to_ordinal
+from iohandler import IOHandler
+from metrics import metrics
+from output import write_tasks
+from sqlite_storage import SqliteStorage
+from storage import JsonStorage
+from streaming import iter_json_array
+from sync import BUCKET_SIZE, SyncState, sync_stores
 from task import Task
 from task_manager import TaskManager
+from text_index import distance
 from priority import Priority
-from exceptions import TaskNotFound, InvalidPriority, InvalidDate
+from query import Contains, Eq, In, Query, Range, where
+from server import TaskServer
+from sharded_storage import ShardedStorage
+from exceptions import ConflictError, TaskNotFound, InvalidPriority, InvalidDate
 from constants import DATE_FORMAT
 
 class TestTaskManager(unittest.TestCase):
@@ -15,9 +49,6 @@ class TestTaskManager(unittest.TestCase):
         self.test_filename = self.temp_file.name
         self.temp_file.close()
 
-        # Reset next_id before each test
-        TaskManager.next_id = 0
-
         # Create TaskManager instance
         self.task_manager = TaskManager(filename=self.test_filename)
 
@@ -234,6 +265,20 @@ class TestTaskManager(unittest.TestCase):
         self.assertEqual(task.title, "Задача из словаря")
         self.assertEqual(task.priority, Priority.HIGH)
 
+    def test_task_is_compact(self):
+        tasks = [Task.from_dict({
+            "id": i,
+            "title": "Компактная задача",
+            "description": "Общие строки хранятся один раз.",
+            "category": "".join(["Тести", "рование"]),
+            "due_date": "-".join(["2023", "12", "31"]),
+            "priority": Priority.LOW.value,
+        }) for i in range(2)]
+        self.assertFalse(hasattr(tasks[0], '__dict__'))
+        self.assertIs(tasks[0].category, tasks[1].category)
+        self.assertIs(tasks[0].due_date, tasks[1].due_date)
+        self.assertIs(tasks[0].status, tasks[1].status)
+
     def test_save_and_load_tasks(self):
         # Add a task and save it
         task = self.task_manager.add_task(
@@ -255,5 +300,1851 @@ class TestTaskManager(unittest.TestCase):
         del new_task_manager
 
 
+class TestTaskIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.task_manager = TaskManager(
+            filename=os.path.join(self.temp_dir.name, 'tasks.json'))
+        for i, category in enumerate(["Работа", "Личное", "Работа"]):
+            self.task_manager.add_task(
+                title=f"Задача {i}",
+                description="Задача для индексов.",
+                category=category,
+                due_date=f"2024-01-0{3 - i}",
+                priority=Priority.LOW.value
+            )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_indexes_follow_edit(self):
+        self.task_manager.edit_task(1, category="Личное",
+                                    priority=Priority.HIGH.value,
+                                    due_date="2024-02-01")
+        index = self.task_manager.index
+        self.assertEqual([t.id for t in index.lookup(category="Работа")], [3])
+        self.assertEqual([t.id for t in index.lookup(category="Личное")], [1, 2])
+        self.assertEqual([t.id for t in index.lookup(priority=Priority.HIGH)], [1])
+        self.assertEqual(self.task_manager.get_task_by_id(1).priority,
+                         Priority.HIGH)
+        self.assertEqual([t.id for t in index.due_between(to_ordinal("2024-01-01"),
+                                                          to_ordinal("2024-01-31"))],
+                         [3, 2])
+
+    def test_indexes_follow_complete_and_delete(self):
+        self.task_manager.complete_task(2)
+        self.task_manager.delete_task(3)
+        self.assertEqual([t.id for t in self.task_manager.find_task(status="Выполнена")], [2])
+        self.assertEqual([t.id for t in self.task_manager.find_task(status="Не выполнена")], [1])
+        self.assertEqual([t.id for t in self.task_manager.get_tasks_by(category="Работа")], [1])
+        self.assertEqual([t.id for t in self.task_manager.index.due_between()], [2, 1])
+        self.assertIsNone(self.task_manager.get_task_by_id(3))
+
+    def test_edit_task_invalid_priority(self):
+        with self.assertRaises(InvalidPriority):
+            self.task_manager.edit_task(1, priority="НедопустимыйПриоритет")
+
+
+class TestTextIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.task_manager = TaskManager(filename=self.test_filename,
+                                        text_index=True)
+        for title, description in [("Купить МОЛОКО", "Зайти в магазин"),
+                                   ("Позвонить маме", "Про молочную кухню"),
+                                   ("Отчёт", "Подготовить отчёт по работе")]:
+            self.task_manager.add_task(
+                title=title,
+                description=description,
+                category="Тестирование",
+                due_date="2023-12-31",
+                priority=Priority.LOW.value
+            )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def ids(self, tasks):
+        return [task.id for task in tasks]
+
+    def test_search_folds_cyrillic_case(self):
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="молок")), [1])
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="МОЛО")), [1, 2])
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="ма")), [1, 2])
+
+    def test_candidates_are_verified(self):
+        # every trigram of "ь мол" occurs in task 2, the substring does not
+        self.assertIn(2, self.task_manager.text_index.candidates("ь мол"))
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="ь мол")), [1])
+
+    def test_index_follows_edit_and_delete(self):
+        self.task_manager.edit_task(3, title="Молоко для отчёта")
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="молоко")), [1, 3])
+        self.task_manager.delete_task(1)
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="молоко")), [3])
+        self.assertEqual(self.task_manager.find_task(keyword="купить"), [])
+
+    def test_index_is_persisted(self):
+        self.assertTrue(os.path.exists(self.test_filename + '.trgm'))
+        new_task_manager = TaskManager(filename=self.test_filename,
+                                       text_index=True)
+        self.assertIn('отч', new_task_manager.text_index.postings)
+        self.assertEqual(self.ids(new_task_manager.find_task(keyword="Отчёт")), [3])
+
+    def test_stale_index_is_rebuilt(self):
+        TaskManager(filename=self.test_filename).delete_task(3)
+        new_task_manager = TaskManager(filename=self.test_filename,
+                                       text_index=True)
+        self.assertNotIn('отч', new_task_manager.text_index.postings)
+
+
+class TestStreamingLoad(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def fill(self, filename):
+        task_manager = TaskManager(filename=filename)
+        for i, category in enumerate(["Работа", "Личное", "Работа"]):
+            task_manager.add_task(
+                title=f"Задача {i}",
+                description="Потоковая загрузка.",
+                category=category,
+                due_date="2023-12-31",
+                priority=Priority.LOW.value
+            )
+        return task_manager
+
+    def test_iter_json_array_across_chunks(self):
+        data = [{"id": i, "title": "Задача " * i} for i in range(50)]
+        text = json.dumps(data, ensure_ascii=False, indent=4)
+        for chunk_size in (1, 7, 4096):
+            self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size)), data)
+        self.assertEqual(list(iter_json_array(io.StringIO(""))), [])
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('[{"id": 1},]')))
+
+    def test_jsonl_round_trip(self):
+        filename = os.path.join(self.temp_dir.name, 'tasks.jsonl')
+        self.fill(filename)
+        with open(filename, encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), 3)
+        task_manager = TaskManager(filename=filename)
+        self.assertEqual([t.id for t in task_manager.tasks], [1, 2, 3])
+        self.assertEqual(task_manager.next_id, 3)
+
+    def test_lazy_filtered_read_does_not_load(self):
+        filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.fill(filename)
+        task_manager = TaskManager(filename=filename, lazy=True)
+        self.assertEqual([t.id for t in task_manager.get_tasks_by(category="Работа")], [1, 3])
+        self.assertEqual([t.id for t in task_manager.find_task(keyword="задача 1")], [2])
+        self.assertEqual(task_manager.get_task_by_id(3).category, "Работа")
+        self.assertFalse(task_manager.loaded)
+        task_manager.complete_task(3)
+        self.assertTrue(task_manager.loaded)
+        self.assertEqual(len(task_manager.tasks), 3)
+        self.assertEqual(TaskManager(filename=filename).get_task_by_id(3).status,
+                         "Выполнена")
+
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_filename = os.path.join(self.temp_dir.name, 'tasks.db')
+        self.task_manager = TaskManager(filename=self.test_filename)
+        for i, category in enumerate(["Работа", "Личное", "Работа"]):
+            self.task_manager.add_task(
+                title=f"Задача {i}",
+                description=f"Описание ЗАДАЧИ {i}",
+                category=category,
+                due_date="2023-12-31",
+                priority=Priority.MEDIUM.value
+            )
+
+    def tearDown(self):
+        self.task_manager.close()
+        self.temp_dir.cleanup()
+
+    def ids(self, tasks):
+        return [task.id for task in tasks]
+
+    def test_backend_is_chosen_by_extension(self):
+        self.assertIsInstance(self.task_manager.storage, SqliteStorage)
+        self.assertEqual(self.task_manager.index.by_id, {})
+
+    def test_mutations_are_persisted(self):
+        self.task_manager.edit_task(1, title="Изменённая", priority=Priority.HIGH.value)
+        self.task_manager.complete_task(2)
+        self.task_manager.delete_task(3)
+        self.task_manager.close()
+
+        self.task_manager = TaskManager(filename=self.test_filename)
+        self.assertEqual(self.task_manager.next_id, 2)
+        task = self.task_manager.get_task_by_id(1)
+        self.assertEqual(task.title, "Изменённая")
+        self.assertEqual(task.priority, Priority.HIGH)
+        self.assertEqual(self.task_manager.get_task_by_id(2).status, "Выполнена")
+        self.assertIsNone(self.task_manager.get_task_by_id(3))
+        with self.assertRaises(TaskNotFound):
+            self.task_manager.delete_task(3)
+
+    def test_filters_are_pushed_down(self):
+        self.task_manager.complete_task(3)
+        self.assertEqual(self.ids(self.task_manager.get_tasks_by(category="Работа")), [1, 3])
+        self.assertEqual(self.ids(self.task_manager.find_task(keyword="задачи 1")), [2])
+        self.assertEqual(self.ids(self.task_manager.find_task(
+            category="Работа", status="Выполнена")), [3])
+        self.assertEqual(self.ids(self.task_manager.get_tasks()), [1, 2, 3])
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.task_manager = TaskManager(filename=self.test_filename)
+        self.commits = []
+        commit = self.task_manager.storage.commit
+
+        def counting_commit(changes, tasks):
+            self.commits.append(len(changes))
+            return commit(changes, tasks)
+
+        self.task_manager.storage.commit = counting_commit
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def task_data(self, i, category="Работа", due_date="2023-12-31"):
+        return dict(title=f"Задача {i}", description="Пакетная задача.",
+                    category=category, due_date=due_date,
+                    priority=Priority.LOW.value)
+
+    def test_add_tasks_writes_once(self):
+        tasks = self.task_manager.add_tasks(self.task_data(i) for i in range(5))
+        self.assertEqual([t.id for t in tasks], [1, 2, 3, 4, 5])
+        self.assertEqual(self.commits, [5])
+        self.assertEqual(len(TaskManager(filename=self.test_filename).tasks), 5)
+
+    def test_invalid_task_rolls_back_batch(self):
+        self.task_manager.add_task(**self.task_data(0))
+        data = [self.task_data(1), self.task_data(2, due_date="31-12-2023")]
+        with self.assertRaises(InvalidDate):
+            self.task_manager.add_tasks(data)
+        self.assertEqual([t.id for t in self.task_manager.tasks], [1])
+        self.assertEqual(self.task_manager.next_id, 1)
+        self.assertEqual(self.commits, [1])
+
+    def test_batch_context_rolls_back_edits_and_deletes(self):
+        self.task_manager.add_tasks(self.task_data(i) for i in range(3))
+        with self.assertRaises(TaskNotFound):
+            with self.task_manager.batch():
+                self.task_manager.edit_task(1, title="Изменена", category="Личное")
+                self.task_manager.delete_task(2)
+                self.task_manager.complete_task(999)
+        self.assertEqual(self.task_manager.get_task_by_id(1).title, "Задача 0")
+        self.assertEqual([t.id for t in self.task_manager.get_tasks_by(category="Работа")],
+                         [1, 2, 3])
+        self.assertEqual(self.commits, [3])
+
+    def test_edit_and_delete_tasks(self):
+        self.task_manager.add_tasks(self.task_data(i) for i in range(3))
+        self.task_manager.edit_tasks({1: {"status": "Выполнена"},
+                                      2: {"category": "Личное"}})
+        self.assertEqual(self.task_manager.delete_tasks_by_category("Работа"), 2)
+        self.assertEqual(self.commits, [3, 2, 2])
+        self.assertEqual([t.id for t in TaskManager(filename=self.test_filename).tasks], [2])
+
+    def test_journal_batch_is_one_record(self):
+        task_manager = TaskManager(filename=self.test_filename, journal=True)
+        task_manager.add_tasks(self.task_data(i) for i in range(3))
+        with open(self.test_filename + '.journal', encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), 1)
+        self.assertEqual(task_manager.storage.journal.size, 3)
+        new_task_manager = TaskManager(filename=self.test_filename, journal=True)
+        self.assertEqual([t.id for t in new_task_manager.tasks], [1, 2, 3])
+
+
+class TestLazyStartup(unittest.TestCase):
+    def test_io_handler_creates_manager_on_first_access(self):
+        display = IOHandler()
+        self.assertIsNone(display._tm)
+        self.assertEqual(display.load_time, 0.0)
+
+    def test_lazy_manager_loads_on_first_access(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            task_manager = TaskManager(
+                filename=os.path.join(temp_dir, 'tasks.json'), lazy=True)
+            display = IOHandler(task_manager)
+            self.assertIs(display.tm, task_manager)
+            self.assertFalse(task_manager.loaded)
+            task_manager.get_tasks()
+            self.assertTrue(task_manager.loaded)
+            self.assertGreater(display.load_time, 0.0)
+
+    def test_io_handler_opens_the_given_task_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'tasks.db')
+            display = IOHandler(filename=filename)
+            display.add_task(title='a', description='b', category='Работа',
+                             due_date='2030-01-01', priority='Высокий')
+            self.assertEqual(display.tm.storage.filename, filename)
+            self.assertFalse(display.tm.storage.resident)
+            display.tm.close()
+            self.assertEqual(len(TaskManager(filename).get_tasks()), 1)
+
+    def test_commands_do_not_import_the_bulk_pipeline(self):
+        code = 'import sys, iohandler; print("bulk" in sys.modules, "multiprocessing" in sys.modules)'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                                text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.split(), ['False', 'False'])
+
+
+class TestBinaryStorage(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_filename = os.path.join(self.temp_dir.name, 'tasks.bin')
+        task_manager = TaskManager(filename=self.test_filename)
+        task_manager.add_tasks(dict(
+            title=f"Бинарная задача {i}",
+            description="Описание в куче строк.",
+            category=category,
+            due_date="2023-12-31",
+            priority=Priority.HIGH.value
+        ) for i, category in enumerate(["Работа", "Личное", "Работа", "Дом"]))
+        task_manager.complete_task(3)
+        task_manager.close()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_backend_is_chosen_by_extension(self):
+        task_manager = TaskManager(filename=self.test_filename, lazy=True)
+        self.assertIsInstance(task_manager.storage, BinaryStorage)
+        self.assertEqual(task_manager.storage.max_id(), 4)
+        task_manager.close()
+
+    def test_reads_without_loading(self):
+        task_manager = TaskManager(filename=self.test_filename, lazy=True)
+        task = task_manager.get_task_by_id(3)
+        self.assertEqual(task.title, "Бинарная задача 2")
+        self.assertEqual(task.status, "Выполнена")
+        self.assertEqual(task.priority, Priority.HIGH)
+        self.assertIsNone(task_manager.get_task_by_id(5))
+        self.assertEqual([t.id for t in task_manager.get_tasks_by(category="Работа")], [1, 3])
+        self.assertEqual([t.id for t in task_manager.find_task(
+            category="Работа", status="Не выполнена")], [1])
+        self.assertEqual([t.id for t in task_manager.find_task(keyword="задача 3")], [4])
+        self.assertEqual(task_manager.find_task(category="Нет такой"), [])
+        self.assertFalse(task_manager.loaded)
+        task_manager.close()
+
+    def test_mutations_rewrite_snapshot(self):
+        task_manager = TaskManager(filename=self.test_filename)
+        task_manager.delete_task(1)
+        task_manager.edit_task(2, category="Работа")
+        task_manager.close()
+        task_manager = TaskManager(filename=self.test_filename, lazy=True)
+        self.assertEqual([t.id for t in task_manager.get_tasks_by(category="Работа")], [2, 3])
+        self.assertEqual(len(task_manager.get_tasks()), 3)
+        task_manager.close()
+
+    def test_json_import_export(self):
+        json_filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.assertEqual(export_json(self.test_filename, json_filename), 4)
+        binary_filename = os.path.join(self.temp_dir.name, 'copy.bin')
+        self.assertEqual(import_json(json_filename, binary_filename), 4)
+        original = BinaryStorage(self.test_filename)
+        copy = BinaryStorage(binary_filename)
+        self.assertEqual(original.load(), copy.load())
+        original.close()
+        copy.close()
+
+
+class TestDueDates(unittest.TestCase):
+    DUE_DATES = ["2024-03-01", "2024-01-15", "2024-02-10", "2024-01-20", "2024-05-01"]
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def task_manager(self, filename, **kwargs):
+        path = os.path.join(self.temp_dir.name, filename)
+        task_manager = TaskManager(filename=path)
+        task_manager.add_tasks(dict(
+            title=f"Срок {i}",
+            description="Задача со сроком.",
+            category="Сроки",
+            due_date=due_date,
+            priority=Priority.MEDIUM.value
+        ) for i, due_date in enumerate(self.DUE_DATES))
+        task_manager.complete_task(4)
+        task_manager.close()
+        return TaskManager(filename=path, **kwargs)
+
+    def check_queries(self, task_manager):
+        ids = lambda tasks: [task.id for task in tasks]
+        self.assertEqual(ids(task_manager.get_overdue_tasks(today="2024-02-10")), [2])
+        self.assertEqual(ids(task_manager.get_tasks_due("2024-01-16", "2024-03-01")),
+                         [4, 3, 1])
+        self.assertEqual(ids(task_manager.get_tasks_due("2024-01-16", "2024-03-01",
+                                                        pending=True)), [3, 1])
+        self.assertEqual(ids(task_manager.get_next_due_tasks(2, today="2024-01-16")),
+                         [3, 1])
+        self.assertEqual(ids(task_manager.get_next_due_tasks(5, today="2024-06-01")), [])
+        with self.assertRaises(InvalidDate):
+            task_manager.get_overdue_tasks(today="01-01-2024")
+        task_manager.close()
+
+    def test_in_memory_index(self):
+        task_manager = self.task_manager('tasks.json')
+        task_manager.edit_task(5, due_date="2024-02-01")
+        self.assertEqual([t.id for t in task_manager.get_overdue_tasks(today="2024-02-10")],
+                         [2, 5])
+        task_manager.edit_task(5, due_date="2024-05-01")
+        self.check_queries(task_manager)
+
+    def test_streamed_json(self):
+        self.check_queries(self.task_manager('tasks.json', lazy=True))
+
+    def test_sqlite(self):
+        self.check_queries(self.task_manager('tasks.db'))
+
+    def test_non_padded_dates_match_the_index(self):
+        ids = lambda tasks: [task.id for task in tasks]
+        for filename in ('tasks.json', 'tasks.db'):
+            with self.subTest(filename=filename):
+                task_manager = self.task_manager(filename)
+                task_manager.add_task("Срок 5", "", "Сроки", "2024-2-5", "Средний")
+                if filename == 'tasks.db':
+                    task_manager.storage.conn.execute(
+                        "UPDATE tasks SET due_date = 'скоро' WHERE id = 5")
+                    task_manager.storage.conn.commit()
+                else:
+                    task = task_manager.get_task_by_id(5)
+                    old, task.due_date = {'due_date': task.due_date}, 'скоро'
+                    task_manager.index.update(task, old)
+                self.assertEqual(ids(task_manager.get_tasks_due("2024-01-16",
+                                                                "2024-02-10")),
+                                 [4, 6, 3])
+                self.assertEqual(ids(task_manager.get_next_due_tasks(10, today="2024-01-01")),
+                                 [2, 6, 3, 1])
+                self.assertEqual(ids(task_manager.get_tasks_by(due_date__gte="2024-02-01")),
+                                 [1, 3, 6])
+                task_manager.close()
+
+    def test_binary(self):
+        self.check_queries(self.task_manager('tasks.bin', lazy=True))
+
+    def test_edit_task_invalid_due_date(self):
+        task_manager = self.task_manager('tasks.json')
+        with self.assertRaises(InvalidDate):
+            task_manager.edit_task(1, due_date="31-12-2023")
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.test_filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.task_manager = TaskManager(filename=self.test_filename,
+                                        journal=True, compact_threshold=10)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def add_task(self, title="Задача журнала"):
+        return self.task_manager.add_task(
+            title=title,
+            description="Эта задача пишется в журнал.",
+            category="Тестирование",
+            due_date="2023-12-31",
+            priority=Priority.MEDIUM.value
+        )
+
+    def test_mutations_are_appended_to_journal(self):
+        snapshot = os.path.getmtime(self.test_filename)
+        task = self.add_task()
+        self.task_manager.edit_task(task.id, title="Новое название",
+                                    priority=Priority.HIGH)
+        self.task_manager.complete_task(task.id)
+        self.assertEqual(self.task_manager.storage.journal.size, 3)
+        self.assertEqual(os.path.getmtime(self.test_filename), snapshot)
+
+    def test_replay_on_load(self):
+        task1 = self.add_task("Первая")
+        task2 = self.add_task("Вторая")
+        self.task_manager.edit_task(task1.id, title="Первая изменённая",
+                                    priority=Priority.HIGH)
+        self.task_manager.delete_task(task2.id)
+
+        new_task_manager = TaskManager(filename=self.test_filename,
+                                       journal=True)
+        self.assertEqual(len(new_task_manager.tasks), 1)
+        loaded_task = new_task_manager.get_task_by_id(task1.id)
+        self.assertEqual(loaded_task.title, "Первая изменённая")
+        self.assertEqual(loaded_task.priority, Priority.HIGH)
+
+    def test_compaction_at_threshold(self):
+        for i in range(10):
+            self.add_task(f"Задача {i}")
+        self.assertEqual(self.task_manager.storage.journal.size, 0)
+        self.assertFalse(os.path.exists(self.test_filename + '.journal'))
+        new_task_manager = TaskManager(filename=self.test_filename)
+        self.assertEqual(len(new_task_manager.tasks), 10)
+
+    def test_torn_journal_record_is_ignored(self):
+        task = self.add_task()
+        with open(self.test_filename + '.journal', 'a', encoding='utf-8') as file:
+            file.write('{"op": "delete", "id": ')
+        new_task_manager = TaskManager(filename=self.test_filename,
+                                       journal=True)
+        self.assertIsNotNone(new_task_manager.get_task_by_id(task.id))
+        new_task_manager.complete_task(task.id)
+        new_task_manager = TaskManager(filename=self.test_filename,
+                                       journal=True)
+        self.assertEqual(new_task_manager.get_task_by_id(task.id).status,
+                         "Выполнена")
+
+    def test_replay_is_idempotent_after_interrupted_compaction(self):
+        task = self.add_task()
+        self.task_manager.edit_task(task.id, title="После сжатия")
+        self.task_manager.storage._write(self.task_manager.tasks)
+        new_task_manager = TaskManager(filename=self.test_filename,
+                                       journal=True)
+        self.assertEqual(len(new_task_manager.tasks), 1)
+        self.assertEqual(new_task_manager.tasks[0].title, "После сжатия")
+
+
+def add_tasks_in_process(filename, count):
+    task_manager = TaskManager(filename=filename, journal=True)
+    for i in range(count):
+        task_manager.add_task(f"Задача {os.getpid()} {i}", "Описание", "Процессы",
+                              "2024-12-31", Priority.LOW.value)
+    task_manager.close()
+
+
+class TestConcurrentAccess(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_two(self, filename, **kwargs):
+        path = os.path.join(self.temp_dir.name, filename)
+        task_manager = TaskManager(filename=path, **kwargs)
+        task_manager.add_task("Общая", "Задача", "Работа", "2024-12-31",
+                              Priority.LOW.value)
+        task_manager.close()
+        first = TaskManager(filename=path, **kwargs)
+        second = TaskManager(filename=path, **kwargs)
+        return path, first, second
+
+    def check_adds_get_distinct_ids(self, filename, **kwargs):
+        path, first, second = self.open_two(filename, **kwargs)
+        first.add_task("Первая", "Из первого процесса", "Работа", "2024-12-31",
+                       Priority.LOW.value)
+        task = second.add_task("Вторая", "Из второго процесса", "Работа",
+                               "2024-12-31", Priority.LOW.value)
+        self.assertEqual(task.id, 3)
+        first.close()
+        second.close()
+        task_manager = TaskManager(filename=path, **kwargs)
+        self.assertEqual([(t.id, t.title) for t in task_manager.get_tasks()],
+                         [(1, "Общая"), (2, "Первая"), (3, "Вторая")])
+        task_manager.close()
+
+    def test_managers_keep_their_own_next_id(self):
+        first = TaskManager(filename=os.path.join(self.temp_dir.name, 'first.json'))
+        second = TaskManager(filename=os.path.join(self.temp_dir.name, 'second.json'))
+        for i in range(3):
+            first.add_task(f"Задача {i}", "", "Работа", "2024-12-31", Priority.LOW.value)
+        task = second.add_task("Задача", "", "Работа", "2024-12-31", Priority.LOW.value)
+        self.assertEqual((first.next_id, second.next_id, task.id), (3, 1, 1))
+
+    def test_adds_get_distinct_ids(self):
+        self.check_adds_get_distinct_ids('tasks.json')
+
+    def test_adds_get_distinct_ids_with_journal(self):
+        self.check_adds_get_distinct_ids('tasks.json', journal=True)
+
+    def test_adds_get_distinct_ids_binary(self):
+        self.check_adds_get_distinct_ids('tasks.bin')
+
+    def test_adds_get_distinct_ids_sqlite(self):
+        self.check_adds_get_distinct_ids('tasks.db')
+
+    def test_edits_of_different_fields_are_merged(self):
+        path, first, second = self.open_two('tasks.json')
+        first.edit_task(1, title="Новое название")
+        second.complete_task(1)
+        task_manager = TaskManager(filename=path)
+        task = task_manager.get_task_by_id(1)
+        self.assertEqual(task.title, "Новое название")
+        self.assertEqual(task.status, "Выполнена")
+        self.assertEqual(second.get_task_by_id(1).title, "Новое название")
+
+    def test_conflicting_edits(self):
+        path, first, second = self.open_two('tasks.json', journal=True)
+        first.edit_task(1, title="Первое название")
+        with self.assertRaises(ConflictError):
+            second.edit_task(1, title="Второе название")
+        self.assertEqual(second.get_task_by_id(1).title, "Первое название")
+
+    def test_edit_of_deleted_task(self):
+        path, first, second = self.open_two('tasks.json')
+        first.delete_task(1)
+        with self.assertRaises(ConflictError):
+            second.complete_task(1)
+        self.assertEqual(second.get_tasks(), [])
+
+    def test_many_processes(self):
+        path = os.path.join(self.temp_dir.name, 'tasks.json')
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=add_tasks_in_process, args=(path, 20))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        task_manager = TaskManager(filename=path, journal=True)
+        ids = [task.id for task in task_manager.get_tasks()]
+        self.assertEqual(sorted(ids), list(range(1, 81)))
+
+
+class TestWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def stored_ids(self):
+        with open(self.filename, encoding='utf-8') as file:
+            return [data['id'] for data in json.load(file)]
+
+    def add(self, task_manager, count):
+        for i in range(count):
+            task_manager.add_task(f"Задача {i}", "Описание", "Работа", "2024-12-31",
+                                  Priority.LOW.value)
+
+    def test_flush_and_close(self):
+        task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                   flush_interval=60)
+        self.add(task_manager, 2)
+        self.assertEqual(self.stored_ids(), [])
+        self.assertEqual(len(task_manager.get_tasks()), 2)
+        task_manager.flush()
+        self.assertEqual(self.stored_ids(), [1, 2])
+        task_manager.delete_task(1)
+        task_manager.close()
+        self.assertEqual(self.stored_ids(), [2])
+
+    def test_background_flush_after_interval(self):
+        task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                   flush_interval=0.01)
+        self.add(task_manager, 3)
+        deadline = time.monotonic() + 5
+        while self.stored_ids() != [1, 2, 3] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.stored_ids(), [1, 2, 3])
+        task_manager.close()
+
+    def test_background_flush_after_threshold(self):
+        task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                   flush_interval=60, flush_threshold=3)
+        self.add(task_manager, 3)
+        deadline = time.monotonic() + 5
+        while self.stored_ids() != [1, 2, 3] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.stored_ids(), [1, 2, 3])
+        task_manager.close()
+
+    def test_batch_rollback(self):
+        task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                   flush_interval=60)
+        with self.assertRaises(InvalidDate):
+            task_manager.add_tasks([
+                dict(title="Верная", description="Описание", category="Работа",
+                     due_date="2024-12-31", priority=Priority.LOW.value),
+                dict(title="Неверная", description="Описание", category="Работа",
+                     due_date="31-12-2024", priority=Priority.LOW.value)])
+        task_manager.close()
+        self.assertEqual(self.stored_ids(), [])
+
+    def test_threads(self):
+        task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                   flush_interval=0.001)
+        threads = [threading.Thread(target=self.add, args=(task_manager, 50))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        task_manager.close()
+        self.assertEqual(sorted(self.stored_ids()), list(range(1, 201)))
+
+    def test_mutations_do_not_wait_for_background_write(self):
+        task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                   flush_interval=0.001)
+        writing = threading.Event()
+        commit = task_manager.storage.commit
+
+        def slow_commit(changes, tasks):
+            writing.set()
+            time.sleep(0.5)
+            return commit(changes, tasks)
+
+        with mock.patch.object(task_manager.storage, 'commit', slow_commit):
+            self.add(task_manager, 1)
+            self.assertTrue(writing.wait(5))
+            started = time.perf_counter()
+            self.add(task_manager, 1)
+            task_manager.complete_task(1)
+            self.assertLess(time.perf_counter() - started, 0.25)
+            # a flush from the foreground waits for the background write
+            task_manager.flush()
+            self.assertEqual(self.stored_ids(), [1, 2])
+        task_manager.close()
+        self.assertEqual(task_manager.get_task_by_id(1).status, "Выполнена")
+
+    def test_io_handler_exit_flushes(self):
+        display = IOHandler(TaskManager(filename=self.filename, write_behind=True,
+                                        flush_interval=60))
+        self.add(display.tm, 1)
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(SystemExit):
+            display.exit()
+        self.assertEqual(self.stored_ids(), [1])
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.path = os.path.join(self.temp_dir.name, 'tasks.sock')
+        self.task_manager = TaskManager(filename=self.filename, write_behind=True,
+                                        flush_interval=60)
+        self.server = TaskServer(self.task_manager, self.path)
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),))
+        self.thread.start()
+        while not os.path.exists(self.path):
+            time.sleep(0.01)
+        self.client = TaskClient.connect(self.path)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.serving = asyncio.current_task()
+        try:
+            await self.server.serve()
+        except asyncio.CancelledError:
+            pass
+
+    def tearDown(self):
+        self.client.close()
+        self.loop.call_soon_threadsafe(self.serving.cancel)
+        self.thread.join()
+        self.task_manager.close()
+        self.temp_dir.cleanup()
+
+    def stored_titles(self):
+        with open(self.filename, encoding='utf-8') as file:
+            return [data['title'] for data in json.load(file)]
+
+    def test_requests(self):
+        task = self.client.add_task("Сервер", "Задача через сокет", "Работа",
+                                    "2024-12-31", Priority.HIGH.value)
+        self.assertIsInstance(task, Task)
+        self.assertEqual(task.id, 1)
+        self.client.edit_task(1, priority=Priority.LOW)
+        self.client.complete_task(1)
+        self.assertEqual(self.client.get_task_by_id(1),
+                         Task(1, "Сервер", "Задача через сокет", "Работа",
+                              "2024-12-31", Priority.LOW, "Выполнена"))
+        self.assertEqual([t.id for t in self.client.find_task(keyword="сокет")], [1])
+        self.assertEqual(self.client.get_tasks_by(category="Отдых"), [])
+        with self.assertRaises(TaskNotFound):
+            self.client.delete_task(2)
+        with self.assertRaises(InvalidPriority):
+            self.client.add_task("Сервер", "Ошибка", "Работа", "2024-12-31", "Любой")
+        with self.assertRaises(ValueError):
+            self.client.close_store()
+
+    def test_writes_are_coalesced(self):
+        for i in range(3):
+            self.client.add_task(f"Задача {i}", "Описание", "Работа", "2024-12-31",
+                                 Priority.LOW.value)
+        self.assertEqual(self.stored_titles(), [])
+        self.assertEqual(len(self.client.get_tasks()), 3)
+        self.client.flush()
+        self.assertEqual(self.stored_titles(), ["Задача 0", "Задача 1", "Задача 2"])
+
+    def test_io_handler_uses_client(self):
+        self.client.add_task("Сервер", "Задача через сокет", "Работа",
+                             "2024-12-31", Priority.HIGH.value)
+        display = IOHandler(self.client)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            display.get_tasks_by(category="Работа")
+        self.assertIn("Задача через сокет", output.getvalue())
+
+    def test_waiting_request_does_not_block_other_clients(self):
+        other = TaskClient.connect(self.path)
+        other._socket.settimeout(5)
+        done = threading.Event()
+        with self.task_manager._lock:
+            thread = threading.Thread(target=lambda: (self.client.get_tasks(), done.set()))
+            thread.start()
+            time.sleep(0.1)
+            # the first request waits for the task manager, the second is answered
+            self.assertIn('counters', other.call('metrics'))
+            self.assertFalse(done.is_set())
+        thread.join()
+        self.assertTrue(done.is_set())
+        other.close()
+
+    def test_request_that_is_not_an_object(self):
+        other = TaskClient.connect(self.path)
+        other._socket.settimeout(5)
+        for line in (b'[]\n', b'"x"\n', b'{\n'):
+            other._file.write(line)
+            other._file.flush()
+            self.assertEqual(json.loads(other._file.readline())['error']['type'],
+                             'ValueError')
+        self.assertEqual(other.get_tasks(), [])
+        other.close()
+
+    def test_connect_without_server(self):
+        self.assertIsNone(TaskClient.connect(self.path + '.missing'))
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+        self.temp_dir.cleanup()
+
+    def use_store(self):
+        task_manager = TaskManager(filename=self.filename)
+        task_manager.add_task("Метрики", "Задача", "Работа", "2024-12-31",
+                              Priority.LOW.value)
+        task_manager.close()
+        task_manager = TaskManager(filename=self.filename, lazy=True)
+        task_manager.find_task(keyword="метрики")
+        task_manager.get_task_by_id(1)
+
+    def test_disabled(self):
+        self.use_store()
+        self.assertEqual(metrics.to_dict(), {'counters': {}, 'operations': {}})
+
+    def test_enabled(self):
+        metrics.enable()
+        self.use_store()
+        data = metrics.to_dict()
+        self.assertEqual(data['operations']['add_task']['count'], 1)
+        self.assertEqual(data['operations']['find_task']['count'], 1)
+        self.assertEqual(data['operations']['add_task']['buckets']['+Inf'], 1)
+        self.assertGreater(data['counters']['bytes_written'],
+                           len("Метрики".encode('utf-8')))
+        self.assertGreater(data['counters']['bytes_read'], 0)
+        self.assertEqual(data['counters']['tasks_hydrated'], 2)
+
+    def test_export(self):
+        metrics.enable()
+        self.use_store()
+        prometheus = os.path.join(self.temp_dir.name, 'metrics.prom')
+        metrics.write(prometheus)
+        with open(prometheus, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertIn('# TYPE taskmanager_operation_seconds histogram', lines)
+        self.assertIn('taskmanager_operation_seconds_count{operation="add_task"} 1',
+                      lines)
+        self.assertIn('taskmanager_operation_seconds_bucket'
+                      '{operation="add_task",le="+Inf"} 1', lines)
+        self.assertIn('taskmanager_tasks_hydrated_total 2', lines)
+        filename = os.path.join(self.temp_dir.name, 'metrics.json')
+        metrics.write(filename)
+        with open(filename, encoding='utf-8') as file:
+            self.assertEqual(json.load(file), metrics.to_dict())
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_generate_tasks(self):
+        tasks = list(generate_tasks(500, seed=1))
+        self.assertEqual(tasks, list(generate_tasks(500, seed=1)))
+        self.assertEqual([task.id for task in tasks], list(range(1, 501)))
+        categories = [task.category for task in tasks]
+        self.assertGreater(categories.count('Работа'), categories.count('Машина'))
+        for task in tasks:
+            TaskManager.validate_data(task.priority.value, task.due_date)
+
+    def test_write_task_file(self):
+        for extension in ('json', 'jsonl', 'db', 'bin'):
+            filename = os.path.join(self.temp_dir.name, f'tasks.{extension}')
+            write_task_file(filename, 100)
+            task_manager = TaskManager(filename=filename)
+            self.assertEqual(task_manager.get_tasks(), list(generate_tasks(100)))
+            task_manager.close()
+
+    def test_run_scenarios(self):
+        filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        write_task_file(filename, 200)
+        results = run_scenarios(filename, 200, repeat=1)
+        self.assertEqual(set(results),
+                         {'load', 'save', 'lookup', 'search', 'filter', 'mutate'})
+        task_manager = TaskManager(filename=filename)
+        self.assertEqual(len(task_manager.get_tasks()), 200)
+
+    def test_run_codecs(self):
+        results = run_codecs(100, ['json', 'jsonl'], ['none', '.gz'], 1, self.temp_dir.name)
+        self.assertEqual(set(results), {'json:indent', 'json.gz:indent', 'json:compact',
+                                        'json.gz:compact', 'jsonl:compact',
+                                        'jsonl.gz:compact'})
+        self.assertEqual(results['json:indent']['ratio'], 1.0)
+        self.assertLess(results['json.gz:indent']['bytes'], results['json:compact']['bytes'])
+        self.assertLess(results['json:compact']['bytes'], results['json:indent']['bytes'])
+
+    def test_run_codec(self):
+        results = run_codec(200, 1)
+        self.assertEqual({name.split(':')[0] for name in results},
+                         {'decode', 'decode_row', 'encode', 'encode_indented', 'validate'})
+        self.assertEqual({name.split(':')[1] for name in results}, {'codec', 'generic'})
+        self.assertGreater(results['encode:codec']['tasks_per_second'], 0)
+
+    def test_compare(self):
+        baseline = {'results': {'json:1000': {'load': {'best': 0.1},
+                                              'save': {'best': 0.1}}}}
+        report = {'results': {'json:1000': {'load': {'best': 0.2},
+                                            'save': {'best': 0.11},
+                                            'lookup': {'best': 0.5}}}}
+        regressions = compare(report, baseline, threshold=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('json:1000 load'))
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tasks = list(generate_tasks(300))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_store(self, extension, lazy=False):
+        filename = os.path.join(self.temp_dir.name, f'tasks.{extension}')
+        if not os.path.exists(filename):
+            write_task_file(filename, len(self.tasks))
+        return TaskManager(filename=filename, lazy=lazy)
+
+    def expected(self, predicate, key=lambda task: task.id, limit=None, offset=0):
+        tasks = sorted(filter(predicate, self.tasks), key=key)[offset:]
+        return [task.id for task in tasks[:limit]]
+
+    def test_get_tasks_by_any_field(self):
+        task_manager = self.open_store('json')
+        high = task_manager.get_tasks_by(priority='Высокий', status='Не выполнена')
+        self.assertEqual([task.id for task in high], self.expected(
+            lambda t: t.priority == Priority.HIGH and t.status == 'Не выполнена'))
+        ranged = task_manager.get_tasks_by(due_date__gte='2024-03-01',
+                                           due_date__lte='2024-03-31',
+                                           priority__in=['Высокий', 'Низкий'])
+        self.assertEqual([task.id for task in ranged], self.expected(
+            lambda t: '2024-03-01' <= t.due_date <= '2024-03-31'
+            and t.priority in (Priority.HIGH, Priority.LOW)))
+        self.assertEqual(task_manager.get_tasks_by(), self.tasks)
+        with self.assertRaises(ValueError):
+            task_manager.get_tasks_by(colour='red')
+        with self.assertRaises(InvalidPriority):
+            task_manager.get_tasks_by(priority='Срочный')
+        with self.assertRaises(InvalidDate):
+            task_manager.get_tasks_by(due_date__gte='2024-02-30')
+        task_manager.close()
+
+    def test_predicates_combine(self):
+        predicate = (Eq('category', 'Работа') & Range('due_date', end='2024-06-30')) | \
+            In('priority', ['Высокий'])
+        self.assertEqual(
+            [t.id for t in self.tasks if predicate.matches(t)],
+            self.expected(lambda t: (t.category == 'Работа' and t.due_date <= '2024-06-30')
+                          or t.priority == Priority.HIGH))
+        self.assertTrue(Contains('ОТЧЁТ').matches(Task(1, 'Отчёт', '', '', '', Priority.LOW)))
+
+    def test_planner_scans_most_selective_index(self):
+        task_manager = self.open_store('json')
+        index = task_manager.index
+        rare = Eq('category', 'Проект 150')
+        common = Eq('status', 'Не выполнена')
+        predicate = where(category='Проект 150', status='Не выполнена')
+        self.assertLess(rare.estimate(index), common.estimate(index))
+        self.assertEqual(predicate.estimate(index), rare.estimate(index))
+        self.assertEqual(sorted(t.id for t in predicate.candidates(index)),
+                         sorted(t.id for t in rare.candidates(index)))
+        self.assertIsNone((Eq('title', 'x') | rare).estimate(index))
+        task_manager.close()
+
+    def test_tasks_are_ordered_by_id_by_default(self):
+        tasks = self.tasks[::-1]
+        self.assertEqual(Query().arrange(tasks), self.tasks)
+        self.assertEqual(Query(limit=3, offset=1).arrange(tasks), self.tasks[1:4])
+        self.assertTrue(Contains('ОТЧЁТ').matches({'title': 'Отчёт', 'description': ''}))
+
+    def test_wide_id_range_scans_the_index(self):
+        task_manager = self.open_store('json')
+        self.assertEqual(Range('id', 1, 10 ** 8).estimate(task_manager.index),
+                         len(self.tasks))
+        tasks = task_manager.get_tasks_by(id__gte=290, id__lte=10 ** 12)
+        self.assertEqual([task.id for task in tasks], list(range(290, 301)))
+        self.assertEqual(task_manager.get_tasks_by(id__gte=1, id__lte=10 ** 8), self.tasks)
+        task_manager.close()
+
+    def test_order_by_and_limit(self):
+        key = lambda t: (-list(Priority).index(t.priority), t.due_date, t.id)
+        for extension, lazy in (('json', False), ('json', True), ('jsonl', True),
+                                ('db', False), ('bin', True)):
+            with self.subTest(extension=extension, lazy=lazy):
+                task_manager = self.open_store(extension, lazy)
+                tasks = task_manager.get_tasks_by(category='Работа',
+                                                  order_by='-priority,due_date',
+                                                  limit=7, offset=3)
+                self.assertEqual([task.id for task in tasks], self.expected(
+                    lambda t: t.category == 'Работа', key, limit=7, offset=3))
+                tasks = task_manager.find_task(keyword='отчёт', order_by=['-id'],
+                                               limit=5)
+                self.assertEqual([task.id for task in tasks], self.expected(
+                    lambda t: 'отчёт' in (t.title + ' ' + t.description).lower(),
+                    lambda t: -t.id, limit=5))
+                tasks = task_manager.query(where(due_date__lte='2024-01-31'),
+                                           order_by='due_date')
+                self.assertEqual([task.id for task in tasks], self.expected(
+                    lambda t: t.due_date <= '2024-01-31', lambda t: (t.due_date, t.id)))
+                with self.assertRaises(ValueError):
+                    task_manager.find_task(order_by='colour')
+                task_manager.close()
+
+    def test_to_sql(self):
+        query = Query.build(where(category='Работа', priority__in=['Высокий']),
+                            '-due_date', limit=10)
+        sql, params = query.to_sql()
+        self.assertEqual(sql, 'WHERE (category = ?) AND (priority IN (?)) '
+                              'ORDER BY py_ordinal(due_date) DESC, id LIMIT ? OFFSET ?')
+        self.assertEqual(params, ['Работа', 'Высокий', 10, 0])
+
+    def test_iohandler_search_with_options(self):
+        task_manager = self.open_store('json')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            IOHandler(task_manager).find_task(keyword='отчёт', category=None,
+                                              status=None, order_by='-id',
+                                              limit=1, offset=0)
+        last = self.expected(lambda t: 'отчёт' in (t.title + ' ' + t.description).lower())[-1]
+        self.assertIn(f'{last} | ', output.getvalue())
+        self.assertEqual(output.getvalue().count(' | '), 1)
+        task_manager.close()
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def write(self, name, text):
+        with open(self.path(name), 'w', encoding='utf-8') as file:
+            file.write(text)
+        return self.path(name)
+
+    def test_import_csv_with_error_report(self):
+        source = self.write('in.csv',
+                            'id,title,description,category,due_date,priority,status\n'
+                            '7,Первая,"Описание, с запятой",Работа,2024-05-01,Высокий,\n'
+                            '8,Вторая,Описание,Дом,2024-02-30,Низкий,\n'
+                            '9,Третья,Описание,Дом,2024-05-02,Срочный,\n'
+                            '10,Четвёртая,Описание,Дом,2024-05-03,Низкий,Выполнена\n')
+        task_manager = TaskManager(filename=self.filename)
+        task_manager.add_task("Старая", "Задача", "Работа", "2024-01-01", "Средний")
+        imported, failed = task_manager.import_file(source, self.path('errors.jsonl'))
+        self.assertEqual((imported, failed), (2, 2))
+        self.assertEqual([(t.id, t.title, t.status) for t in task_manager.get_tasks()],
+                         [(1, "Старая", "Не выполнена"), (2, "Первая", "Не выполнена"),
+                          (3, "Четвёртая", "Выполнена")])
+        self.assertEqual(task_manager.get_task_by_id(2).description, "Описание, с запятой")
+        with open(self.path('errors.jsonl'), encoding='utf-8') as file:
+            errors = [json.loads(line) for line in file]
+        self.assertEqual([error['line'] for error in errors], [3, 4])
+        self.assertIn('2024-02-30', errors[0]['error'])
+        self.assertIn('Срочный', errors[1]['error'])
+        task_manager.close()
+        self.assertEqual(len(TaskManager(filename=self.filename).get_tasks()), 3)
+
+    def test_import_jsonl_in_one_write(self):
+        source = self.path('in.jsonl')
+        write_task_file(source, 50)
+        with open(source, 'a', encoding='utf-8') as file:
+            file.write('{"title": "Без описания"}\nне JSON\n')
+        task_manager = TaskManager(filename=self.filename, journal=True)
+        self.assertEqual(task_manager.import_file(source), (50, 2))
+        with open(self.filename + '.journal', encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), 1)
+        self.assertEqual([(t.title, t.priority) for t in task_manager.get_tasks()],
+                         [(t.title, t.priority) for t in generate_tasks(50)])
+
+    def test_validation_pool_keeps_order(self):
+        source = self.path('in.jsonl')
+        write_task_file(source, 100)
+        rows = [(i, f'{{"title": "{i}"}}') for i in range(5)]
+        with open(source, 'a', encoding='utf-8') as file:
+            file.write('\n'.join(row for _, row in rows) + '\n')
+        records, failed = read_records(source, io.StringIO(), workers=2, chunk_size=7)
+        self.assertEqual(failed, 5)
+        self.assertEqual([record['title'] for record in records],
+                         [task.title for task in generate_tasks(100)])
+        results = list(validate_rows(rows, workers=2, chunk_size=2))
+        self.assertEqual([len(errors) for _, errors in results], [2, 2, 1])
+
+    def test_broken_pool_falls_back_to_validating_in_place(self):
+        class BrokenPool(ThreadPoolExecutor):
+            # the pool breaks after two chunks, as when its workers die
+            def submit(self, function, *args):
+                self.submitted = getattr(self, 'submitted', 0) + 1
+                if self.submitted > 2:
+                    raise BrokenProcessPool
+                return super().submit(function, *args)
+
+        rows = [(i, f'{{"title": "{i}"}}') for i in range(9)]
+        with mock.patch('bulk.ProcessPoolExecutor', BrokenPool):
+            results = list(validate_rows(rows, workers=2, chunk_size=2))
+        self.assertEqual([[error.line for error in errors] for _, errors in results],
+                         [[0, 1], [2, 3], [4, 5], [6, 7], [8]])
+
+    def test_export_streams_from_store(self):
+        write_task_file(self.filename, 30)
+        expected = [task.to_dict() for task in generate_tasks(30)]
+        for name in ('out.jsonl', 'out.json', 'out.csv'):
+            with self.subTest(name=name):
+                task_manager = TaskManager(filename=self.filename, lazy=True)
+                self.assertEqual(task_manager.export_file(self.path(name)), 30)
+                self.assertFalse(task_manager.loaded)
+                copy = TaskManager(filename=self.path(f'copy-{name}.json'))
+                if name == 'out.json':
+                    with open(self.path(name), encoding='utf-8') as file:
+                        self.assertEqual(json.load(file), expected)
+                    continue
+                self.assertEqual(copy.import_file(self.path(name)), (30, 0))
+                self.assertEqual([task.to_dict() for task in copy.get_tasks()], expected)
+        database = self.path('tasks.db')
+        write_task_file(database, 30)
+        task_manager = TaskManager(filename=database)
+        self.assertEqual(task_manager.export_file(self.path('db.jsonl')), 30)
+        with open(self.path('db.jsonl'), encoding='utf-8') as file:
+            self.assertEqual([json.loads(line) for line in file], expected)
+        task_manager.close()
+
+
+class TestShardedStorage(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.shards')
+        write_task_file(self.filename, 300)
+        self.tasks = list(generate_tasks(300))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_store(self):
+        return TaskManager(filename=self.filename)
+
+    def manifest(self):
+        with open(os.path.join(self.filename, 'manifest.json'), encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_one_shard_per_category(self):
+        task_manager = self.open_store()
+        self.assertIsInstance(task_manager.storage, ShardedStorage)
+        manifest = self.manifest()
+        categories = {task.category for task in self.tasks}
+        self.assertEqual(set(manifest['shards']), categories)
+        self.assertEqual(manifest['next_id'], 300)
+        self.assertEqual(manifest['shards']['Работа']['count'],
+                         sum(task.category == 'Работа' for task in self.tasks))
+        self.assertEqual(len(os.listdir(self.filename)), len(categories) + 2)
+        self.assertEqual(task_manager.get_tasks(), self.tasks)
+        self.assertEqual(task_manager.next_id, 300)
+
+    def test_reads_only_needed_shards(self):
+        task_manager = self.open_store()
+        work = task_manager.get_tasks_by(category='Работа', order_by='-due_date')
+        self.assertEqual({task.id for task in work},
+                         {task.id for task in self.tasks if task.category == 'Работа'})
+        self.assertEqual(len(task_manager.storage._shards), 1)
+        task = self.tasks[150]
+        self.assertEqual(task_manager.get_task_by_id(task.id), task)
+        self.assertLessEqual(len(task_manager.storage._shards), 2)
+        self.assertIsNone(task_manager.get_task_by_id(301))
+
+    def test_mutation_rewrites_only_its_shard(self):
+        task_manager = self.open_store()
+        task = next(task for task in self.tasks if task.category == 'Дом')
+        before = self.manifest()['shards']
+        task_manager.complete_task(task.id)
+        after = self.manifest()['shards']
+        changed = {category for category in after
+                   if after[category]['file'] != before[category]['file']}
+        self.assertEqual(changed, {'Дом'})
+        self.assertFalse(os.path.exists(os.path.join(self.filename, before['Дом']['file'])))
+        self.assertEqual(self.open_store().get_task_by_id(task.id).status, 'Выполнена')
+
+    def test_move_between_shards(self):
+        task_manager = self.open_store()
+        task = next(task for task in self.tasks if task.category == 'Дом')
+        counts = {category: shard['count']
+                  for category, shard in self.manifest()['shards'].items()}
+        task_manager.edit_task(task.id, category='Работа', title='Перенесённая')
+        manifest = self.manifest()
+        self.assertEqual(manifest['shards']['Дом']['count'], counts['Дом'] - 1)
+        self.assertEqual(manifest['shards']['Работа']['count'], counts['Работа'] + 1)
+        other = self.open_store()
+        self.assertNotIn(task.id, [t.id for t in other.get_tasks_by(category='Дом')])
+        moved = other.get_task_by_id(task.id)
+        self.assertEqual((moved.category, moved.title), ('Работа', 'Перенесённая'))
+        self.assertEqual(len(other.get_tasks()), 300)
+
+        # a new category gets its own shard, which goes away with its last task
+        added = task_manager.add_task("Новая", "Задача", "Отпуск", "2024-07-01", "Низкий")
+        self.assertEqual(added.id, 301)
+        self.assertEqual(self.manifest()['shards']['Отпуск']['count'], 1)
+        task_manager.delete_task(301)
+        self.assertNotIn('Отпуск', self.manifest()['shards'])
+        self.assertEqual(self.manifest()['next_id'], 301)
+
+    def test_batch_is_one_manifest_switch(self):
+        task_manager = self.open_store()
+        generation = self.manifest()['generation']
+        with task_manager.batch():
+            task_manager.edit_task(1, category='Спорт')
+            task_manager.edit_task(2, category='Хобби')
+            task_manager.delete_task(3)
+        self.assertEqual(self.manifest()['generation'], generation + 1)
+        other = self.open_store()
+        self.assertEqual(other.get_task_by_id(1).category, 'Спорт')
+        self.assertEqual(other.get_task_by_id(2).category, 'Хобби')
+        self.assertIsNone(other.get_task_by_id(3))
+
+    def test_stale_id_map_is_rebuilt(self):
+        task_manager = self.open_store()
+        with open(os.path.join(self.filename, 'ids'), 'wb') as file:
+            file.write(b'\xff' * 16)
+        self.assertEqual(task_manager.get_task_by_id(42), self.tasks[41])
+
+    def test_concurrent_writers_are_merged(self):
+        first = self.open_store()
+        second = self.open_store()
+        first.edit_task(5, title='Первый')
+        second.edit_task(5, description='Второй')
+        a = first.add_task("A", "", "Работа", "2024-01-01", "Низкий")
+        b = second.add_task("B", "", "Работа", "2024-01-01", "Низкий")
+        self.assertEqual((a.id, b.id), (301, 302))
+        task = self.open_store().get_task_by_id(5)
+        self.assertEqual((task.title, task.description), ('Первый', 'Второй'))
+
+
+class TestStats(unittest.TestCase):
+    TODAY = '2024-06-01'
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        write_task_file(self.filename, 300)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_store(self, filename=None, **kwargs):
+        return TaskManager(filename=filename or self.filename, **kwargs)
+
+    def expected(self, tasks):
+        today = to_ordinal(self.TODAY)
+        categories = {}
+        for task in tasks:
+            row = categories.setdefault(task.category, {'total': 0, 'done': 0,
+                                                        'overdue': 0})
+            row['total'] += 1
+            if task.status == "Выполнена":
+                row['done'] += 1
+            elif to_ordinal(task.due_date) < today:
+                row['overdue'] += 1
+        for row in categories.values():
+            row['completion'] = row['done'] / row['total']
+        return {
+            'total': len(tasks),
+            'done': sum(row['done'] for row in categories.values()),
+            'overdue': sum(row['overdue'] for row in categories.values()),
+            'categories': categories,
+        }
+
+    def assertStats(self, task_manager, tasks):
+        stats = task_manager.stats(self.TODAY)
+        expected = self.expected(tasks)
+        self.assertEqual({key: stats[key] for key in expected if key != 'categories'},
+                         {key: expected[key] for key in expected if key != 'categories'})
+        self.assertEqual(stats['categories'], expected['categories'])
+        self.assertEqual(sum(stats['by_status'].values()), len(tasks))
+        self.assertEqual(stats['by_priority'].get('Высокий', 0),
+                         sum(task.priority.value == 'Высокий' for task in tasks))
+
+    def test_counts_follow_mutations(self):
+        task_manager = self.open_store()
+        self.assertStats(task_manager, task_manager.get_tasks())
+        task_manager.add_task("Новая", "", "Новая категория", "2024-01-01", "Высокий")
+        task_manager.edit_task(1, category='Работа', due_date='2020-01-01')
+        task_manager.complete_task(2)
+        task_manager.delete_task(3)
+        self.assertStats(task_manager, task_manager.get_tasks())
+        stats = task_manager.stats(self.TODAY)
+        self.assertEqual(stats['categories']['Новая категория'],
+                         {'total': 1, 'done': 0, 'completion': 0.0, 'overdue': 1})
+
+    def test_rolled_back_batch_is_not_counted(self):
+        task_manager = self.open_store()
+        before = task_manager.stats(self.TODAY)
+        with self.assertRaises(TaskNotFound):
+            with task_manager.batch():
+                task_manager.add_task("A", "", "Работа", "2024-01-01", "Низкий")
+                task_manager.edit_task(1, category='Спорт')
+                task_manager.edit_task(1, category='Хобби')
+                task_manager.complete_task(4)
+                task_manager.delete_task(5)
+                task_manager.delete_task(1000)
+        self.assertEqual(task_manager.stats(self.TODAY), before)
+
+    def test_persisted_counts_are_read_without_loading(self):
+        self.open_store().complete_task(7)
+        self.assertTrue(os.path.exists(self.filename + '.stats'))
+        task_manager = self.open_store(lazy=True)
+        with mock.patch.object(task_manager.storage, 'load', side_effect=AssertionError):
+            stats = task_manager.stats(self.TODAY)
+        self.assertFalse(task_manager.loaded)
+        self.assertStats(self.open_store(), self.open_store().get_tasks())
+        self.assertEqual(stats, self.open_store().stats(self.TODAY))
+
+    def test_stale_counts_are_recomputed(self):
+        self.open_store().complete_task(7)
+        tasks = [task.to_dict() for task in self.open_store().get_tasks()[10:]]
+        with open(self.filename, 'w', encoding='utf-8') as file:
+            json.dump(tasks, file)
+        task_manager = self.open_store(lazy=True)
+        self.assertStats(task_manager, task_manager.get_tasks())
+
+    def test_other_backends(self):
+        for extension in ('db', 'shards', 'jsonl'):
+            with self.subTest(extension=extension):
+                filename = os.path.join(self.temp_dir.name, f'tasks.{extension}')
+                write_task_file(filename, 300)
+                task_manager = self.open_store(filename)
+                task_manager.edit_task(8, category='Спорт')
+                task_manager.complete_task(9)
+                task_manager.delete_task(10)
+                other = self.open_store(filename)
+                self.assertStats(other, other.get_tasks())
+                task_manager.add_task("A", "", "Работа", "2020-01-01", "Низкий")
+                self.assertStats(other, other.get_tasks())
+
+    def test_concurrent_processes_are_all_counted(self):
+        context = multiprocessing.get_context('fork')
+        for extension in ('db', 'shards', 'json'):
+            with self.subTest(extension=extension):
+                filename = os.path.join(self.temp_dir.name, f'many.{extension}')
+                write_task_file(filename, 300)
+                self.open_store(filename).stats(self.TODAY)
+                processes = [context.Process(target=add_tasks_in_process,
+                                             args=(filename, 50)) for _ in range(4)]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+                # the processes append to the journal of JSON stores
+                task_manager = self.open_store(filename, journal=True)
+                self.assertEqual(len(task_manager.get_tasks()), 500)
+                self.assertStats(task_manager, task_manager.get_tasks())
+
+    def test_sqlite_counts_without_counter_file(self):
+        filename = os.path.join(self.temp_dir.name, 'tasks.db')
+        write_task_file(filename, 300)
+        task_manager = self.open_store(filename)
+        task_manager.complete_task(7)
+        with mock.patch.object(task_manager.storage, 'load', side_effect=AssertionError):
+            stats = task_manager.stats(self.TODAY)
+        self.assertFalse(os.path.exists(filename + '.stats'))
+        self.assertEqual(stats['done'], sum(task.status == "Выполнена"
+                                            for task in task_manager.get_tasks()))
+
+    def test_missing_counts_do_not_load_the_store_on_mutation(self):
+        filename = os.path.join(self.temp_dir.name, 'tasks.shards')
+        write_task_file(filename, 300)
+        task_manager = self.open_store(filename)
+        with mock.patch.object(task_manager.storage, 'load', side_effect=AssertionError):
+            task_manager.complete_task(7)
+        self.assertStats(task_manager, task_manager.get_tasks())
+
+
+class TestFuzzySearch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.task_manager = TaskManager(filename=self.filename)
+        self.task_manager.add_task("Подготовить отчёт", "Квартальный отчёт для бухгалтерии",
+                                   "Работа", "2024-01-01", "Высокий")
+        self.task_manager.add_task("Встреча с клиентом", "Обсудить договор",
+                                   "Работа", "2024-01-02", "Средний")
+        self.task_manager.add_task("Купить молоко", "Зайти в магазин",
+                                   "Личное", "2024-01-03", "Низкий")
+        self.task_manager.add_task("Встреча выпускников", "Кафе в центре",
+                                   "Личное", "2024-01-04", "Низкий")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_distance(self):
+        self.assertEqual(distance('отчёт', 'подготовить отчёт'), 0)
+        self.assertEqual(distance('отчет', 'подготовить отчёт'), 1)
+        self.assertEqual(distance('всреча', 'встреча с клиентом'), 1)
+        self.assertEqual(distance('договр', 'обсудить договор'), 1)
+        self.assertEqual(distance('молоко', ''), 6)
+
+    def test_misspelled_keyword_is_ranked(self):
+        results = self.task_manager.fuzzy_search('всречя', min_score=0.6)
+        self.assertEqual([task.id for task, _ in results], [2, 4])
+        self.assertEqual([score for _, score in results], [1 - 2 / 6] * 2)
+        self.assertEqual(self.task_manager.fuzzy_search('всречя'), [])
+        results = self.task_manager.fuzzy_search('квартальный отчет')
+        self.assertEqual([task.id for task, _ in results], [1])
+        self.assertAlmostEqual(results[0][1], 1 - 1 / 17)
+        self.assertEqual(self.task_manager.fuzzy_search('Встреча')[0][1], 1.0)
+
+    def test_top_k_and_filters(self):
+        self.assertEqual([task.id for task, _ in
+                          self.task_manager.fuzzy_search('встеча', limit=1)], [2])
+        self.assertEqual([task.id for task, _ in
+                          self.task_manager.fuzzy_search('встеча', category='Личное')],
+                         [4])
+        self.assertEqual(self.task_manager.find_task('встеча', fuzzy=True, limit=1,
+                                                     offset=1),
+                         [self.task_manager.get_task_by_id(4)])
+        self.assertEqual(self.task_manager.find_task('встеча'), [])
+
+    def test_index_follows_mutations(self):
+        self.task_manager.fuzzy_search('молоко')
+        self.assertIsNotNone(self.task_manager.text_index)
+        self.task_manager.edit_task(3, title='Купить хлеб')
+        self.task_manager.add_task("Молоко и сыр", "", "Личное", "2024-01-05", "Низкий")
+        self.assertEqual([task.id for task, _ in
+                          self.task_manager.fuzzy_search('малоко')], [5])
+
+    def test_scan_matches_index(self):
+        expected = [(task.id, score) for task, score
+                    in self.task_manager.fuzzy_search('встеча', limit=None)]
+        for extension in ('db', 'shards'):
+            with self.subTest(extension=extension):
+                other = TaskManager(os.path.join(self.temp_dir.name, f'tasks.{extension}'))
+                for task in self.task_manager.get_tasks():
+                    other.add_task(task.title, task.description, task.category,
+                                   task.due_date, task.priority.value)
+                self.assertEqual([(task.id, score) for task, score
+                                  in other.fuzzy_search('встеча', limit=None)], expected)
+
+    def test_short_keyword_sharing_no_trigram(self):
+        self.task_manager.edit_task(3, title='Купить хлеб')
+        self.assertEqual([(task.id, score) for task, score
+                          in self.task_manager.fuzzy_search('хлбе')], [(3, 0.75)])
+        other = TaskManager(os.path.join(self.temp_dir.name, 'tasks.db'))
+        other.add_task("Купить хлеб", "", "Личное", "2024-01-03", "Низкий")
+        self.assertEqual([(task.id, score) for task, score
+                          in other.fuzzy_search('хлбе')], [(1, 0.75)])
+
+    def test_equal_scores_prefer_lower_ids(self):
+        # shares more trigrams with the keyword than tasks 2 and 4, at the same distance
+        self.task_manager.add_task("Встечи", "", "Личное", "2024-01-05", "Низкий")
+        self.assertEqual([task.id for task, _ in
+                          self.task_manager.fuzzy_search('встеча', limit=1)], [2])
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.local = os.path.join(self.temp_dir.name, 'a', 'tasks.json')
+        self.remote = os.path.join(self.temp_dir.name, 'b', 'tasks.json')
+        os.makedirs(os.path.dirname(self.local))
+        os.makedirs(os.path.dirname(self.remote))
+        write_task_file(self.local, 1000)
+        write_task_file(self.remote, 1000)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open_store(self, filename):
+        return TaskManager(filename=filename)
+
+    def sync(self, local=None, remote=None):
+        return sync_stores(self.open_store(local or self.local),
+                           self.open_store(remote or self.remote), self.temp_dir.name)
+
+    def assertSynced(self, local=None, remote=None):
+        tasks = sorted(self.open_store(local or self.local).get_tasks(),
+                       key=lambda task: task.id)
+        self.assertEqual(tasks, sorted(self.open_store(remote or self.remote).get_tasks(),
+                                       key=lambda task: task.id))
+        self.assertEqual(self.sync(local, remote), (0, 0))
+        return tasks
+
+    def test_tree_diff(self):
+        tasks = list(generate_tasks(1000))
+        ours = SyncState.build(tasks)
+        self.assertEqual(ours.diff(SyncState.build(tasks)), [])
+        before = tasks[600]
+        tasks[600] = Task.from_dict({**before.to_dict(), 'title': 'Изменено'})
+        theirs = SyncState.build(tasks)
+        self.assertEqual(ours.diff(theirs), [601 // BUCKET_SIZE])
+        ours.record(601, before, tasks[600])
+        self.assertEqual(ours.diff(theirs), [])
+        self.assertEqual(ours.stamps[601][0], 1)
+
+    def test_changes_on_both_stores(self):
+        self.assertEqual(self.sync(), (0, 0))
+        local = self.open_store(self.local)
+        local.edit_task(5, title='Локально')
+        local.delete_task(7)
+        local.add_task("Новая A", "", "Работа", "2024-01-01", "Низкий")
+        remote = self.open_store(self.remote)
+        remote.edit_task(6, title='Удалённо')
+        remote.complete_task(900)
+        self.assertEqual(self.sync(), (3, 2))
+        tasks = {task.id: task for task in self.assertSynced()}
+        self.assertEqual(len(tasks), 1000)
+        self.assertEqual((tasks[5].title, tasks[6].title, tasks[900].status,
+                          tasks[1001].title), ('Локально', 'Удалённо', 'Выполнена', 'Новая A'))
+        self.assertNotIn(7, tasks)
+        with open(os.path.join(self.temp_dir.name, 'outgoing.delta.jsonl'),
+                  encoding='utf-8') as file:
+            self.assertEqual(sorted(json.loads(line)['id'] for line in file), [5, 7, 1001])
+
+    def test_latest_change_wins(self):
+        self.sync()
+        self.open_store(self.local).edit_task(5, title='Раньше')
+        self.open_store(self.remote).edit_task(5, title='Позже')
+        self.open_store(self.remote).delete_task(6)
+        self.open_store(self.local).edit_task(6, title='После удаления')
+        self.sync()
+        tasks = {task.id: task for task in self.assertSynced()}
+        self.assertEqual((tasks[5].title, tasks[6].title), ('Позже', 'После удаления'))
+
+    def test_tasks_added_under_the_same_id_are_kept(self):
+        self.sync()
+        self.open_store(self.local).add_task("A", "", "Работа", "2024-01-01", "Низкий")
+        self.open_store(self.remote).add_task("B", "", "Работа", "2024-01-01", "Низкий")
+        self.sync()
+        tasks = self.assertSynced()
+        self.assertEqual(sorted(task.title for task in tasks[-2:]), ['A', 'B'])
+        self.assertEqual([task.id for task in tasks[-2:]], [1001, 1002])
+
+    def test_changes_by_other_programs_are_detected(self):
+        self.sync()
+        tasks = [task.to_dict() for task in self.open_store(self.remote).get_tasks()]
+        tasks[9]['title'] = 'Вручную'
+        del tasks[10]
+        with open(self.remote, 'w', encoding='utf-8') as file:
+            json.dump(tasks, file)
+        state = self.open_store(self.remote).sync_state()
+        self.assertEqual(state.stamps[10][0], 1)
+        self.assertEqual(state.stamps[11][2], 0)
+        self.sync()
+        tasks = {task.id: task for task in self.assertSynced()}
+        self.assertEqual(tasks[10].title, 'Вручную')
+        self.assertNotIn(11, tasks)
+
+    def test_other_backends(self):
+        for extension in ('db', 'shards'):
+            with self.subTest(extension=extension):
+                local = os.path.join(self.temp_dir.name, f'{extension}.json')
+                remote = os.path.join(self.temp_dir.name, f'tasks.{extension}')
+                write_task_file(local, 1000)
+                write_task_file(remote, 1000)
+                self.sync(local, remote)
+                self.open_store(remote).edit_task(3, category='Спорт')
+                self.open_store(remote).add_task("C", "", "Хобби", "2024-01-01", "Низкий")
+                self.open_store(local).delete_task(4)
+                self.sync(local, remote)
+                tasks = {task.id: task for task in self.assertSynced(local, remote)}
+                self.assertEqual(tasks[3].category, 'Спорт')
+                self.assertNotIn(4, tasks)
+
+
+class TestOutput(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        write_task_file(self.filename, 45)
+        self.task_manager = TaskManager(filename=self.filename)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, tasks, fmt):
+        stream = io.StringIO()
+        count = write_tasks(tasks, stream, fmt)
+        return count, stream.getvalue()
+
+    def test_json_formats(self):
+        tasks = self.task_manager.get_tasks()
+        expected = [task.to_dict() for task in tasks]
+        count, text = self.write(tasks, 'json')
+        self.assertEqual(count, 45)
+        self.assertEqual(json.loads(text), expected)
+        self.assertEqual(self.write([], 'json'), (0, '[]\n'))
+        _, text = self.write(self.task_manager.records(), 'ndjson')
+        self.assertEqual([json.loads(line) for line in text.splitlines()], expected)
+
+    def test_tsv_escapes_values(self):
+        task = Task(1, "Табуляция\tи\\", "Две\nстроки\r", "Работа",
+                    "2024-01-01", Priority.HIGH)
+        _, text = self.write([task], 'tsv')
+        header, row = text.splitlines()
+        self.assertEqual(header.split('\t'), list(FIELDS))
+        values = dict(zip(FIELDS, row.split('\t')))
+        self.assertEqual(values['title'], 'Табуляция\\tи\\\\')
+        self.assertEqual(values['description'], 'Две\\nстроки\\r')
+        self.assertEqual(values['priority'], 'Высокий')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.write([], 'xml')
+
+    def test_records_are_streamed(self):
+        manager = TaskManager(filename=self.filename, lazy=True)
+        records = manager.records(limit=10, offset=40)
+        self.assertNotIsInstance(records, list)
+        self.assertEqual([record['id'] for record in records], [41, 42, 43, 44, 45])
+        self.assertEqual([record['id'] for record in
+                          manager.records(category__in=['Работа', 'Личное'], limit=3)],
+                         [task.id for task in self.task_manager.get_tasks_by(
+                             category__in=['Работа', 'Личное'], limit=3)])
+
+    def test_pages(self):
+        handler = IOHandler(self.task_manager)
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            handler.show(page=2)
+        self.assertIn('Страница 2: задачи 21–40.', stream.getvalue())
+        self.assertIn('--page 3', stream.getvalue())
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            handler.show(fmt='ndjson', page=3)
+        self.assertEqual([json.loads(line)['id'] for line in stream.getvalue().splitlines()],
+                         list(range(41, 46)))
+
+
+class TestBatchCommand(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'tasks.json')
+        self.task_manager = TaskManager(filename=self.filename)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_lines(self, operations, checkpoint=CHECKPOINT_OPS):
+        lines = [json.dumps(operation, ensure_ascii=False) if isinstance(operation, dict)
+                 else operation for operation in operations]
+        output = io.StringIO()
+        counts = run_batch(self.task_manager, lines, output, checkpoint)
+        return counts, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def add(self, title, **fields):
+        return dict({'op': 'add', 'title': title, 'description': '', 'category': 'Работа',
+                     'due_date': '2024-01-01', 'priority': 'Средний'}, **fields)
+
+    def test_results_and_errors(self):
+        counts, results = self.run_lines([
+            self.add('Отчёт'),
+            self.add('Ошибка', due_date='2024-13-01'),
+            '',
+            {'op': 'complete', 'id': 1},
+            {'op': 'edit', 'id': 1, 'priority': 'Высокий'},
+            {'op': 'delete', 'id': 99},
+            {'op': 'unknown'},
+            'not json',
+            {'op': 'complete'},
+            {'op': 'search', 'keyword': 'отчёт'},
+        ])
+        self.assertEqual(counts, (4, 5))
+        self.assertEqual([result['line'] for result in results], [1, 2, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(results[0]['result']['title'], 'Отчёт')
+        self.assertEqual(results[1]['error']['type'], 'InvalidDate')
+        self.assertEqual(results[4]['error'], {'type': 'TaskNotFound',
+                                               'message': 'Задача не найдена'})
+        self.assertEqual([results[i]['error']['type'] for i in (5, 6, 7)],
+                         ['ValueError', 'JSONDecodeError', 'TypeError'])
+        self.assertEqual(results[8]['result'][0]['status'], 'Выполнена')
+        self.assertEqual(results[8]['result'][0]['priority'], 'Высокий')
+        task = TaskManager(filename=self.filename).get_task_by_id(1)
+        self.assertEqual((task.status, task.priority), ('Выполнена', Priority.HIGH))
+
+    def test_checkpoints(self):
+        operations = [self.add(f'Задача {i}') for i in range(5)]
+        with mock.patch.object(self.task_manager.storage, 'commit',
+                               wraps=self.task_manager.storage.commit) as commit:
+            self.assertEqual(self.run_lines(operations, checkpoint=2)[0], (5, 0))
+            self.assertEqual(commit.call_count, 3)
+            commit.reset_mock()
+            self.assertEqual(self.run_lines(operations, checkpoint=0)[0], (5, 0))
+            self.assertEqual(commit.call_count, 1)
+        self.assertEqual(len(TaskManager(filename=self.filename).get_tasks()), 10)
+
+    def test_conflict_fails_checkpoint(self):
+        self.run_lines([self.add('Отчёт')])
+        other = TaskManager(filename=self.filename)
+        time.sleep(0.01)
+        other.edit_task(1, title='Другое')
+        counts, results = self.run_lines([
+            {'op': 'edit', 'id': 1, 'title': 'Своё'},
+            self.add('Новая'),
+        ], checkpoint=2)
+        self.assertEqual(counts, (0, 2))
+        self.assertEqual({result['error']['type'] for result in results}, {'ConflictError'})
+        counts, _ = self.run_lines([{'op': 'complete', 'id': 1}])
+        self.assertEqual(counts, (1, 0))
+        self.assertEqual(TaskManager(filename=self.filename).get_task_by_id(1).title,
+                         'Другое')
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_compressed_stores(self):
+        expected = list(generate_tasks(300))
+        for name in ('tasks.json.gz', 'tasks.json.bz2', 'tasks.jsonl.xz'):
+            with self.subTest(name=name):
+                write_task_file(self.path(name), 300)
+                task_manager = TaskManager(filename=self.path(name))
+                self.assertEqual(task_manager.get_tasks(), expected)
+                task_manager.complete_task(7)
+                task_manager.delete_task(8)
+                lazy = TaskManager(filename=self.path(name), lazy=True)
+                self.assertEqual(lazy.get_tasks_by(status='Выполнена'),
+                                 task_manager.get_tasks_by(status='Выполнена'))
+                self.assertFalse(lazy.loaded)
+                self.assertEqual(len(lazy.get_tasks()), 299)
+                self.assertEqual(os.listdir(self.temp_dir.name).count(name), 1)
+                self.assertFalse([file for file in os.listdir(self.temp_dir.name)
+                                  if file.endswith('.tmp' + os.path.splitext(name)[1])])
+
+    def test_file_is_compressed(self):
+        task_manager = TaskManager(filename=self.path('tasks.json.gz'))
+        task_manager.add_task("Отчёт", "Квартальный", "Работа", "2024-01-01", "Высокий")
+        with gzip.open(self.path('tasks.json.gz'), 'rt', encoding='utf-8') as file:
+            self.assertEqual(json.load(file)[0]['title'], "Отчёт")
+
+    def test_layouts(self):
+        tasks = list(generate_tasks(50))
+        indented = JsonStorage(self.path('indented.json'))
+        indented.save(tasks)
+        with open(self.path('indented.json'), encoding='utf-8') as file:
+            self.assertEqual(file.read(), json.dumps([task.to_dict() for task in tasks],
+                                                     ensure_ascii=False, indent=4))
+        compact = TaskManager(filename=self.path('compact.json'), compact=True)
+        compact.storage.save(tasks)
+        with open(self.path('compact.json'), encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(len(lines), 52)
+        self.assertEqual(TaskManager(filename=self.path('compact.json')).get_tasks(), tasks)
+
+    def test_export_and_import(self):
+        write_task_file(self.path('tasks.json'), 100)
+        task_manager = TaskManager(filename=self.path('tasks.json'))
+        self.assertEqual(task_manager.export_file(self.path('backup.jsonl.gz')), 100)
+        other = TaskManager(filename=self.path('other.json'))
+        self.assertEqual(other.import_file(self.path('backup.jsonl.gz'), workers=1), (100, 0))
+        self.assertEqual([task.title for task in other.get_tasks()],
+                         [task.title for task in task_manager.get_tasks()])
+
+    def test_other_backends_are_not_compressed(self):
+        with self.assertRaises(ValueError):
+            TaskManager(filename=self.path('tasks.db.gz'))
+
+
+class TestCodec(unittest.TestCase):
+    def setUp(self):
+        self.tasks = list(generate_tasks(200))
+        self.tasks.append(Task(201, 'Кавычки "и" \\ \n\t', '\u2028 😀', 'Работа',
+                               '2024-01-01', Priority.HIGH, 'Выполнена'))
+
+    def test_round_trips(self):
+        for task in self.tasks:
+            self.assertEqual(task_to_dict(task), task.to_dict())
+            self.assertEqual(task_from_dict(task.to_dict()), task)
+            self.assertEqual(task_from_row(task_to_row(task)), task)
+        data = self.tasks[0].to_dict()
+        del data['status']
+        self.assertEqual(task_from_dict(data).status, "Не выполнена")
+        self.assertIs(task_from_dict(self.tasks[0].to_dict()).priority, self.tasks[0].priority)
+
+    def test_json_matches_json_module(self):
+        for task in self.tasks:
+            self.assertEqual(encode_json(task), json.dumps(task.to_dict(), ensure_ascii=False))
+        text = '[\n' + ',\n'.join(map(encode_json_indented, self.tasks)) + '\n]'
+        self.assertEqual(text, json.dumps([task.to_dict() for task in self.tasks],
+                                          ensure_ascii=False, indent=4))
+
+    def test_unexpected_values_fall_back(self):
+        task = Task(1, None, 'Описание', 'Работа', '2024-01-01', Priority.LOW)
+        self.assertEqual(json.loads(encode_json(task))['title'], None)
+        self.assertEqual(json.loads('[' + encode_json_indented(task) + ']')[0]['title'], None)
+
+    def test_invalid_priority(self):
+        data = self.tasks[0].to_dict()
+        data['priority'] = 'Срочный'
+        with self.assertRaises(KeyError):
+            task_from_dict(data)
+
+    def test_validate_data(self):
+        TaskManager.validate_data('Высокий', '2024-02-29')
+        for priority in ('Срочный', Priority.HIGH, ['Высокий'], None):
+            with self.assertRaises(InvalidPriority):
+                TaskManager.validate_data(priority, '2024-01-01')
+        for due_date in ('2023-02-29', '01.01.2024', '', None):
+            with self.assertRaises(InvalidDate):
+                TaskManager.validate_data('Низкий', due_date)
+        hits = to_ordinal.cache_info().hits
+        TaskManager.validate_data('Высокий', '2024-02-29')
+        self.assertEqual(to_ordinal.cache_info().hits, hits + 1)
+
+
 if __name__ == '__main__':
     unittest.main()
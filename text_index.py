@@ -0,0 +1,286 @@
+import heapq
+import json
+import os
+import re
+from collections import Counter
+from typing import Iterable, Optional
+
+
+class TextIndex:
+    """
+    Inverted trigram index over task titles and descriptions.
+
+    Text is lowercased before it is split into trigrams, which folds case for
+    Cyrillic as well as Latin letters and matches the lowercase substring
+    semantics of TaskManager.find_task. The index only narrows the set of
+    candidates; callers still check the substring on each candidate.
+
+    The index also keeps the vocabulary of the indexed texts, for fuzzy
+    keywords that may share no trigram with the words they misspell.
+    """
+    N = 3
+
+    def __init__(self, postings: dict[str, set[int]] = None,
+                 words: Counter = None):
+        """
+        Args:
+            postings (dict[str, set[int]], optional): Trigram to task ids mapping.
+            words (Counter, optional): The number of tasks containing every word.
+        """
+        self.postings: dict[str, set[int]] = postings or {}
+        self.words: Counter = words if words is not None else Counter()
+
+    @classmethod
+    def trigrams(cls, *texts: str) -> set[str]:
+        """
+        Returns the set of lowercase trigrams of the given texts.
+        """
+        grams = set()
+        for text in texts:
+            text = text.lower()
+            grams.update(text[i:i + cls.N] for i in range(len(text) - cls.N + 1))
+        return grams
+
+    @staticmethod
+    def split(*texts: str) -> set[str]:
+        """
+        Returns the set of lowercase words of the given texts.
+        """
+        return {word for text in texts for word in re.findall(r'\w+', text.lower())}
+
+    def add(self, task_id: int, *texts: str) -> None:
+        """
+        Indexes the texts of a task.
+
+        Args:
+            task_id (int): The ID of the task.
+            *texts (str): The title and description of the task.
+        """
+        for gram in self.trigrams(*texts):
+            self.postings.setdefault(gram, set()).add(task_id)
+        self.words.update(self.split(*texts))
+
+    def remove(self, task_id: int, *texts: str) -> None:
+        """
+        Removes the texts of a task from the index.
+
+        Args:
+            task_id (int): The ID of the task.
+            *texts (str): The title and description the task was indexed with.
+        """
+        for gram in self.trigrams(*texts):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(task_id)
+                if not posting:
+                    del self.postings[gram]
+        for word in self.split(*texts):
+            self.words[word] -= 1
+            if self.words[word] <= 0:
+                del self.words[word]
+
+    def candidates(self, keyword: str) -> Optional[set[int]]:
+        """
+        Returns the ids of the tasks that contain every trigram of the keyword.
+
+        Args:
+            keyword (str): The search keyword.
+
+        Returns:
+            set[int] | None: The candidate ids, or None if the keyword is too
+            short to be looked up in the index.
+        """
+        grams = self.trigrams(keyword)
+        if not grams:
+            return None
+        postings = sorted((self.postings.get(gram, set()) for gram in grams),
+                          key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return result
+
+    def overlap(self, keyword: str) -> Counter:
+        """
+        Counts the trigrams of the keyword that every task contains.
+
+        Args:
+            keyword (str): The search keyword.
+
+        Returns:
+            Counter: The number of shared trigrams by task ID, for the tasks
+            sharing at least one.
+        """
+        counts = Counter()
+        for gram in self.trigrams(keyword):
+            counts.update(self.postings.get(gram, ()))
+        return counts
+
+    def near(self, keyword: str, max_distance: int) -> Optional[set[int]]:
+        """
+        Finds the tasks containing a word of the vocabulary within
+        max_distance edits of the keyword, for keywords whose typos may leave
+        none of their trigrams intact.
+
+        Args:
+            keyword (str): The lowercase search keyword.
+            max_distance (int): The largest number of edits.
+
+        Returns:
+            set[int] | None: The ids of the tasks containing every trigram of
+            one of those words, or None if one of them is too short to be
+            looked up in the index.
+        """
+        ids = set()
+        for word in self.words:
+            if distance(keyword, word) <= max_distance:
+                candidates = self.candidates(word)
+                if candidates is None:
+                    return None
+                ids |= candidates
+        return ids
+
+    def save(self, filename: str, signature: list) -> None:
+        """
+        Atomically writes the index to a file.
+
+        Args:
+            filename (str): The path of the index file.
+            signature (list): Identifies the task file state the index belongs to.
+        """
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump({'signature': signature,
+                       'postings': {gram: sorted(ids)
+                                    for gram, ids in self.postings.items()},
+                       'words': self.words},
+                      file, ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str, signature: list) -> Optional['TextIndex']:
+        """
+        Reads an index written by save.
+
+        Args:
+            filename (str): The path of the index file.
+            signature (list): The signature of the current task file.
+
+        Returns:
+            TextIndex | None: The index, or None if the file is missing, broken,
+            written without the vocabulary or belongs to a different state of
+            the task file.
+        """
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get('signature') != signature or 'words' not in data:
+            return None
+        return cls({gram: set(ids) for gram, ids in data['postings'].items()},
+                   Counter(data['words']))
+
+
+def distance(keyword: str, text: str) -> int:
+    """
+    Returns the smallest number of character insertions, deletions and
+    substitutions that turn the keyword into a substring of the text.
+
+    Uses Myers' bit-parallel algorithm: a column of the edit distance matrix
+    is kept as bit vectors of vertical deltas, so every character of the
+    text costs a few integer operations instead of len(keyword) steps.
+    """
+    size = len(keyword)
+    if not size:
+        return 0
+    if keyword in text:
+        return 0
+    masks = {}
+    for i, char in enumerate(keyword):
+        masks[char] = masks.get(char, 0) | 1 << i
+    full = (1 << size) - 1
+    last = 1 << (size - 1)
+    positive, negative = full, 0
+    score = best = size
+    for char in text:
+        eq = masks.get(char, 0)
+        vertical = eq | negative
+        horizontal = ((((eq & positive) + positive) & full) ^ positive) | eq
+        up = (negative | ~(horizontal | positive)) & full
+        down = positive & horizontal
+        if up & last:
+            score += 1
+        elif down & last:
+            score -= 1
+            if score < best:
+                best = score
+        # a match may start anywhere, so no edit is shifted in at the top
+        up = (up << 1) & full
+        down = (down << 1) & full
+        positive = (down | ~(vertical | up)) & full
+        negative = up & vertical
+    return best
+
+
+def fuzzy_bounds(keyword: str, min_score: float) -> tuple[int, int]:
+    """
+    Returns the largest number of edits a task within min_score of the
+    keyword may need, and the smallest number of keyword trigrams it must
+    then contain: every edit changes at most N trigrams. The latter is 0 for
+    short keywords, whose typos may leave none of their trigrams intact.
+    """
+    max_distance = int((1 - min_score) * len(keyword) + 1e-9)
+    grams = len(TextIndex.trigrams(keyword))
+    return max_distance, max(0, grams - TextIndex.N * max_distance)
+
+
+def fuzzy_rank(keyword: str, candidates: Iterable[tuple[int, object]],
+               limit: Optional[int], min_score: float) -> list[tuple[object, float]]:
+    """
+    Ranks tasks by how closely their title or description matches a keyword.
+    The score is 1 - distance / len(keyword), so an exact substring scores 1.
+
+    Every edit changes at most N trigrams of the keyword, so a task sharing
+    few trigrams with it cannot score high: such tasks are skipped without
+    computing the distance (see fuzzy_bounds). The others are scored from
+    the most shared trigrams down, and scoring stops as soon as that bound
+    shows that none of the remaining tasks can enter the top limit.
+
+    Args:
+        keyword (str): The lowercase keyword, at least N characters long.
+        candidates (Iterable[tuple[int, Task]]): The tasks to rank with the
+            number of distinct keyword trigrams they contain. For a short
+            keyword they should include tasks sharing no trigram with it.
+        limit (int | None): The number of best tasks to return, all if None.
+        min_score (float): The lowest score of a returned task.
+
+    Returns:
+        list[tuple[Task, float]]: The tasks and their scores, best first.
+        Among equally scored tasks, lower IDs come first.
+    """
+    grams = len(TextIndex.trigrams(keyword))
+    max_distance, needed = fuzzy_bounds(keyword, min_score)
+    # the worst kept result is on top: lowest score, then highest ID
+    best: list[tuple[float, int, object]] = []
+    candidates = [item for item in candidates if item[0] >= needed]
+    for shared, task in sorted(candidates, key=lambda item: (-item[0], item[1].id)):
+        bound = 1 - -(-(grams - shared) // TextIndex.N) / len(keyword)
+        full = limit is not None and len(best) >= limit
+        # a task scoring as much as the worst kept one may still have a lower ID
+        if full and bound < best[0][0]:
+            break
+        cost = distance(keyword, task.title.lower())
+        if cost:
+            cost = min(cost, distance(keyword, task.description.lower()))
+        if cost > max_distance:
+            continue
+        item = (1 - cost / len(keyword), -task.id, task)
+        if not full:
+            heapq.heappush(best, item)
+        elif item[:2] > best[0][:2]:
+            heapq.heapreplace(best, item)
+    return [(task, score) for score, _, task in sorted(best, key=lambda item: item[:2],
+                                                       reverse=True)]